@@ -0,0 +1,579 @@
+#!/usr/bin/env python3
+"""
+Web Kiosk Launcher 性能基准脚本
+用于测量服务器在浏览器启动等耗时操作期间的响应表现、浏览器启动/关闭延迟
+和并发负载下的尾延迟；结果可输出为 JSON 并与基线比较
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import shutil
+import tempfile
+import threading
+import subprocess
+import http.client
+from pathlib import Path
+from urllib.parse import urlencode
+
+sys.path.insert(0, '.')
+from server import (Config, BrowserManager, BrowserProbe, AllowListIndex, ProfileManager,
+                    BROWSERS, create_server)
+
+
+# 基准中的 PID 文件和状态文件都放在这里，避免读取或删除正在运行的服务的文件
+BENCH_STATE_DIR = tempfile.TemporaryDirectory(prefix='kiosk-bench-')
+
+
+def bench_config():
+    """基准用的配置：PID 文件和状态文件指向独立的临时目录"""
+    state_dir = tempfile.mkdtemp(dir=BENCH_STATE_DIR.name)
+    config = Config()
+    config.pid_file = os.path.join(state_dir, 'browser.pid')
+    config.state_file = os.path.join(state_dir, 'browser-state.json')
+    return config
+
+
+class EphemeralStateMixin:
+    """基准和测试用的管理器不读写真实的浏览器状态文件"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # _clear_state 会删除状态文件，因此指向临时目录
+        self.state_file = Path(tempfile.mkdtemp(dir=BENCH_STATE_DIR.name)) / 'browser-state.json'
+
+    def adopt_browser(self):
+        return False
+
+    def _save_state(self):
+        pass
+
+
+class SlowBrowserManager(EphemeralStateMixin, BrowserManager):
+    """模拟慢速启动的浏览器管理器（不依赖真实浏览器和X服务器）"""
+
+    def __init__(self, config, launch_delay=1.0, **kwargs):
+        self.launch_delay = launch_delay
+        super().__init__(config, **kwargs)
+
+    def _detect_browser(self):
+        # URL 作为 $0 传入，进程持续运行以模拟浏览器
+        self.browser_cmd = 'sh'
+        self.browser_args = ['-c', 'sleep 60']
+
+    def _check_display(self):
+        # 模拟 xset q 卡顿
+        time.sleep(self.launch_delay)
+        return True
+
+
+def start_server(browser_manager, config):
+    """在后台线程中启动服务器，返回 (server, port)"""
+    config.port = 0
+    server = create_server(config, browser_manager)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, server.server_address[1]
+
+
+def percentile(samples, pct):
+    """计算百分位数"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def bench_index_during_launch(threaded=True, duration=3.0, launch_delay=1.0, readers=4):
+    """测量浏览器启动期间 GET / 的延迟"""
+    config = bench_config()
+    config.host = '127.0.0.1'
+    config.threaded_server = threaded
+    config.reuse_instance = False
+    manager = SlowBrowserManager(config, launch_delay=launch_delay)
+    server, port = start_server(manager, config)
+
+    stop = threading.Event()
+    latencies = []
+    latencies_lock = threading.Lock()
+
+    def launcher():
+        n = 0
+        while not stop.is_set():
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            body = urlencode({'url': f'https://example.org/{n}'})
+            conn.request('POST', '/open', body=body,
+                         headers={'Content-Type': 'application/x-www-form-urlencoded'})
+            conn.getresponse().read()
+            conn.close()
+            n += 1
+
+    def reader():
+        while not stop.is_set():
+            start = time.perf_counter()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            conn.request('GET', '/')
+            conn.getresponse().read()
+            conn.close()
+            elapsed = time.perf_counter() - start
+            with latencies_lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=launcher, daemon=True)]
+    threads += [threading.Thread(target=reader, daemon=True) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join(timeout=launch_delay + 5)
+    server.shutdown()
+    server.server_close()
+    manager.close_browser()
+
+    return {
+        'mode': 'threaded' if threaded else 'single',
+        'requests': len(latencies),
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+def bench_allow_list(entries=10000, lookups=20000):
+    """比较线性子串扫描与预编译索引的白名单查询耗时"""
+    allow_list = [f'site{i}.example{i % 97}.com' for i in range(entries)]
+    urls = [f'https://www.site{i * 7 % (entries * 2)}.example{i % 97}.com/page'
+            for i in range(lookups)]
+
+    start = time.perf_counter()
+    index = AllowListIndex(allow_list)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    linear_sample = urls[:max(1, lookups // 100)]
+    start = time.perf_counter()
+    for url in linear_sample:
+        domain = url.split('/')[2]
+        any(allowed in domain for allowed in allow_list)
+    linear_us = (time.perf_counter() - start) / len(linear_sample) * 1e6
+
+    start = time.perf_counter()
+    for url in urls:
+        index.allows(url)
+    index_us = (time.perf_counter() - start) / len(urls) * 1e6
+
+    return {
+        'entries': entries,
+        'build_ms': build_ms,
+        'linear_us': linear_us,
+        'index_us': index_us,
+    }
+
+
+def bench_keepalive(requests=2000, keepalive=True):
+    """测量 /api/v1/status 的吞吐量（持久连接 vs 每请求新建连接）"""
+    config = bench_config()
+    config.host = '127.0.0.1'
+    manager = SlowBrowserManager(config, launch_delay=0)
+    server, port = start_server(manager, config)
+
+    latencies = []
+    start = time.perf_counter()
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    for _ in range(requests):
+        t0 = time.perf_counter()
+        conn.request('GET', '/api/v1/status')
+        conn.getresponse().read()
+        latencies.append(time.perf_counter() - t0)
+        if not keepalive:
+            conn.close()
+    conn.close()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    server.server_close()
+
+    return {
+        'mode': 'keep-alive' if keepalive else 'close',
+        'requests': requests,
+        'rps': requests / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+# 模拟浏览器冷启动的配置初始化：读取配置目录中的全部文件，补齐缺失的
+# 文件（首次启动时的初始化），再写入并 fsync 会话文件
+FAKE_PROFILE_INIT = r"""
+import os, sys
+root = sys.argv[1].split('=', 1)[1]
+files, size = int(sys.argv[2]), int(sys.argv[3])
+os.makedirs(os.path.join(root, 'Default'), exist_ok=True)
+for i in range(files):
+    path = os.path.join(root, 'Default', f'state-{i}')
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            f.read()
+    else:
+        with open(path, 'wb') as f:
+            f.write(os.urandom(size))
+            f.flush()
+            os.fsync(f.fileno())
+with open(os.path.join(root, 'Default', 'Current Session'), 'wb') as f:
+    f.write(os.urandom(size))
+    f.flush()
+    os.fsync(f.fileno())
+"""
+
+
+def bench_ram_profile(runs=10, files=300, size=16384, disk_root=None):
+    """比较磁盘配置目录与内存配置目录（快照填充）下的冷启动耗时"""
+    disk_root = Path(disk_root or Path.home() / '.cache')
+    disk_root.mkdir(parents=True, exist_ok=True)
+    work = Path(tempfile.mkdtemp(prefix='kiosk-bench-', dir=disk_root))
+    ram_root = Path(tempfile.mkdtemp(prefix='kiosk-bench-',
+                                     dir='/dev/shm' if os.path.isdir('/dev/shm') else None))
+
+    def launch(profile_arg):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', FAKE_PROFILE_INIT, profile_arg,
+                        str(files), str(size)], check=True)
+        return time.perf_counter() - start
+
+    try:
+        # 磁盘配置：第一次启动为全新初始化，之后复用已存在的配置
+        disk_profile = work / 'profile'
+        first_disk = launch(f'--user-data-dir={disk_profile}')
+        disk = [launch(f'--user-data-dir={disk_profile}') for _ in range(runs)]
+
+        # 内存配置：用磁盘上的预热配置作为快照，每次启动前重新填充
+        profiles = ProfileManager(ram_root, disk_profile, sync_paths=['Default/Current Session'])
+        ram = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            args = profiles.args('chromium')
+            launch(args[0])
+            ram.append(time.perf_counter() - start)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+        shutil.rmtree(ram_root, ignore_errors=True)
+
+    return {
+        'files': files,
+        'first_ms': first_disk * 1000,
+        'disk_p50_ms': percentile(disk, 50) * 1000,
+        'ram_p50_ms': percentile(ram, 50) * 1000,
+        'seed_ms': profiles.last_seed_ms,
+    }
+
+
+FAKE_BROWSER = str(Path(__file__).resolve().parent / 'scripts' / 'fake-browser')
+
+
+class StubDisplayManager(EphemeralStateMixin, BrowserManager):
+    """使用真实启动路径（可配合 scripts/fake-browser），只跳过X显示检查"""
+
+    def _check_display(self):
+        return True
+
+
+def bench_launch_close(runs=10, startup_delay=0.2, children=2, term_delay=0.05):
+    """用模拟浏览器测量 open_url() 与关闭浏览器的延迟"""
+    env = {
+        'FAKE_BROWSER_STARTUP_DELAY': str(startup_delay),
+        'FAKE_BROWSER_CHILDREN': str(children),
+        'FAKE_BROWSER_TERM_DELAY': str(term_delay),
+    }
+    saved = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)
+    config = bench_config()
+    config.browser = FAKE_BROWSER
+    config.reuse_instance = False
+    manager = StubDisplayManager(config)
+
+    opens, closes, forced = [], [], 0
+    try:
+        for n in range(runs):
+            details = {}
+            ok, message = manager.open_url(f'https://example.org/{n}', details)
+            if not ok:
+                raise RuntimeError(message)
+            opens.append(details['elapsed_ms'])
+            # 等待模拟浏览器完成启动，使关闭测量的是已就绪的浏览器
+            time.sleep(startup_delay)
+            details = {}
+            manager.close_browser(details)
+            closes.append(details['latency_ms'])
+            forced += 1 if details.get('forced') else 0
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        manager.close_browser()
+
+    return {
+        'runs': runs,
+        'open_p50_ms': percentile(opens, 50),
+        'open_p95_ms': percentile(opens, 95),
+        'close_p50_ms': percentile(closes, 50),
+        'close_p95_ms': percentile(closes, 95),
+        'forced_kills': forced,
+    }
+
+
+def bench_browser_detect(runs=20):
+    """比较浏览器检测耗时：逐个 fork which、首次能力探测、命中磁盘缓存的热启动
+
+    以 scripts/fake-browser 冒充 chromium（排在 chromium-browser 之后）。
+    """
+    work = tempfile.mkdtemp(prefix='kiosk-bench-')
+    os.symlink(FAKE_BROWSER, os.path.join(work, 'chromium'))
+    old_path = os.environ.get('PATH', '')
+    os.environ['PATH'] = work + os.pathsep + old_path
+    cache_file = os.path.join(work, 'capabilities.json')
+
+    def detect(probe):
+        start = time.perf_counter()
+        for name, _ in BROWSERS:
+            path = probe.resolve(name)
+            if path:
+                probe.capabilities(name, path)
+                break
+        return time.perf_counter() - start
+
+    try:
+        which = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            for name, _ in BROWSERS:
+                if subprocess.run(['which', name], capture_output=True).returncode == 0:
+                    break
+            which.append(time.perf_counter() - start)
+        cold = []
+        for _ in range(runs):
+            if os.path.exists(cache_file):
+                os.remove(cache_file)
+            cold.append(detect(BrowserProbe(cache_file)))
+        # 每次新建 BrowserProbe，模拟服务重启后从磁盘读取缓存
+        warm = [detect(BrowserProbe(cache_file)) for _ in range(runs)]
+    finally:
+        os.environ['PATH'] = old_path
+        shutil.rmtree(work, ignore_errors=True)
+
+    return {
+        'runs': runs,
+        'which_p50_ms': percentile(which, 50) * 1000,
+        'cold_p50_ms': percentile(cold, 50) * 1000,
+        'warm_p50_ms': percentile(warm, 50) * 1000,
+    }
+
+
+def bench_http_load(clients=16, requests=200, path='/api/v1/status'):
+    """多个持久连接客户端并发请求，测量吞吐量和尾延迟"""
+    config = bench_config()
+    config.host = '127.0.0.1'
+    manager = SlowBrowserManager(config, launch_delay=0)
+    server, port = start_server(manager, config)
+
+    latencies = []
+    lock = threading.Lock()
+    errors = []
+
+    def client():
+        samples = []
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        try:
+            for _ in range(requests):
+                t0 = time.perf_counter()
+                conn.request('GET', path)
+                conn.getresponse().read()
+                samples.append(time.perf_counter() - t0)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            conn.close()
+        with lock:
+            latencies.extend(samples)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    server.server_close()
+
+    return {
+        'clients': clients,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+def collect_index_latency():
+    results = {}
+    for threaded in (False, True):
+        result = bench_index_during_launch(threaded=threaded)
+        for key in ('requests', 'p50_ms', 'p99_ms'):
+            results[f"{result['mode']}_{key}"] = result[key]
+    return results
+
+
+def print_index_latency(results):
+    print("GET / 延迟（后台持续 /open，每次启动耗时 1s）:")
+    for mode in ('single', 'threaded'):
+        print(f"  {mode:>8}: 请求数={results[mode + '_requests']:<5} "
+              f"p50={results[mode + '_p50_ms']:.1f}ms p99={results[mode + '_p99_ms']:.1f}ms")
+
+
+def print_allow_list(result):
+    print("白名单查询（10k 条目）:")
+    print(f"  索引构建: {result['build_ms']:.1f}ms")
+    print(f"  线性扫描: {result['linear_us']:.1f}us/次")
+    print(f"  前缀索引: {result['index_us']:.1f}us/次")
+
+
+def collect_keepalive():
+    results = {}
+    for keepalive in (False, True):
+        result = bench_keepalive(keepalive=keepalive)
+        for key in ('rps', 'p50_ms', 'p99_ms'):
+            results[f"{result['mode']}_{key}"] = result[key]
+    return results
+
+
+def print_keepalive(results):
+    print("/api/v1/status 吞吐量（单客户端串行 2000 次）:")
+    for mode in ('close', 'keep-alive'):
+        print(f"  {mode:>10}: {results[mode + '_rps']:.0f} req/s "
+              f"p50={results[mode + '_p50_ms']:.2f}ms p99={results[mode + '_p99_ms']:.2f}ms")
+
+
+def print_ram_profile(result):
+    print("冷启动配置初始化耗时（模拟浏览器，300 个 16KB 配置文件）:")
+    print(f"  首次初始化（磁盘）: {result['first_ms']:.1f}ms")
+    print(f"  磁盘配置: p50={result['disk_p50_ms']:.1f}ms")
+    print(f"  内存配置: p50={result['ram_p50_ms']:.1f}ms（其中快照填充 {result['seed_ms']}ms）")
+
+
+def print_launch_close(result):
+    print(f"启动/关闭延迟（scripts/fake-browser，{result['runs']} 次，2 个子进程）:")
+    print(f"  open_url: p50={result['open_p50_ms']:.1f}ms p95={result['open_p95_ms']:.1f}ms")
+    print(f"  关闭:     p50={result['close_p50_ms']:.1f}ms p95={result['close_p95_ms']:.1f}ms "
+          f"（强制结束 {result['forced_kills']} 次）")
+
+
+def print_browser_detect(result):
+    print(f"浏览器检测耗时（{result['runs']} 次，p50）:")
+    print(f"  逐个 which:   {result['which_p50_ms']:.2f}ms")
+    print(f"  首次能力探测: {result['cold_p50_ms']:.2f}ms（含 --version）")
+    print(f"  缓存热启动:   {result['warm_p50_ms']:.2f}ms")
+
+
+def print_http_load(result):
+    print(f"并发负载（{result['clients']} 个持久连接客户端，共 {result['requests']} 次请求）:")
+    print(f"  {result['rps']:.0f} req/s p50={result['p50_ms']:.2f}ms "
+          f"p95={result['p95_ms']:.2f}ms p99={result['p99_ms']:.2f}ms 错误={result['errors']}")
+
+
+# 基准项：名称 -> (采集函数, 输出函数)
+BENCHMARKS = {
+    'index': (collect_index_latency, print_index_latency),
+    'allowlist': (bench_allow_list, print_allow_list),
+    'keepalive': (collect_keepalive, print_keepalive),
+    'profile': (bench_ram_profile, print_ram_profile),
+    'launch': (bench_launch_close, print_launch_close),
+    'load': (bench_http_load, print_http_load),
+    'detect': (bench_browser_detect, print_browser_detect),
+}
+
+
+def metric_direction(name):
+    """指标的优劣方向：1 越大越好，-1 越小越好，0 不参与比较"""
+    if name.endswith(('_ms', '_us')):
+        return -1
+    if name.endswith('rps'):
+        return 1
+    return 0
+
+
+def compare_with_baseline(results, baseline, tolerance=0.2):
+    """与基线结果比较，返回 (指标, 基线值, 当前值, 变化比例, 是否退化) 列表"""
+    rows = []
+    for bench, metrics in results.items():
+        for name, value in metrics.items():
+            base = baseline.get(bench, {}).get(name)
+            direction = metric_direction(name)
+            if not direction or not isinstance(base, (int, float)) or not base:
+                continue
+            change = (value - base) / base
+            rows.append((f'{bench}.{name}', base, value, change, change * direction < -tolerance))
+    return rows
+
+
+def main(argv=None):
+    """主函数，可通过参数选择要运行的基准项"""
+    parser = argparse.ArgumentParser(description='Web Kiosk Launcher 基准测试')
+    parser.add_argument('names', nargs='*', help=f"基准项（可选: {', '.join(BENCHMARKS)}）")
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    parser.add_argument('--output', help='把结果保存为 JSON 文件（可作为基线）')
+    parser.add_argument('--baseline', help='与该 JSON 基线比较，出现退化时退出码为 1')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='允许的退化比例（默认 0.2 即 20%%）')
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    names = args.names or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print(f"未知的基准项: {', '.join(unknown)}（可选: {', '.join(BENCHMARKS)}）")
+        return 2
+
+    if not args.json:
+        print("=== Web Kiosk Launcher 基准测试 ===")
+    results = {}
+    for name in names:
+        collect, report = BENCHMARKS[name]
+        results[name] = collect()
+        if not args.json:
+            print()
+            report(results[name])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    status = 0
+    comparison = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            comparison = compare_with_baseline(results, json.load(f), args.tolerance)
+        status = 1 if any(row[4] for row in comparison) else 0
+
+    if args.json:
+        output = {'results': results}
+        if comparison is not None:
+            output['comparison'] = [
+                {'metric': metric, 'baseline': base, 'current': value,
+                 'change': round(change, 4), 'regression': regressed}
+                for metric, base, value, change, regressed in comparison]
+        print(json.dumps(output, indent=2))
+    elif comparison is not None:
+        print()
+        print(f"与基线 {args.baseline} 比较（容差 {args.tolerance:.0%}）:")
+        for metric, base, value, change, regressed in comparison:
+            mark = '✗ 退化' if regressed else '✓'
+            print(f"  {mark} {metric}: {base:.2f} -> {value:.2f} ({change:+.1%})")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -400,7 +400,8 @@ Environment=PYTHONUNBUFFERED=1
 ExecStart=/usr/bin/python3 $APP_DIR/server.py
 Restart=on-failure
 RestartSec=5
-KillMode=mixed
+# 重启服务时不结束浏览器，由新进程重新接管（ADOPT_BROWSER=true）
+KillMode=process
 KillSignal=SIGTERM
 TimeoutStopSec=30
 
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Web Kiosk Launcher 批量控制工具
+并发地向多台信息屏发送打开/关闭/状态命令，并汇总每台主机的结果和延迟
+"""
+
+import sys
+import json
+import time
+import base64
+import argparse
+import threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+DEFAULT_PORT = 8787
+API_PREFIX = '/api/v1'
+# 这些状态码表示服务器暂时无法处理，可以重试
+RETRY_STATUS = {429, 502, 503, 504}
+
+
+class Host:
+    """清单中的一台信息屏"""
+
+    def __init__(self, spec):
+        if '://' not in spec:
+            spec = 'http://' + spec
+        parts = urlsplit(spec)
+        self.host = parts.hostname
+        self.port = parts.port or DEFAULT_PORT
+        self.name = f'{self.host}:{self.port}'
+        self.authorization = None
+        if parts.username:
+            credentials = f'{parts.username}:{parts.password or ""}'.encode()
+            self.authorization = 'Basic ' + base64.b64encode(credentials).decode()
+        # 路径部分可指定槽位，例如 kiosk1:8787/left
+        self.slot = parts.path.strip('/') or None
+
+
+def load_inventory(path):
+    """读取主机清单：每行一个 host[:port][/slot]，# 开头为注释；也支持 JSON 数组"""
+    with open(path, 'r') as f:
+        content = f.read()
+    if content.lstrip().startswith('['):
+        return [Host(spec) for spec in json.loads(content)]
+    hosts = []
+    for line in content.splitlines():
+        line = line.split('#', 1)[0].strip()
+        if line:
+            hosts.append(Host(line))
+    return hosts
+
+
+class ConnectionPool:
+    """按主机复用的持久连接池"""
+
+    def __init__(self, timeout, max_idle=4):
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, host):
+        """返回 (连接, 是否为复用的连接)"""
+        with self._lock:
+            idle = self._idle.get(host.name)
+            if idle:
+                return idle.pop(), True
+        return http.client.HTTPConnection(host.host, host.port, timeout=self.timeout), False
+
+    def release(self, host, conn):
+        with self._lock:
+            idle = self._idle.setdefault(host.name, [])
+            if len(idle) < self.max_idle:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def idle_count(self, host):
+        with self._lock:
+            return len(self._idle.get(host.name, []))
+
+    def close(self):
+        with self._lock:
+            for idle in self._idle.values():
+                for conn in idle:
+                    conn.close()
+            self._idle.clear()
+
+
+def percentile(samples, pct):
+    """计算百分位数"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class FleetController:
+    """批量控制器
+
+    命令并发发送到所有主机；每台主机的请求有独立的超时，连接失败、超时
+    或服务器返回 429/5xx 时按指数退避重试。连接在命令之间复用。
+    """
+
+    def __init__(self, hosts, timeout=5.0, retries=2, backoff=0.2, concurrency=32):
+        self.hosts = hosts
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool = ConnectionPool(timeout)
+        self.executor = ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(hosts) or 1)))
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def open(self, url, slot=None, async_launch=False):
+        payload = {'url': url}
+        if async_launch:
+            payload['async'] = True
+        return self.run('open', 'POST', payload, slot)
+
+    def close_browsers(self, slot=None):
+        return self.run('close', 'POST', {}, slot)
+
+    def status(self, slot=None):
+        return self.run('status', 'GET', None, slot)
+
+    def run(self, command, method, payload, slot=None):
+        """向所有主机发送命令并汇总结果"""
+        start = time.perf_counter()
+        futures = [self.executor.submit(self._call_host, host, command, method, payload, slot)
+                   for host in self.hosts]
+        results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - start
+        latencies = [r['latency_ms'] for r in results if r['ok']]
+        return {
+            'command': command,
+            'hosts': len(results),
+            'succeeded': sum(1 for r in results if r['ok']),
+            'failed': sum(1 for r in results if not r['ok']),
+            'elapsed_ms': round(elapsed * 1000, 1),
+            'latency_ms': {
+                'p50': round(percentile(latencies, 50), 1),
+                'p95': round(percentile(latencies, 95), 1),
+                'max': round(max(latencies), 1) if latencies else 0.0,
+            },
+            'results': results,
+        }
+
+    def _call_host(self, host, command, method, payload, slot):
+        slot = slot or host.slot
+        path = f'{API_PREFIX}/slots/{slot}/{command}' if slot else f'{API_PREFIX}/{command}'
+        body = json.dumps(payload).encode() if payload is not None else None
+        headers = {'Content-Type': 'application/json'}
+        if host.authorization:
+            headers['Authorization'] = host.authorization
+
+        result = {'host': host.name, 'ok': False, 'status': None, 'attempts': 0,
+                  'latency_ms': None, 'error': None, 'response': None}
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            result['attempts'] += 1
+            try:
+                status, data = self._request(host, method, path, body, headers)
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                result['error'] = f'{type(e).__name__}: {e}'
+                status, data = None, None
+            else:
+                result['status'] = status
+                result['response'] = data
+                result['error'] = None
+                if status not in RETRY_STATUS:
+                    result['ok'] = status == 200 or status == 202
+                    if result['ok'] and isinstance(data, dict) and data.get('ok') is False:
+                        result['ok'] = False
+                        result['error'] = data.get('message')
+                    break
+                result['error'] = f'HTTP {status}'
+            if attempt >= self.retries:
+                break
+            time.sleep(self.backoff * (2 ** attempt))
+            attempt += 1
+        result['latency_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        return result
+
+    def _request(self, host, method, path, body, headers):
+        """发送一次请求；复用的连接已被服务器关闭时换新连接重发一次"""
+        while True:
+            conn, reused = self.pool.acquire(host)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                raw = response.read()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                if reused:
+                    continue
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                self.pool.release(host, conn)
+            return response.status, json.loads(raw or b'null')
+
+
+def print_report(report):
+    """以表格形式输出汇总结果"""
+    print(f"{report['command']}: {report['succeeded']}/{report['hosts']} 成功，"
+          f"总耗时 {report['elapsed_ms']:.0f}ms，"
+          f"p50={report['latency_ms']['p50']:.1f}ms p95={report['latency_ms']['p95']:.1f}ms")
+    for r in report['results']:
+        mark = '✓' if r['ok'] else '✗'
+        latency = f"{r['latency_ms']:.1f}ms" if r['latency_ms'] is not None else '-'
+        detail = r['error'] or ''
+        if r['ok'] and isinstance(r['response'], dict):
+            detail = r['response'].get('state') or r['response'].get('message') or ''
+        print(f"  {mark} {r['host']:<24} {latency:>9}  尝试{r['attempts']}次  {detail}")
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='并发控制多台 Web Kiosk Launcher')
+    parser.add_argument('-i', '--inventory', help='主机清单文件')
+    parser.add_argument('-H', '--hosts', help='逗号分隔的主机列表（host[:port][/slot]）')
+    parser.add_argument('--slot', help='操作的槽位ID（覆盖清单中的槽位）')
+    parser.add_argument('--timeout', type=float, default=5.0, help='每台主机的请求超时（秒）')
+    parser.add_argument('--retries', type=int, default=2, help='失败重试次数')
+    parser.add_argument('--concurrency', type=int, default=32, help='最大并发数')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    sub = parser.add_subparsers(dest='command', required=True)
+    open_parser = sub.add_parser('open', help='打开URL')
+    open_parser.add_argument('url')
+    open_parser.add_argument('--async', dest='async_launch', action='store_true',
+                             help='异步启动，不等待浏览器启动完成')
+    sub.add_parser('close', help='关闭浏览器')
+    sub.add_parser('status', help='查询状态')
+    args = parser.parse_args(argv)
+
+    hosts = []
+    if args.inventory:
+        hosts += load_inventory(args.inventory)
+    if args.hosts:
+        hosts += [Host(spec.strip()) for spec in args.hosts.split(',') if spec.strip()]
+    if not hosts:
+        parser.error('需要通过 --inventory 或 --hosts 指定主机')
+
+    with FleetController(hosts, timeout=args.timeout, retries=args.retries,
+                         concurrency=args.concurrency) as fleet:
+        if args.command == 'open':
+            report = fleet.open(args.url, args.slot, args.async_launch)
+        elif args.command == 'close':
+            report = fleet.close_browsers(args.slot)
+        else:
+            report = fleet.status(args.slot)
+
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_report(report)
+    return 0 if report['failed'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -257,8 +257,11 @@ WorkingDirectory=$APP_DIR
 EnvironmentFile=$APP_DIR/.env
 Environment=DISPLAY=:0
 ExecStart=/usr/bin/python3 $APP_DIR/server.py
+ExecReload=/bin/kill -HUP \$MAINPID
 Restart=on-failure
 RestartSec=5
+# 重启服务时不结束浏览器，由新进程重新接管（ADOPT_BROWSER=true）
+KillMode=process
 
 [Install]
 WantedBy=multi-user.target
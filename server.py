@@ -6,24 +6,64 @@ Web Kiosk Launcher Server
 
 import os
 import sys
+import re
 import json
 import time
+import argparse
 import signal
 import subprocess
 import threading
+import socket
+import select
+import selectors
+import struct
+import base64
+import http.client
+import tempfile
+import ipaddress
+import gzip
+import hashlib
+import mimetypes
+import bisect
+import fnmatch
+import shutil
+import uuid
+import copy
+import email.utils
+from collections import OrderedDict, deque
 from pathlib import Path
 from urllib.parse import urlparse, parse_qs
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http import HTTPStatus
+from http.server import HTTPServer, ThreadingHTTPServer, BaseHTTPRequestHandler
 import logging
-from datetime import datetime
+import logging.handlers
+import queue
+from datetime import datetime, timedelta
 
 # 配置常量
 DEFAULT_HOST = '127.0.0.1'
 DEFAULT_PORT = 8787
 DEFAULT_URL = 'https://example.org'
 PID_FILE = '/tmp/web-kiosk-browser.pid'
+# 未配置 SLOTS 时唯一槽位的ID
+DEFAULT_SLOT = 'default'
 LOG_DIR = Path.home() / '.local' / 'share' / 'web-kiosk-launcher'
 LOG_FILE = LOG_DIR / 'launcher.log'
+# 浏览器状态文件，服务重启后据此重新接管仍在运行的浏览器
+# （不放在 /tmp：systemd 的 PrivateTmp 会在服务重启时清空 /tmp）
+STATE_FILE = LOG_DIR / 'browser-state.json'
+X11_SOCKET_DIR = '/tmp/.X11-unix'
+STATIC_DIR = Path(__file__).resolve().parent / 'static'
+ENV_FILE = '.env'
+API_PREFIX = '/api/v1'
+# 持久连接空闲超时（秒）
+KEEPALIVE_TIMEOUT = 15
+# 启动时间线使用的时钟：CLOCK_BOOTTIME 与 /proc/<pid>/stat 的进程启动时间同源（含休眠时间）
+BOOT_CLOCK = getattr(time, 'CLOCK_BOOTTIME', time.CLOCK_MONOTONIC)
+# 自动启动时等待X显示就绪的轮询间隔（秒）
+AUTOLAUNCH_DISPLAY_POLL = 0.25
+# 播放列表为空或没有处于时间窗口内的项目时，重新检查的间隔（秒）
+PLAYLIST_IDLE_POLL = 1.0
 
 # 浏览器检测顺序
 BROWSERS = [
@@ -44,10 +84,391 @@ BROWSERS = [
     ('luakit', ['-c', 'fullscreen'])
 ]
 
+# 支持 DevTools 远程调试协议的浏览器（可原地导航，无需重启）
+DEVTOOLS_BROWSERS = {'chromium-browser', 'chromium', 'google-chrome'}
+DEFAULT_DEVTOOLS_PORT = 9222
+
+# 浏览器家族，参数兼容性按家族判断
+BROWSER_FAMILIES = {
+    'chromium-browser': 'chromium',
+    'chromium': 'chromium',
+    'google-chrome': 'chromium',
+    'firefox': 'firefox',
+}
+# 读取版本号的参数，未列出的浏览器使用 --version
+BROWSER_VERSION_ARGS = {'surf': ['-v']}
+# 默认参数适用的主版本范围 [最低版本, 移除版本)，None 表示不限；
+# 探测到的版本不在范围内时启动时不再传入该参数
+FLAG_VERSION_RANGES = {
+    'chromium': {'--disable-infobars': (None, 76)},
+    'firefox': {'--kiosk': (71, None)},
+}
+# 浏览器能力探测缓存，按可执行文件路径、mtime 和 PATH 失效
+BROWSER_PROBE_CACHE = LOG_DIR / 'browser-capabilities.json'
+BROWSER_PROBE_TIMEOUT = 5
+
+# 浏览器选择策略：explicit 按 BROWSER 和 BROWSERS 的固定顺序，
+# fastest/leanest 按校准结果中启动到就绪的耗时/稳定后的内存占用
+BROWSER_POLICIES = {'explicit': None, 'fastest': 'ready_p50_ms', 'leanest': 'rss_mb'}
+# 校准结果（python3 server.py --calibrate 生成）
+BROWSER_CALIBRATION = LOG_DIR / 'browser-calibration.json'
+CALIBRATION_PAGE = (b'<!DOCTYPE html><html><head><meta charset="utf-8">'
+                    b'<title>Web Kiosk Launcher calibration</title></head>'
+                    b'<body style="background:#000;color:#fff;font:48px sans-serif">'
+                    b'<p>Web Kiosk Launcher calibration</p></body></html>')
+
+# 热备模式下允许同一浏览器并行运行第二个实例所需的额外参数
+# {profile_dir} 会被替换为该热备槽位独立的配置目录
+STANDBY_ARGS = {
+    'firefox': ['--no-remote', '--profile', '{profile_dir}'],
+    'luakit': ['--nounique'],
+}
+STANDBY_PROFILE_DIR = Path(tempfile.gettempdir()) / 'web-kiosk-standby'
+
+# 指定独立配置目录的参数，{profile_dir} 会被替换为内存中的配置目录
+PROFILE_ARGS = {
+    'chromium-browser': ['--user-data-dir={profile_dir}'],
+    'chromium': ['--user-data-dir={profile_dir}'],
+    'google-chrome': ['--user-data-dir={profile_dir}'],
+    'firefox': ['--no-remote', '--profile', '{profile_dir}'],
+}
+# 需要回写到快照的配置状态（相对配置目录的路径）
+PROFILE_SYNC_PATHS = {
+    'chromium-browser': ['Default/Cookies', 'Default/Local Storage', 'Default/Preferences'],
+    'chromium': ['Default/Cookies', 'Default/Local Storage', 'Default/Preferences'],
+    'google-chrome': ['Default/Cookies', 'Default/Local Storage', 'Default/Preferences'],
+    'firefox': ['cookies.sqlite', 'prefs.js', 'webappsstore.sqlite', 'storage'],
+}
+# 生成快照时跳过的缓存和锁文件
+PROFILE_SNAPSHOT_EXCLUDE = ['Cache', 'Code Cache', 'GPUCache', 'ShaderCache', 'GrShaderCache',
+                            'cache2', 'startupCache', 'Crash Reports', 'crashes',
+                            'Singleton*', 'lock', '.parentlock', 'parent.lock']
+DEFAULT_RAM_PROFILE_DIR = (Path('/dev/shm') if os.path.isdir('/dev/shm')
+                           else Path(tempfile.gettempdir())) / 'web-kiosk-profile'
+DEFAULT_PROFILE_SNAPSHOT = LOG_DIR / 'profile-snapshot'
+SLOT_PROFILE_DIR = LOG_DIR / 'profiles'
+DEFAULT_PROXY_CACHE_DIR = Path.home() / '.cache' / 'web-kiosk-launcher' / 'proxy'
+
+class _Metric:
+    """指标基类：按标签值分组保存数据"""
+    
+    def __init__(self, name, help_text, kind):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self._lock = threading.Lock()
+        self._series = {}
+    
+    @staticmethod
+    def _format_labels(labels, extra=None):
+        items = list(labels) + ([extra] if extra else [])
+        if not items:
+            return ''
+        escaped = ['%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                   for k, v in items]
+        return '{' + ','.join(escaped) + '}'
+    
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for labels, value in series:
+            lines.extend(self._render_series(labels, value))
+        return lines
+
+class Counter(_Metric):
+    """只增计数器"""
+    
+    def __init__(self, name, help_text):
+        super().__init__(name, help_text, 'counter')
+    
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+    
+    def value(self, **labels):
+        return self._series.get(tuple(sorted(labels.items())), 0)
+    
+    def _render_series(self, labels, value):
+        return [f"{self.name}{self._format_labels(labels)} {value}"]
+
+class Histogram(_Metric):
+    """固定桶直方图（单位：秒）"""
+    
+    DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+    
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, 'histogram')
+        self.buckets = tuple(buckets)
+    
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [各桶计数..., +Inf 桶计数, 总和]
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+    
+    def count(self, **labels):
+        series = self._series.get(tuple(sorted(labels.items())))
+        return sum(series[:-1]) if series else 0
+    
+    def _render_series(self, labels, series):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{self._format_labels(labels, ('le', bound))} {cumulative}")
+        lines.append(f"{self.name}_sum{self._format_labels(labels)} {series[-1]:.6f}")
+        lines.append(f"{self.name}_count{self._format_labels(labels)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """指标注册表，以 Prometheus 文本格式输出"""
+    
+    def __init__(self):
+        self._metrics = []
+    
+    def counter(self, name, help_text):
+        metric = Counter(name, help_text)
+        self._metrics.append(metric)
+        return metric
+    
+    def histogram(self, name, help_text, buckets=Histogram.DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, buckets)
+        self._metrics.append(metric)
+        return metric
+    
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+METRICS = MetricsRegistry()
+OPEN_SECONDS = METRICS.histogram('kiosk_open_seconds',
+                                 'Total time spent in open_url() by method')
+OPEN_PHASE_SECONDS = METRICS.histogram('kiosk_open_phase_seconds',
+                                       'Time spent in each open_url() phase')
+KILL_SECONDS = METRICS.histogram('kiosk_browser_kill_seconds',
+                                 'Browser termination latency')
+HTTP_REQUEST_SECONDS = METRICS.histogram('kiosk_http_request_seconds',
+                                         'HTTP request handling latency by endpoint')
+REUSE_HITS = METRICS.counter('kiosk_reuse_hits_total',
+                             'Open requests answered by an already open URL')
+OPEN_FAILURES = METRICS.counter('kiosk_open_failures_total',
+                                'Failed open requests by reason')
+TIME_TO_READY_SECONDS = METRICS.histogram('kiosk_time_to_ready_seconds',
+                                          'Time from launch request to page readiness by browser',
+                                          buckets=(0.25, 0.5, 1, 2, 3, 5, 8, 13, 21, 30, 60))
+BROWSER_RECYCLES = METRICS.counter('kiosk_browser_recycles_total',
+                                   'Browser restarts performed by the watchdog by reason')
+PROXY_REQUESTS = METRICS.counter('kiosk_proxy_requests_total',
+                                 'Caching proxy requests by result (hit, miss, revalidated, '
+                                 'stale, bypass, tunnel, error)')
+PROXY_EVICTIONS = METRICS.counter('kiosk_proxy_evictions_total',
+                                  'Responses evicted from the proxy cache')
+LOG_RECORDS_DROPPED = METRICS.counter('kiosk_log_records_dropped_total',
+                                      'Log records dropped because the log queue was full')
+BROWSER_CRASHES = METRICS.counter('kiosk_browser_crashes_total',
+                                  'Browser processes that exited unexpectedly')
+CONFIG_RELOADS = METRICS.counter('kiosk_config_reloads_total',
+                                 'Configuration reloads by result (applied, unchanged, invalid)')
+BOOT_STAGE_SECONDS = METRICS.histogram('kiosk_boot_stage_seconds',
+                                       'Time from process start to each boot stage',
+                                       buckets=(0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 21, 30, 60))
+PLAYLIST_DRIFT_SECONDS = METRICS.histogram('kiosk_playlist_drift_seconds',
+                                           'Delay between the scheduled start of a playlist item '
+                                           'and the end of its transition, by slot and method')
+PLAYLIST_MISSED = METRICS.counter('kiosk_playlist_missed_total',
+                                  'Playlist items skipped because their whole slot had passed')
+
+class AllowListIndex:
+    """预编译的域名白名单索引
+    
+    条目按反转后的域名标签组织成前缀树，查询复杂度与域名标签数成正比，
+    与白名单长度无关。支持的条目格式：
+      example.com              example.com 及其所有子域名
+      *.example.com            仅子域名
+      example.com:8080         仅指定端口
+      https://example.com      仅指定协议
+      example.com/dashboards   仅指定路径前缀（按路径段匹配）
+    以上形式可组合使用，例如 https://*.example.com:8443/app。IP 地址只做精确匹配。
+    """
+    
+    def __init__(self, entries=()):
+        self._root = {}
+        self.size = 0
+        for entry in entries:
+            self.add(entry)
+    
+    def add(self, entry):
+        """添加一条白名单规则，无法解析的条目会被忽略"""
+        entry = entry.strip()
+        if not entry:
+            return
+        
+        scheme = None
+        if '://' in entry:
+            scheme, entry = entry.split('://', 1)
+            scheme = scheme.lower()
+        
+        host, sep, path = entry.partition('/')
+        path = '/' + path.rstrip('/') if sep and path.strip('/') else None
+        
+        port = None
+        if host.count(':') == 1:
+            host, port_str = host.split(':')
+            if not port_str.isdigit():
+                logging.warning(f"Ignoring invalid allow-list entry: {entry}")
+                return
+            port = int(port_str)
+        
+        host = host.lower().rstrip('.')
+        subdomains_only = host.startswith('*.')
+        if subdomains_only:
+            host = host[2:]
+        if not host:
+            logging.warning(f"Ignoring invalid allow-list entry: {entry}")
+            return
+        
+        try:
+            ipaddress.ip_address(host)
+            exact = True
+        except ValueError:
+            exact = False
+        
+        node = self._root
+        for label in reversed(host.split('.')):
+            node = node.setdefault(label, {})
+        # 规则：(匹配本域名, 匹配子域名, 协议, 端口, 路径前缀)
+        node.setdefault(None, []).append((not subdomains_only, not exact, scheme, port, path))
+        self.size += 1
+    
+    def __len__(self):
+        return self.size
+    
+    @staticmethod
+    def _rule_matches(rule, scheme, port, path):
+        _, _, rule_scheme, rule_port, rule_path = rule
+        if rule_scheme and rule_scheme != scheme:
+            return False
+        if rule_port is not None and rule_port != port:
+            return False
+        if rule_path and not (path == rule_path or path.startswith(rule_path + '/')):
+            return False
+        return True
+    
+    def allows(self, url):
+        """检查URL是否被白名单允许"""
+        try:
+            parsed = urlparse(url)
+            host = (parsed.hostname or '').rstrip('.')
+            port = parsed.port or {'http': 80, 'https': 443}.get(parsed.scheme)
+        except ValueError:
+            return False
+        if not host:
+            return False
+        
+        scheme = parsed.scheme
+        path = parsed.path or '/'
+        labels = host.split('.')
+        node = self._root
+        for depth, label in enumerate(reversed(labels), 1):
+            node = node.get(label)
+            if node is None:
+                return False
+            rules = node.get(None)
+            if not rules:
+                continue
+            is_self = depth == len(labels)
+            for rule in rules:
+                if (rule[0] if is_self else rule[1]) and self._rule_matches(rule, scheme, port, path):
+                    return True
+        return False
+
+class SlotConfig:
+    """浏览器槽位配置
+    
+    每个槽位是一个独立的浏览器实例，拥有自己的显示器（DISPLAY）、窗口位置
+    和尺寸、配置目录、默认URL、PID文件和 DevTools 端口。
+    """
+    
+    def __init__(self, slot_id=DEFAULT_SLOT, index=0, display=None, geometry=None,
+                 url=None, profile_dir=None):
+        self.slot_id = slot_id
+        self.index = index
+        self.display = display
+        self.geometry = geometry
+        self.url = url
+        self.profile_dir = profile_dir
+    
+    def __eq__(self, other):
+        return isinstance(other, SlotConfig) and vars(self) == vars(other)
+    
+    @property
+    def is_default(self):
+        return self.slot_id == DEFAULT_SLOT
+    
+    @property
+    def pid_file(self):
+        if self.is_default:
+            return PID_FILE
+        return f'/tmp/web-kiosk-browser-{self.slot_id}.pid'
+    
+    @staticmethod
+    def parse_geometry(value):
+        """解析 WxH+X+Y 格式的窗口几何参数"""
+        size, _, position = value.partition('+')
+        width, height = size.lower().split('x')
+        x, _, y = position.partition('+')
+        return int(width), int(height), int(x or 0), int(y or 0)
+    
+    @classmethod
+    def from_env(cls, slot_id, index, env=None):
+        """读取 SLOT_<ID>_DISPLAY / _GEOMETRY / _URL / _PROFILE（env 默认为进程环境）"""
+        env = os.environ if env is None else env
+        prefix = 'SLOT_' + slot_id.upper().replace('-', '_') + '_'
+        geometry = env.get(prefix + 'GEOMETRY')
+        return cls(slot_id, index,
+                   display=env.get(prefix + 'DISPLAY') or None,
+                   geometry=cls.parse_geometry(geometry) if geometry else None,
+                   url=env.get(prefix + 'URL') or None,
+                   profile_dir=os.path.expanduser(env[prefix + 'PROFILE'])
+                   if env.get(prefix + 'PROFILE') else None)
+    
+    def to_dict(self):
+        return {
+            'id': self.slot_id,
+            'display': self.display,
+            'geometry': ('{}x{}+{}+{}'.format(*self.geometry) if self.geometry else None),
+            'default_url': self.url
+        }
+
 class Config:
     """配置管理类"""
     
-    def __init__(self):
+    # 修改后需要重启服务才能生效的配置项，热加载时保持运行中的值
+    RESTART_FIELDS = ('host', 'port', 'threaded_server', 'slots', 'pid_file', 'state_file',
+                      'devtools_port', 'watchdog_enabled', 'adopt_browser',
+                      'ram_profile', 'ram_profile_dir', 'profile_snapshot',
+                      'profile_sync_interval', 'profile_sync_paths',
+                      'cache_proxy', 'cache_proxy_port', 'cache_proxy_dir',
+                      'cache_proxy_max_mb', 'cache_proxy_timeout',
+                      'log_file', 'log_format', 'log_max_mb', 'log_backups', 'log_rotate_when')
+    # 决定浏览器启动命令的配置项，热加载时重新检测浏览器
+    BROWSER_FIELDS = ('browser', 'enable_gpu', 'browser_policy', 'browser_calibration',
+                      'browser_probe_cache')
+    # .env 覆盖前的环境变量原值（进程内共享），重新加载时用于恢复已从 .env 删除的键
+    _env_originals = {}
+    
+    def __init__(self, env_file=ENV_FILE, export=True):
+        """export 为 False 时只解析配置，不修改进程环境（热加载在校验通过后再导出）"""
+        self.env_file = env_file
         self.host = DEFAULT_HOST
         self.port = DEFAULT_PORT
         self.default_url = DEFAULT_URL
@@ -57,258 +478,3369 @@ class Config:
         self.basic_auth_user = 'admin'
         self.basic_auth_pass = 'password'
         self.allow_list = []
+        self.allow_index = AllowListIndex()
+        self.threaded_server = True
+        self.devtools_navigation = True
+        self.devtools_port = DEFAULT_DEVTOOLS_PORT
+        self.standby_mode = False
+        self.standby_ready = 'delay:3'
+        self.standby_ready_timeout = 15
+        self.standby_max = 1
+        self.launch_min_interval = 0.0
+        self.launch_max_pending = 32
+        self.browser_timeout = 30.0
+        self.watchdog_enabled = True
+        self.watchdog_interval = 10.0
+        self.watchdog_max_rss_mb = 0
+        self.watchdog_max_cpu_percent = 0
+        self.watchdog_cpu_samples = 3
+        self.recycle_window = ''
+        self.recycle_min_uptime = 6.0
+        self.crash_backoff_base = 2.0
+        self.crash_backoff_max = 300.0
+        self.ram_profile = False
+        self.ram_profile_dir = str(DEFAULT_RAM_PROFILE_DIR)
+        self.profile_snapshot = str(DEFAULT_PROFILE_SNAPSHOT)
+        self.profile_sync_interval = 0.0
+        self.profile_sync_paths = []
+        self.cache_proxy = False
+        self.cache_proxy_port = 0
+        self.cache_proxy_dir = str(DEFAULT_PROXY_CACHE_DIR)
+        self.cache_proxy_max_mb = 256
+        self.cache_proxy_timeout = 10.0
+        self.slots = [SlotConfig()]
+        self.pid_file = PID_FILE
+        self.browser = ''
+        self.state_file = str(STATE_FILE)
+        self.adopt_browser = True
+        self.log_level = 'INFO'
+        self.verbose_logging = False
+        self.log_file = str(LOG_FILE)
+        self.log_format = 'text'
+        self.log_max_mb = 10
+        self.log_backups = 5
+        self.log_rotate_when = ''
+        self.access_log_sample = 1.0
+        self.autolaunch = False
+        self.browser_probe_cache = str(BROWSER_PROBE_CACHE)
+        self.browser_policy = 'explicit'
+        self.browser_overrides = []
+        self.browser_calibration = str(BROWSER_CALIBRATION)
+        self.config_reload_interval = 2.0
+        self.playlist = ''
+        self.playlist_preload = 5.0
         self._load_env()
+        if export:
+            self.export_env()
     
     def _load_env(self):
         """从环境变量和.env文件加载配置"""
         # 加载.env文件
-        env_file = Path('.env')
+        values = {}
+        env_file = Path(self.env_file)
         if env_file.exists():
             with open(env_file, 'r') as f:
                 for line in f:
                     line = line.strip()
                     if line and not line.startswith('#') and '=' in line:
                         key, value = line.split('=', 1)
-                        os.environ[key] = value
+                        values[key] = value
+        self._env_values = values
+        # 在副本上合并 .env，导出到进程环境由 export_env() 负责
+        env = dict(os.environ)
+        for key, original in Config._env_originals.items():
+            if key not in values:
+                if original is None:
+                    env.pop(key, None)
+                else:
+                    env[key] = original
+        env.update(values)
         
         # 从环境变量读取配置
-        self.host = os.environ.get('HOST', self.host)
-        self.port = int(os.environ.get('PORT', self.port))
-        self.default_url = os.environ.get('DEFAULT_URL', self.default_url)
-        self.enable_gpu = os.environ.get('ENABLE_GPU', 'false').lower() == 'true'
-        self.reuse_instance = os.environ.get('REUSE_INSTANCE', 'true').lower() == 'true'
-        self.basic_auth = os.environ.get('BASIC_AUTH', 'false').lower() == 'true'
-        self.basic_auth_user = os.environ.get('BASIC_AUTH_USER', self.basic_auth_user)
-        self.basic_auth_pass = os.environ.get('BASIC_AUTH_PASS', self.basic_auth_pass)
-        
-        allow_list_str = os.environ.get('ALLOW_LIST', '')
+        self.host = env.get('HOST', self.host)
+        self.port = int(env.get('PORT', self.port))
+        self.default_url = env.get('DEFAULT_URL', self.default_url)
+        self.enable_gpu = env.get('ENABLE_GPU', 'false').lower() == 'true'
+        self.reuse_instance = env.get('REUSE_INSTANCE', 'true').lower() == 'true'
+        self.basic_auth = env.get('BASIC_AUTH', 'false').lower() == 'true'
+        self.basic_auth_user = env.get('BASIC_AUTH_USER', self.basic_auth_user)
+        self.basic_auth_pass = env.get('BASIC_AUTH_PASS', self.basic_auth_pass)
+        self.threaded_server = env.get('THREADED_SERVER', 'true').lower() == 'true'
+        self.devtools_navigation = env.get('DEVTOOLS_NAVIGATION', 'true').lower() == 'true'
+        self.devtools_port = int(env.get('DEVTOOLS_PORT', self.devtools_port))
+        self.standby_mode = env.get('STANDBY_MODE', 'false').lower() == 'true'
+        self.standby_ready = env.get('STANDBY_READY', self.standby_ready)
+        self.standby_ready_timeout = float(env.get('STANDBY_READY_TIMEOUT',
+                                                   self.standby_ready_timeout))
+        self.standby_max = int(env.get('STANDBY_MAX', self.standby_max))
+        self.launch_min_interval = float(env.get('LAUNCH_MIN_INTERVAL',
+                                                 self.launch_min_interval))
+        self.launch_max_pending = int(env.get('LAUNCH_MAX_PENDING',
+                                              self.launch_max_pending))
+        self.browser_timeout = float(env.get('BROWSER_TIMEOUT', self.browser_timeout))
+        self.watchdog_enabled = env.get('WATCHDOG_ENABLED', 'true').lower() == 'true'
+        self.watchdog_interval = float(env.get('WATCHDOG_INTERVAL', self.watchdog_interval))
+        self.watchdog_max_rss_mb = int(env.get('WATCHDOG_MAX_RSS_MB', self.watchdog_max_rss_mb))
+        self.watchdog_max_cpu_percent = float(env.get('WATCHDOG_MAX_CPU_PERCENT',
+                                                      self.watchdog_max_cpu_percent))
+        self.watchdog_cpu_samples = int(env.get('WATCHDOG_CPU_SAMPLES',
+                                                self.watchdog_cpu_samples))
+        self.recycle_window = env.get('RECYCLE_WINDOW', self.recycle_window)
+        self.recycle_min_uptime = float(env.get('RECYCLE_MIN_UPTIME', self.recycle_min_uptime))
+        self.crash_backoff_base = float(env.get('CRASH_BACKOFF_BASE', self.crash_backoff_base))
+        self.crash_backoff_max = float(env.get('CRASH_BACKOFF_MAX', self.crash_backoff_max))
+        self.ram_profile = env.get('RAM_PROFILE', 'false').lower() == 'true'
+        self.ram_profile_dir = os.path.expanduser(env.get('RAM_PROFILE_DIR',
+                                                          self.ram_profile_dir))
+        self.profile_snapshot = os.path.expanduser(env.get('PROFILE_SNAPSHOT',
+                                                           self.profile_snapshot))
+        self.profile_sync_interval = float(env.get('PROFILE_SYNC_INTERVAL',
+                                                   self.profile_sync_interval))
+        sync_paths = env.get('PROFILE_SYNC_PATHS', '')
+        if sync_paths:
+            self.profile_sync_paths = [p.strip() for p in sync_paths.split(',') if p.strip()]
+        self.cache_proxy = env.get('CACHE_PROXY', 'false').lower() == 'true'
+        self.cache_proxy_port = int(env.get('CACHE_PROXY_PORT', self.cache_proxy_port))
+        self.cache_proxy_dir = os.path.expanduser(env.get('CACHE_PROXY_DIR',
+                                                          self.cache_proxy_dir))
+        self.cache_proxy_max_mb = int(env.get('CACHE_PROXY_MAX_MB', self.cache_proxy_max_mb))
+        self.cache_proxy_timeout = float(env.get('CACHE_PROXY_TIMEOUT',
+                                                 self.cache_proxy_timeout))
+        self.pid_file = env.get('PID_FILE', self.pid_file)
+        self.browser = env.get('BROWSER', self.browser)
+        self.state_file = os.path.expanduser(env.get('STATE_FILE', self.state_file))
+        self.adopt_browser = env.get('ADOPT_BROWSER', 'true').lower() == 'true'
+        self.log_level = env.get('LOG_LEVEL', self.log_level).upper()
+        self.verbose_logging = env.get('VERBOSE_LOGGING', 'false').lower() == 'true'
+        self.log_file = os.path.expanduser(env.get('LOG_FILE', self.log_file))
+        self.log_format = env.get('LOG_FORMAT', self.log_format).lower()
+        self.log_max_mb = float(env.get('LOG_MAX_MB', self.log_max_mb))
+        self.log_backups = int(env.get('LOG_BACKUPS', self.log_backups))
+        self.log_rotate_when = env.get('LOG_ROTATE_WHEN', self.log_rotate_when)
+        self.access_log_sample = float(env.get('ACCESS_LOG_SAMPLE', self.access_log_sample))
+        self.autolaunch = env.get('AUTOLAUNCH', 'false').lower() == 'true'
+        self.browser_probe_cache = os.path.expanduser(env.get('BROWSER_PROBE_CACHE',
+                                                              self.browser_probe_cache))
+        self.browser_policy = env.get('BROWSER_POLICY', self.browser_policy).lower()
+        self.browser_calibration = os.path.expanduser(env.get('BROWSER_CALIBRATION',
+                                                              self.browser_calibration))
+        self.config_reload_interval = float(env.get('CONFIG_RELOAD_INTERVAL',
+                                                    self.config_reload_interval))
+        self.playlist = os.path.expanduser(env.get('PLAYLIST', self.playlist))
+        self.playlist_preload = float(env.get('PLAYLIST_PRELOAD', self.playlist_preload))
+        # 格式：模式=浏览器或策略，逗号分隔，例如 *.youtube.com=chromium,*/legacy/*=firefox
+        overrides = env.get('BROWSER_OVERRIDES', '')
+        if overrides:
+            self.browser_overrides = [tuple(part.strip() for part in rule.rsplit('=', 1))
+                                      for rule in overrides.split(',') if '=' in rule]
+        slot_ids = [s.strip() for s in env.get('SLOTS', '').split(',') if s.strip()]
+        if slot_ids:
+            self.slots = [SlotConfig.from_env(slot_id, index, env)
+                          for index, slot_id in enumerate(slot_ids)]
+        
+        allow_list_str = env.get('ALLOW_LIST', '')
         if allow_list_str:
             self.allow_list = [domain.strip() for domain in allow_list_str.split(',')]
-
-class BrowserManager:
-    """浏览器管理类"""
+        self.allow_index = AllowListIndex(self.allow_list)
     
-    def __init__(self, config):
-        self.config = config
-        self.current_pid = None
-        self.current_url = None
-        self.browser_cmd = None
-        self._detect_browser()
+    def export_env(self):
+        """把 .env 中的值写入进程环境（之后启动的浏览器会继承），并恢复已从 .env 删除的键"""
+        values = self._env_values
+        for key, original in list(Config._env_originals.items()):
+            if key not in values:
+                if original is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = original
+                del Config._env_originals[key]
+        for key, value in values.items():
+            if key not in Config._env_originals:
+                # systemd 的 EnvironmentFile 已从同一文件注入的值视为来自 .env
+                original = os.environ.get(key)
+                Config._env_originals[key] = None if original == value else original
+            os.environ[key] = value
     
-    def _detect_browser(self):
-        """检测可用的浏览器"""
-        for browser_name, default_args in BROWSERS:
+    def validate(self):
+        """检查配置取值，返回错误信息列表"""
+        errors = []
+        if not 0 <= self.port <= 65535:
+            errors.append(f"PORT out of range: {self.port}")
+        parsed = urlparse(self.default_url)
+        if parsed.scheme not in ('http', 'https') or not parsed.netloc:
+            errors.append(f"DEFAULT_URL is not an http(s) URL: {self.default_url}")
+        if self.browser_policy not in BROWSER_POLICIES:
+            errors.append(f"Unknown BROWSER_POLICY: {self.browser_policy}")
+        if self.log_format not in ('text', 'json'):
+            errors.append(f"Unknown LOG_FORMAT: {self.log_format}")
+        if not isinstance(getattr(logging, self.log_level, None), int):
+            errors.append(f"Unknown LOG_LEVEL: {self.log_level}")
+        if not 0 <= self.access_log_sample <= 1:
+            errors.append(f"ACCESS_LOG_SAMPLE must be between 0 and 1: {self.access_log_sample}")
+        for name in ('browser_timeout', 'watchdog_interval', 'launch_max_pending'):
+            if getattr(self, name) <= 0:
+                errors.append(f"{name.upper()} must be positive: {getattr(self, name)}")
+        if self.launch_min_interval < 0 or self.config_reload_interval < 0:
+            errors.append("LAUNCH_MIN_INTERVAL and CONFIG_RELOAD_INTERVAL must not be negative")
+        if self.playlist_preload < 0:
+            errors.append(f"PLAYLIST_PRELOAD must not be negative: {self.playlist_preload}")
+        if self.playlist:
             try:
-                result = subprocess.run(['which', browser_name], 
-                                      capture_output=True, text=True, check=True)
-                self.browser_cmd = browser_name
-                self.browser_args = default_args
-                
-                # 根据GPU配置调整参数
-                if not self.config.enable_gpu:
-                    self.browser_args = [arg for arg in self.browser_args 
-                                        if not arg.startswith('--enable-gpu')]
-                    if '--disable-gpu' not in self.browser_args:
-                        self.browser_args.append('--disable-gpu')
-                
-                logging.info(f"Detected browser: {browser_name}")
-                return
-            except subprocess.CalledProcessError:
-                continue
-        
-        logging.error("No browser found")
-        self.browser_cmd = None
+                load_playlist(self.playlist)
+            except ValueError as e:
+                errors.append(str(e))
+        return errors
     
-    def _get_browser_pid(self):
-        """获取当前浏览器进程PID"""
-        if not os.path.exists(PID_FILE):
-            return None
+    def diff(self, other):
+        """返回与另一份配置取值不同的配置项（不含由其他项派生的 allow_index 和内部状态）"""
+        return [name for name, value in vars(self).items()
+                if name != 'allow_index' and not name.startswith('_') and
+                value != vars(other).get(name)]
+    
+    def replace_with(self, other):
+        """一次性替换全部配置项
         
-        try:
-            with open(PID_FILE, 'r') as f:
-                pid = int(f.read().strip())
-            
-            # 检查进程是否还存在
-            try:
-                os.kill(pid, 0)
-                return pid
-            except OSError:
-                # 进程不存在，删除PID文件
-                os.remove(PID_FILE)
-                return None
-        except (ValueError, IOError):
-            return None
+        替换实例的属性字典是单次引用赋值，持有本对象的组件读到的每一项
+        要么全部来自旧配置，要么全部来自新配置，不会看到解析到一半的状态。
+        """
+        self.__dict__ = vars(other)
+
+class DevToolsError(Exception):
+    """DevTools 协议通信失败"""
+
+
+def _ws_send(sock, payload, mask=True):
+    """发送一个 WebSocket 文本帧（客户端帧必须加掩码）"""
+    data = payload.encode('utf-8')
+    header = bytearray([0x81])
+    mask_bit = 0x80 if mask else 0
+    length = len(data)
+    if length < 126:
+        header.append(mask_bit | length)
+    elif length < 65536:
+        header.append(mask_bit | 126)
+        header += struct.pack('!H', length)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack('!Q', length)
+    if mask:
+        key = os.urandom(4)
+        header += key
+        data = bytes(b ^ key[i % 4] for i, b in enumerate(data))
+    sock.sendall(bytes(header) + data)
+
+
+def _ws_recv_exact(sock, n):
+    """从套接字读取恰好 n 字节"""
+    buf = b''
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise DevToolsError("WebSocket connection closed")
+        buf += chunk
+    return buf
+
+
+def _ws_recv(sock):
+    """接收一条完整的 WebSocket 文本消息（处理分片、ping 和掩码）"""
+    message = b''
+    while True:
+        b1, b2 = _ws_recv_exact(sock, 2)
+        opcode = b1 & 0x0f
+        length = b2 & 0x7f
+        if length == 126:
+            length = struct.unpack('!H', _ws_recv_exact(sock, 2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', _ws_recv_exact(sock, 8))[0]
+        key = _ws_recv_exact(sock, 4) if b2 & 0x80 else None
+        data = _ws_recv_exact(sock, length) if length else b''
+        if key:
+            data = bytes(b ^ key[i % 4] for i, b in enumerate(data))
+        
+        if opcode == 0x8:
+            raise DevToolsError("WebSocket closed by peer")
+        if opcode == 0x9:
+            # ping -> pong，按 RFC 6455 原样带回 ping 的负载（控制帧不超过 125 字节）
+            key = os.urandom(4)
+            sock.sendall(bytes([0x8a, 0x80 | len(data)]) + key +
+                         bytes(b ^ key[i % 4] for i, b in enumerate(data)))
+            continue
+        if opcode == 0xa:
+            continue
+        
+        message += data
+        if b1 & 0x80:
+            return message.decode('utf-8')
+
+
+class DevToolsClient:
+    """Chromium DevTools 协议的最小客户端（仅使用标准库）"""
     
-    def _save_browser_pid(self, pid):
-        """保存浏览器进程PID"""
-        with open(PID_FILE, 'w') as f:
-            f.write(str(pid))
-        self.current_pid = pid
+    def __init__(self, port, host='127.0.0.1', timeout=2):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._next_id = 0
     
-    def _kill_browser(self, timeout=5):
-        """关闭浏览器进程"""
-        pid = self._get_browser_pid()
-        if not pid:
+    def _http_json(self, method, path):
+        """调用 DevTools HTTP 端点并解析JSON"""
+        try:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            conn.request(method, path)
+            response = conn.getresponse()
+            body = response.read()
+            conn.close()
+        except (OSError, http.client.HTTPException) as e:
+            raise DevToolsError(f"DevTools endpoint unreachable: {e}")
+        if response.status != 200:
+            raise DevToolsError(f"DevTools returned HTTP {response.status}")
+        try:
+            return json.loads(body.decode('utf-8'))
+        except ValueError as e:
+            raise DevToolsError(f"Invalid DevTools response: {e}")
+    
+    def is_available(self):
+        """检查调试端点是否可用"""
+        try:
+            self._http_json('GET', '/json/version')
             return True
+        except DevToolsError:
+            return False
+    
+    def list_pages(self):
+        """列出所有页面类型的目标"""
+        return [t for t in self._http_json('GET', '/json/list') if t.get('type') == 'page']
+    
+    def _connect(self, ws_url):
+        """与目标页面建立 WebSocket 连接"""
+        parsed = urlparse(ws_url)
+        try:
+            sock = socket.create_connection((parsed.hostname, parsed.port or 80),
+                                            timeout=self.timeout)
+        except OSError as e:
+            raise DevToolsError(f"WebSocket connect failed: {e}")
         
+        key = base64.b64encode(os.urandom(16)).decode('ascii')
+        request = (f"GET {parsed.path} HTTP/1.1\r\n"
+                   f"Host: {parsed.hostname}:{parsed.port}\r\n"
+                   "Upgrade: websocket\r\n"
+                   "Connection: Upgrade\r\n"
+                   f"Sec-WebSocket-Key: {key}\r\n"
+                   "Sec-WebSocket-Version: 13\r\n\r\n")
         try:
-            # 发送SIGTERM
-            os.kill(pid, signal.SIGTERM)
-            
-            # 等待进程结束
-            start_time = time.time()
-            while time.time() - start_time < timeout:
-                try:
-                    os.kill(pid, 0)
-                    time.sleep(0.1)
-                except OSError:
-                    # 进程已结束
+            sock.sendall(request.encode('ascii'))
+            response = b''
+            while b'\r\n\r\n' not in response:
+                chunk = sock.recv(1024)
+                if not chunk:
                     break
-            
-            # 如果进程仍在运行，发送SIGKILL
+                response += chunk
+        except OSError as e:
+            sock.close()
+            raise DevToolsError(f"WebSocket handshake failed: {e}")
+        
+        status_line = response.split(b'\r\n', 1)[0]
+        if status_line.split()[1:2] != [b'101']:
+            sock.close()
+            raise DevToolsError(f"WebSocket handshake rejected: {status_line!r}")
+        return sock
+    
+    def call(self, ws_url, method, params=None):
+        """在指定页面上执行一条 DevTools 命令并返回结果"""
+        sock = self._connect(ws_url)
+        try:
+            self._next_id += 1
+            message_id = self._next_id
+            _ws_send(sock, json.dumps({'id': message_id, 'method': method,
+                                       'params': params or {}}))
+            while True:
+                message = json.loads(_ws_recv(sock))
+                if message.get('id') != message_id:
+                    # 忽略事件通知
+                    continue
+                if 'error' in message:
+                    raise DevToolsError(message['error'].get('message', 'DevTools error'))
+                return message.get('result', {})
+        except (OSError, ValueError) as e:
+            raise DevToolsError(f"DevTools call {method} failed: {e}")
+        finally:
+            sock.close()
+    
+    def active_page(self, pages=None):
+        """返回当前显示的页面目标
+        
+        /json/list 按最近活动排序，刚创建的后台标签页（预热页面）可能排在最前，
+        因此有多个页面时按 document.visibilityState 找出可见的那个。
+        """
+        pages = self.list_pages() if pages is None else pages
+        if not pages:
+            raise DevToolsError("No page target available")
+        if len(pages) == 1:
+            return pages[0]
+        for page in pages:
+            result = self.call(page['webSocketDebuggerUrl'], 'Runtime.evaluate',
+                               {'expression': 'document.visibilityState', 'returnByValue': True})
+            if result.get('result', {}).get('value') == 'visible':
+                return page
+        raise DevToolsError("No visible page target")
+    
+    def navigate(self, url):
+        """让当前显示的页面原地导航到指定URL"""
+        page = self.active_page()
+        result = self.call(page['webSocketDebuggerUrl'], 'Page.navigate', {'url': url})
+        if result.get('errorText'):
+            raise DevToolsError(result['errorText'])
+        return result
+    
+    def page_loaded(self, since):
+        """当前页面是否在 since（epoch 秒）之后开始加载且已触发 load 事件"""
+        pages = self.list_pages()
+        if not pages:
+            return False
+        expression = ("document.readyState === 'complete' && "
+                      f"performance.timeOrigin >= {since * 1000 - 1000:.0f}")
+        result = self.call(self.active_page(pages)['webSocketDebuggerUrl'], 'Runtime.evaluate',
+                           {'expression': expression, 'returnByValue': True})
+        return result.get('result', {}).get('value') is True
+    
+    def _browser_ws_url(self):
+        """浏览器级别（而非页面级别）的 WebSocket 地址，Target 域的命令需要在此执行"""
+        ws_url = self._http_json('GET', '/json/version').get('webSocketDebuggerUrl')
+        if not ws_url:
+            raise DevToolsError("Browser WebSocket endpoint not available")
+        return ws_url
+    
+    def open_background_page(self, url):
+        """在后台标签页中加载URL（不改变当前显示），返回目标ID"""
+        result = self.call(self._browser_ws_url(), 'Target.createTarget',
+                           {'url': url, 'background': True})
+        target_id = result.get('targetId')
+        if not target_id:
+            raise DevToolsError("Target.createTarget returned no target")
+        return target_id
+    
+    def activate_page(self, target_id):
+        """把指定标签页切到前台并关闭其余页面，使后续命令作用于该页面"""
+        ws_url = self._browser_ws_url()
+        self.call(ws_url, 'Target.activateTarget', {'targetId': target_id})
+        for page in self.list_pages():
+            if page.get('id') != target_id:
+                self.call(ws_url, 'Target.closeTarget', {'targetId': page['id']})
+    
+    def close_page(self, target_id):
+        """关闭指定标签页"""
+        self.call(self._browser_ws_url(), 'Target.closeTarget', {'targetId': target_id})
+
+class BrowserProcess:
+    """受监管的浏览器进程
+    
+    浏览器在独立的进程组中启动，关闭时对整个进程组发送信号，
+    以便一并回收 Chromium 的 zygote 和渲染进程。进程退出由
+    ProcessSupervisor 通知，不再轮询 PID。
+    """
+    
+    def __init__(self, cmd, on_exit=None, env=None):
+        self.cmd = cmd
+        self.popen = subprocess.Popen(cmd, close_fds=True, start_new_session=True, env=env)
+        self.pid = self.popen.pid
+        self.pgid = self.pid
+        self.started_at = time.time()
+        self.exited_at = None
+        self.returncode = None
+        self.terminating = False
+        self._on_exit = on_exit
+        self._exited = threading.Event()
+    
+    def poll(self):
+        """返回退出码，仍在运行时返回 None"""
+        return self.returncode if self._exited.is_set() else None
+    
+    def is_alive(self):
+        """进程是否仍在运行"""
+        return not self._exited.is_set()
+    
+    def wait(self, timeout=None):
+        """等待进程退出，返回是否已退出"""
+        return self._exited.wait(timeout)
+    
+    def _wait_exit(self):
+        """阻塞直到进程退出并返回退出码"""
+        return self.popen.wait()
+    
+    def _reap(self):
+        """回收已退出的进程（由监管线程调用）"""
+        self.returncode = self._wait_exit()
+        self.exited_at = time.time()
+        self._exited.set()
+        if self._on_exit:
             try:
-                os.kill(pid, signal.SIGKILL)
-                logging.info(f"Force killed browser process {pid}")
-            except OSError:
-                pass
-            
-            # 清理PID文件
-            if os.path.exists(PID_FILE):
-                os.remove(PID_FILE)
-            
-            self.current_pid = None
-            self.current_url = None
+                self._on_exit(self)
+            except Exception as e:
+                logging.error(f"Browser exit callback failed: {e}")
+    
+    def _signal_group(self, sig):
+        """向整个进程组发送信号，进程组不存在时返回 False"""
+        try:
+            os.killpg(self.pgid, sig)
             return True
-            
-        except OSError as e:
-            logging.error(f"Failed to kill browser process: {e}")
+        except ProcessLookupError:
+            return False
+        except PermissionError:
             return False
     
-    def open_url(self, url):
-        """打开指定URL"""
-        # 验证URL
-        if not self._validate_url(url):
-            return False, "Invalid URL"
+    def terminate(self, timeout=5):
+        """关闭进程组：先 SIGTERM，超时后才 SIGKILL
         
-        # 检查白名单
-        if self.config.allow_list and not self._check_whitelist(url):
-            return False, "URL not in whitelist"
+        返回包含 pid、耗时（毫秒）、是否强制结束及退出码的字典。
+        """
+        start_time = time.monotonic()
+        self.terminating = True
+        forced = False
         
-        # 检查是否复用实例
-        if (self.config.reuse_instance and 
-            self.current_url == url and 
-            self._get_browser_pid()):
-            return True, "URL already open"
+        if self.is_alive():
+            self._signal_group(signal.SIGTERM)
+            if not self.wait(timeout):
+                forced = True
+                self._signal_group(signal.SIGKILL)
+                self.wait(timeout)
         
-        # 关闭现有浏览器
-        self._kill_browser()
+        # 主进程退出后，清理组内残留的子进程
+        if self._signal_group(0):
+            self._signal_group(signal.SIGKILL)
         
-        # 检查显示环境
-        if not self._check_display():
-            return False, "No display available"
+        return {
+            'pid': self.pid,
+            'latency_ms': round((time.monotonic() - start_time) * 1000, 1),
+            'forced': forced,
+            'returncode': self.returncode
+        }
+
+def read_proc_stat(pid):
+    """读取 /proc/<pid>/stat，返回 (状态, 进程组, 启动时间)，进程不存在时返回 None
+    
+    启动时间以系统启动后的时钟滴答计，同一 PID 被复用时该值必然不同。
+    """
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    fields = stat[stat.rfind(b')') + 2:].split()
+    return fields[0].decode(), int(fields[2]), int(fields[19])
+
+def read_boot_id():
+    """当前系统启动的唯一ID，用于识别重启前保存的状态"""
+    try:
+        with open('/proc/sys/kernel/random/boot_id') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+class AdoptedProcess(BrowserProcess):
+    """由上一次运行的服务启动、本次重新接管的浏览器进程
+    
+    该进程不是本进程的子进程，无法取得退出码（returncode 始终为 None）；
+    退出通知同样来自 pidfd，不支持 pidfd 时轮询 /proc。
+    """
+    
+    def __init__(self, pid, pgid, cmd, started_at, start_ticks, on_exit=None):
+        self.cmd = cmd
+        self.popen = None
+        self.pid = pid
+        self.pgid = pgid
+        self.started_at = started_at
+        self.start_ticks = start_ticks
+        self.exited_at = None
+        self.returncode = None
+        self.terminating = False
+        self._on_exit = on_exit
+        self._exited = threading.Event()
+    
+    def _wait_exit(self):
+        while True:
+            stat = read_proc_stat(self.pid)
+            if stat is None or stat[0] == 'Z' or stat[2] != self.start_ticks:
+                return None
+            time.sleep(0.5)
+
+class ProcessSupervisor:
+    """浏览器进程监管器
+    
+    使用 pidfd（Linux 5.3+）在单个后台线程中等待所有受监管进程退出；
+    不支持 pidfd 时为每个进程使用一个阻塞等待线程。
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._watched = {}
+        self._poller = None
+        self._wake_r = self._wake_w = None
+        self._thread = None
+    
+    def spawn(self, cmd, on_exit=None, env=None):
+        """启动并监管一个进程"""
+        process = BrowserProcess(cmd, on_exit, env)
+        self._watch(process)
+        return process
+    
+    def adopt(self, pid, pgid, cmd, started_at, start_ticks, on_exit=None):
+        """监管一个已在运行的进程（调用方需已核对其启动时间）"""
+        process = AdoptedProcess(pid, pgid, cmd, started_at, start_ticks, on_exit)
+        self._watch(process)
+        return process
+    
+    def _watch(self, process):
+        """注册进程的退出通知"""
+        pidfd = None
+        if hasattr(os, 'pidfd_open'):
+            try:
+                pidfd = os.pidfd_open(process.pid)
+            except OSError:
+                pidfd = None
         
-        # 启动浏览器
+        if pidfd is None:
+            threading.Thread(target=process._reap, daemon=True).start()
+            return
+        
+        with self._lock:
+            if self._thread is None:
+                self._poller = select.poll()
+                self._wake_r, self._wake_w = os.pipe()
+                self._poller.register(self._wake_r, select.POLLIN)
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._watched[pidfd] = process
+            self._poller.register(pidfd, select.POLLIN)
+        os.write(self._wake_w, b'x')
+    
+    def _run(self):
+        """监管线程：pidfd 可读即表示进程已退出"""
+        while True:
+            for fd, _ in self._poller.poll():
+                if fd == self._wake_r:
+                    os.read(self._wake_r, 1024)
+                    continue
+                with self._lock:
+                    process = self._watched.pop(fd, None)
+                    self._poller.unregister(fd)
+                os.close(fd)
+                if process:
+                    process._reap()
+
+def display_env(display):
+    """返回指定 DISPLAY 的环境变量字典，display 为空时返回 None（继承当前环境）"""
+    if not display:
+        return None
+    env = dict(os.environ)
+    env['DISPLAY'] = display
+    return env
+
+def find_windows(pid, display=None):
+    """通过 xdotool 查找进程的所有可见窗口ID
+    
+    xdotool 不可用或超时时抛出 OSError / subprocess.TimeoutExpired。
+    """
+    result = subprocess.run(['xdotool', 'search', '--onlyvisible', '--pid', str(pid)],
+                            capture_output=True, text=True, timeout=2,
+                            env=display_env(display))
+    return result.stdout.split()
+
+def find_window(pid, display=None):
+    """通过 xdotool 查找进程的可见窗口ID，未找到返回 None"""
+    window_ids = find_windows(pid, display)
+    return window_ids[-1] if window_ids else None
+
+def uses_profile_dir(cmd, profile_dir):
+    """浏览器命令行是否使用该配置目录（--profile DIR 或 --user-data-dir=DIR）"""
+    target = str(profile_dir)
+    return any(arg == target or arg.endswith('=' + target) for arg in cmd or [])
+
+class StandbyPool:
+    """热备浏览器进程池
+    
+    在当前浏览器之外预先启动下一个浏览器实例，等待其就绪后再切换，
+    以隐藏冷启动耗时。同时存在的热备进程数受 max_standby 限制。
+    
+    热备窗口一映射就通过 xdotool 取消映射，冷启动过程不会盖住当前页面；
+    切换时 show() 重新映射并激活这些窗口。
+    
+    就绪判定（ready_spec）：
+      delay:<秒>  进程存活指定时长即视为就绪
+      window      该进程的窗口已映射（随即被隐藏）即视为就绪
+    """
+    
+    def __init__(self, supervisor, max_standby=1, ready_spec='delay:3', ready_timeout=15,
+                 profiles=None, name='', display=None):
+        self.supervisor = supervisor
+        self.profiles = profiles
+        # name 区分不同槽位的热备配置目录，display 用于窗口检测
+        self.name = name
+        self.display = display
+        self.max_standby = max_standby
+        self.ready_spec = ready_spec
+        self.ready_timeout = ready_timeout
+        self._processes = []
+        # 进程 -> {'windows': 已隐藏的窗口ID, 'stop': 停止隐藏的 Event}
+        self._hidden = {}
+    
+    def _alive(self):
+        """清理已退出的热备进程并返回仍存活的列表"""
+        self._processes = [p for p in self._processes if p.poll() is None]
+        return self._processes
+    
+    def has_capacity(self):
+        """是否还能再启动一个热备进程"""
+        return len(self._alive()) < self.max_standby
+    
+    def owns_profile(self, browser_cmd):
+        """热备实例是否自带独立配置目录参数"""
+        return any('{profile_dir}' in arg for arg in STANDBY_ARGS.get(browser_cmd, []))
+    
+    def standby_args(self, browser_cmd, foreground=None):
+        """为热备实例生成额外参数（独立的配置目录等）
+        
+        foreground 为当前前台浏览器进程。选用第一个既不被前台浏览器、也不被
+        存活的热备进程使用的配置目录槽位；槽位数比上限多一个，因此总有空闲槽位。
+        """
+        template = STANDBY_ARGS.get(browser_cmd, [])
+        if not template:
+            return []
+        prefix = f'{self.name}-' if self.name else ''
+        use_profiles = self.profiles and self.owns_profile(browser_cmd)
+        busy = self._alive() + ([foreground] if foreground is not None else [])
+        for slot in range(self.max_standby + 1):
+            if use_profiles:
+                profile_dir = self.profiles.root / f'{prefix}standby-{slot}'
+            else:
+                profile_dir = STANDBY_PROFILE_DIR / f'{prefix}slot-{slot}'
+            if not any(p.poll() is None and uses_profile_dir(p.cmd, profile_dir) for p in busy):
+                break
+        else:
+            raise RuntimeError("No free standby profile directory")
+        if use_profiles:
+            self.profiles.prepare(profile_dir.name, busy)
+        else:
+            profile_dir.mkdir(parents=True, exist_ok=True)
+        return [arg.replace('{profile_dir}', str(profile_dir)) for arg in template]
+    
+    def spawn(self, cmd, on_exit=None, env=None):
+        """启动一个热备进程，超过上限时返回 None"""
+        if not self.has_capacity():
+            return None
+        process = self.supervisor.spawn(cmd, on_exit, env)
+        self._processes.append(process)
+        self._hide(process)
+        return process
+    
+    def _hide(self, process):
+        """启动后台线程，把热备进程映射出的窗口立即取消映射"""
+        if shutil.which('xdotool') is None:
+            return
+        hidden = {'windows': [], 'stop': threading.Event()}
+        self._hidden[process] = hidden
+        threading.Thread(target=self._keep_hidden, args=(process, hidden),
+                         name=f'standby-hide-{process.pid}', daemon=True).start()
+    
+    def _keep_hidden(self, process, hidden):
+        """轮询热备进程的可见窗口并取消映射，直到切换、丢弃或进程退出"""
+        env = display_env(self.display)
+        while not hidden['stop'].is_set() and process.poll() is None:
+            try:
+                for window_id in find_windows(process.pid, self.display):
+                    subprocess.run(['xdotool', 'windowunmap', window_id],
+                                   capture_output=True, timeout=2, env=env)
+                    if window_id not in hidden['windows']:
+                        hidden['windows'].append(window_id)
+            except (OSError, subprocess.TimeoutExpired) as e:
+                logging.warning(f"Cannot hide standby browser PID {process.pid}: {e}")
+                hidden['stop'].set()
+                return
+            # 窗口已隐藏后只需偶尔检查浏览器是否重新映射
+            hidden['stop'].wait(0.5 if hidden['windows'] else 0.05)
+    
+    def show(self, process):
+        """停止隐藏热备窗口，重新映射并激活，返回是否找到过窗口"""
+        hidden = self._hidden.pop(process, None)
+        if hidden is None:
+            return False
+        hidden['stop'].set()
+        env = display_env(self.display)
+        for window_id in hidden['windows']:
+            try:
+                subprocess.run(['xdotool', 'windowmap', window_id],
+                               capture_output=True, timeout=2, env=env)
+                subprocess.run(['xdotool', 'windowactivate', window_id],
+                               capture_output=True, timeout=2, env=env)
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+        return bool(hidden['windows'])
+    
+    def release(self, process):
+        """热备进程已切换到前台，不再计入热备数量"""
+        if process in self._processes:
+            self._processes.remove(process)
+        hidden = self._hidden.pop(process, None)
+        if hidden is not None:
+            hidden['stop'].set()
+    
+    def discard(self, process):
+        """丢弃未能就绪的热备进程"""
+        self.release(process)
+        process.terminate(timeout=1)
+    
+    def wait_ready(self, process, cancel=None):
+        """等待热备进程就绪，返回 (是否就绪, 窗口ID或None)
+        
+        cancel 为可选的 threading.Event，被置位时立即放弃等待。
+        """
+        kind, _, value = self.ready_spec.partition(':')
+        deadline = time.monotonic() + self.ready_timeout
+        
+        def abandoned():
+            return process.poll() is not None or (cancel is not None and cancel.is_set())
+        
+        if kind == 'window':
+            hidden = self._hidden.get(process)
+            while time.monotonic() < deadline:
+                if abandoned():
+                    return False, None
+                if hidden is None:
+                    return False, None
+                if hidden['windows']:
+                    return True, hidden['windows'][-1]
+                if hidden['stop'].is_set():
+                    return False, None
+                time.sleep(0.05)
+            return False, None
+        
+        # 按进程的存活时长计算，提前启动（预热）的进程无需再等满 delay
+        delay = min(float(value or 0), self.ready_timeout)
+        end = time.monotonic() + delay - max(0.0, time.time() - process.started_at)
+        while time.monotonic() < end:
+            if abandoned():
+                return False, None
+            time.sleep(0.05)
+        return not abandoned(), None
+
+class ProfileManager:
+    """内存配置目录管理
+    
+    每次启动前把预热好的配置快照复制到 tmpfs 上的独立目录，浏览器的
+    配置初始化和磁盘缓存读写都在内存中完成，也避免反复写入SD卡。
+    快照不存在时，首次同步会把运行中的完整配置（不含缓存）保存为快照；
+    之后只回写 sync_paths 中列出的状态（Cookie、本地存储等）。
+    """
+    
+    def __init__(self, root, snapshot, sync_paths=None, sync_interval=0):
+        self.root = Path(root)
+        self.snapshot = Path(snapshot) if snapshot else None
+        self.sync_paths = sync_paths
+        self.sync_interval = sync_interval
+        self.browser_cmd = None
+        self.last_seed_ms = None
+        self._active = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+    
+    def supports(self, browser_cmd):
+        return browser_cmd in PROFILE_ARGS
+    
+    def args(self, browser_cmd, slot='main', busy=()):
+        """准备配置目录并返回对应的浏览器参数"""
+        template = PROFILE_ARGS.get(browser_cmd)
+        if not template:
+            return []
+        self.browser_cmd = browser_cmd
+        profile_dir = self.prepare(slot, busy)
+        return [arg.replace('{profile_dir}', str(profile_dir)) for arg in template]
+    
+    def prepare(self, slot='main', busy=()):
+        """回写上次运行的状态后，用快照重新填充该槽位的配置目录
+        
+        busy 为仍在运行的浏览器进程；其中任一进程正在使用该目录时抛出
+        RuntimeError，不会在运行中的浏览器下面删除并重新填充配置目录。
+        """
+        profile_dir = self.root / slot
+        for process in busy:
+            if process.poll() is None and uses_profile_dir(process.cmd, profile_dir):
+                raise RuntimeError(f"Profile directory {profile_dir} is in use by PID {process.pid}")
+        with self._lock:
+            start = time.monotonic()
+            if profile_dir.exists():
+                self._sync_locked(profile_dir)
+                shutil.rmtree(profile_dir, ignore_errors=True)
+            if self.snapshot and self.snapshot.is_dir():
+                shutil.copytree(self.snapshot, profile_dir, symlinks=True)
+            else:
+                profile_dir.mkdir(parents=True, exist_ok=True)
+            self._active.add(profile_dir)
+            self.last_seed_ms = round((time.monotonic() - start) * 1000, 1)
+        logging.debug(f"Seeded RAM profile {profile_dir} in {self.last_seed_ms}ms")
+        return profile_dir
+    
+    def _paths_to_sync(self):
+        if self.sync_paths:
+            return self.sync_paths
+        return PROFILE_SYNC_PATHS.get(self.browser_cmd, [])
+    
+    def sync(self):
+        """把所有活动配置目录的状态回写到快照"""
+        with self._lock:
+            for profile_dir in list(self._active):
+                self._sync_locked(profile_dir)
+    
+    def _sync_locked(self, profile_dir):
+        if not self.snapshot or not profile_dir.is_dir():
+            return
         try:
-            cmd = [self.browser_cmd] + self.browser_args + [url]
-            process = subprocess.Popen(cmd, close_fds=True)
-            
-            self._save_browser_pid(process.pid)
-            self.current_url = url
-            
-            logging.info(f"Launched browser {self.browser_cmd} with PID {process.pid} for URL {url}")
-            return True, f"Launched {self.browser_cmd}"
-            
-        except Exception as e:
-            logging.error(f"Failed to launch browser: {e}")
-            return False, f"Failed to launch browser: {e}"
+            if not self.snapshot.is_dir():
+                self._replace(profile_dir, self.snapshot,
+                              ignore=shutil.ignore_patterns(*PROFILE_SNAPSHOT_EXCLUDE))
+                logging.info(f"Created profile snapshot {self.snapshot} from {profile_dir}")
+                return
+            for rel in self._paths_to_sync():
+                source = profile_dir / rel
+                if source.exists():
+                    self._replace(source, self.snapshot / rel)
+        except OSError as e:
+            logging.warning(f"Failed to sync profile {profile_dir}: {e}")
+    
+    @staticmethod
+    def _replace(source, target, ignore=None):
+        """先复制到临时路径再原子替换，避免快照处于半写入状态"""
+        target.parent.mkdir(parents=True, exist_ok=True)
+        staging = target.with_name(f'.{target.name}.tmp-{os.getpid()}')
+        if source.is_dir():
+            shutil.rmtree(staging, ignore_errors=True)
+            shutil.copytree(source, staging, symlinks=True, ignore=ignore)
+            if target.exists():
+                old = target.with_name(f'.{target.name}.old-{os.getpid()}')
+                os.replace(target, old)
+                os.replace(staging, target)
+                shutil.rmtree(old, ignore_errors=True)
+            else:
+                os.replace(staging, target)
+        else:
+            shutil.copy2(source, staging)
+            os.replace(staging, target)
+    
+    def start(self):
+        """按 sync_interval 周期回写状态"""
+        if self.sync_interval > 0:
+            threading.Thread(target=self._run, daemon=True).start()
+    
+    def _run(self):
+        while not self._stop.wait(self.sync_interval):
+            self.sync()
+
+class DisplayMonitor:
+    """X显示可用性监视器
+    
+    首次检查时连接X服务器的套接字（本地先试抽象命名空间的
+    \\0/tmp/.X11-unix/X<n>，再试同名套接字文件；远程为 TCP 6000+n）并
+    保持该连接，之后直接返回缓存结果。服务以 PrivateTmp=true 运行时看不到
+    /tmp/.X11-unix 下的文件，只有抽象套接字可达（与 Xlib 的行为一致）。
+    以下情况会重新探测：
+    DISPLAY 变化、套接字文件被替换或删除、保持的连接被服务器断开，
+    或距上次探测超过 recheck_interval 秒。
+    """
+    
+    def __init__(self, display=None, socket_dir=X11_SOCKET_DIR, recheck_interval=30):
+        self.display = display
+        self.socket_dir = socket_dir
+        self.recheck_interval = recheck_interval
+        self._lock = threading.Lock()
+        self._available = False
+        self._probed_display = None
+        self._probed_signature = None
+        self._probed_at = 0
+        self._conn = None
+    
+    def _current_display(self):
+        return self.display or os.environ.get('DISPLAY')
+    
+    def _address(self, display):
+        """将 DISPLAY 解析为 (family, address)，无法解析时返回 None"""
+        host, sep, rest = display.rpartition(':')
+        if not sep:
+            return None
+        number = rest.split('.', 1)[0]
+        if not number.isdigit():
+            return None
+        if host in ('', 'unix'):
+            return socket.AF_UNIX, os.path.join(self.socket_dir, f'X{number}')
+        return socket.AF_INET, (host, 6000 + int(number))
+    
+    def _signature(self, address):
+        """本地套接字文件的标识，用于发现X服务器重启"""
+        family, addr = address
+        if family != socket.AF_UNIX:
+            return None
+        try:
+            st = os.stat(addr)
+            return (st.st_ino, st.st_mtime)
+        except OSError:
+            return False
+    
+    def _connection_dropped(self):
+        """保持的连接是否已被服务器关闭"""
+        if self._conn is None:
+            return True
+        try:
+            readable, _, _ = select.select([self._conn], [], [], 0)
+            if readable and not self._conn.recv(1, socket.MSG_PEEK):
+                return True
+        except OSError:
+            return True
+        return False
+    
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+    
+    def _probe(self, display, address):
+        """连接X服务器套接字并记录结果"""
+        self._close()
+        self._probed_display = display
+        self._probed_signature = self._signature(address) if address else None
+        self._probed_at = time.monotonic()
+        self._available = False
+        if address is None:
+            return
+        
+        family, addr = address
+        candidates = [addr]
+        if family == socket.AF_UNIX and sys.platform.startswith('linux'):
+            candidates.insert(0, '\0' + addr)
+        
+        error = None
+        for candidate in candidates:
+            conn = socket.socket(family, socket.SOCK_STREAM)
+            conn.settimeout(1)
+            try:
+                conn.connect(candidate)
+            except OSError as e:
+                conn.close()
+                error = e
+                continue
+            self._conn = conn
+            self._available = True
+            return
+        logging.warning(f"X display {display} unavailable: {error}")
+    
+    def invalidate(self):
+        """丢弃缓存结果，下次检查时重新探测"""
+        with self._lock:
+            self._close()
+            self._probed_display = None
+    
+    def is_available(self):
+        """返回显示是否可用（通常为缓存结果）"""
+        display = self._current_display()
+        if not display:
+            return False
+        
+        with self._lock:
+            address = self._address(display)
+            stale = (display != self._probed_display or
+                     time.monotonic() - self._probed_at > self.recheck_interval or
+                     (address and self._signature(address) != self._probed_signature) or
+                     (self._available and self._connection_dropped()))
+            if stale:
+                self._probe(display, address)
+            return self._available
+
+def load_calibration(path):
+    """读取浏览器校准结果（浏览器 -> 指标），文件不存在或无法解析时返回空字典"""
+    if not path:
+        return {}
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable browser calibration {path}: {e}")
+        return {}
+    browsers = data.get('browsers') if isinstance(data, dict) else None
+    return browsers if isinstance(browsers, dict) else {}
+
+def rank_browsers(candidates, policy, calibration):
+    """按选择策略排序 (浏览器, 默认参数)
+    
+    fastest/leanest 按校准指标升序排列，没有校准数据（或校准失败）的浏览器
+    保持原有顺序排在后面；explicit 和未知策略不改变顺序。只等到 spawned 信号
+    的浏览器测得的是进程启动而不是页面就绪，其耗时不能与其他浏览器比较，
+    fastest 策略把它视为没有校准数据。
+    """
+    metric = BROWSER_POLICIES.get(policy)
+    if metric is None:
+        return list(candidates)
+    
+    def is_measured(name):
+        entry = calibration.get(name, {})
+        if not isinstance(entry.get(metric), (int, float)):
+            return False
+        return metric != 'ready_p50_ms' or 'spawned' not in entry.get('signals', [])
+    
+    measured = [c for c in candidates if is_measured(c[0])]
+    measured.sort(key=lambda c: calibration[c[0]][metric])
+    return measured + [c for c in candidates if c not in measured]
+
+def match_browser_override(overrides, url):
+    """返回第一条匹配URL的规则指定的浏览器或策略，无匹配时返回 None
+    
+    不含 '/' 的模式匹配主机名（例如 *.example.com），否则匹配完整URL
+    （例如 https://intranet/legacy/*），均使用 fnmatch 通配符。
+    """
+    if not overrides or not url:
+        return None
+    host = urlparse(url).hostname or ''
+    for pattern, target in overrides:
+        if fnmatch.fnmatchcase(url if '/' in pattern else host, pattern):
+            return target
+    return None
+
+def browser_candidates(config, calibration=None):
+    """按检测顺序返回 (浏览器, 默认参数)
+    
+    BROWSERS 按 BROWSER_POLICY 排序；BROWSER 指定的浏览器始终排在最前，
+    它可以是 BROWSERS 中的名称，也可以是可执行文件路径
+    （例如 scripts/fake-browser），路径不附加任何默认参数。
+    """
+    candidates = rank_browsers(BROWSERS, config.browser_policy, calibration or {})
+    if config.browser:
+        known = dict(BROWSERS)
+        candidates.insert(0, (config.browser, known.get(config.browser, [])))
+    return candidates
+
+class BrowserProbe:
+    """浏览器能力探测
+    
+    在进程内按 PATH 解析可执行文件，不再为每个候选浏览器启动 which；对
+    BROWSERS 中的浏览器运行一次 --version，记录版本号以及该版本不支持的
+    默认参数。结果按可执行文件路径缓存到磁盘，文件大小、mtime 或 PATH
+    变化（例如升级了浏览器）时重新探测，否则热启动时完全跳过探测。
+    cache_file 为空时只在内存中缓存。
+    """
+    
+    CACHE_VERSION = 1
+    
+    def __init__(self, cache_file=None, timeout=BROWSER_PROBE_TIMEOUT):
+        self.cache_file = cache_file
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._entries = None
+    
+    def _load_locked(self):
+        if self._entries is not None:
+            return
+        self._entries = {}
+        if not self.cache_file:
+            return
+        try:
+            with open(self.cache_file, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict) and data.get('version') == self.CACHE_VERSION:
+            self._entries = data.get('entries') or {}
+    
+    def _save_locked(self):
+        if not self.cache_file:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_file) or '.', exist_ok=True)
+            tmp = f'{self.cache_file}.{os.getpid()}.tmp'
+            with open(tmp, 'w') as f:
+                json.dump({'version': self.CACHE_VERSION, 'entries': self._entries}, f, indent=2)
+            os.replace(tmp, self.cache_file)
+        except OSError as e:
+            logging.warning(f"Failed to save browser probe cache: {e}")
+    
+    @staticmethod
+    def resolve(name):
+        """在进程内解析浏览器可执行文件，找不到时返回 None"""
+        return shutil.which(name)
+    
+    def capabilities(self, name, path, refresh=False):
+        """返回浏览器能力；cached 表示结果来自缓存（未启动任何进程）"""
+        st = os.stat(path)
+        key = {'name': name, 'mtime_ns': st.st_mtime_ns, 'size': st.st_size,
+               'path_env': os.environ.get('PATH', '')}
+        with self._lock:
+            self._load_locked()
+            entry = self._entries.get(path)
+            if (not refresh and entry is not None and
+                    all(entry.get(field) == value for field, value in key.items())):
+                return dict(entry, path=path, cached=True)
+        
+        entry = self._probe(name, path)
+        entry.update(key)
+        # 只有 BROWSERS 中的浏览器需要探测，路径形式的 BROWSER 不写入缓存
+        if name in dict(BROWSERS):
+            with self._lock:
+                self._entries[path] = entry
+                self._save_locked()
+        return dict(entry, path=path, cached=False)
+    
+    def _probe(self, name, path):
+        """运行一次 --version 并据此判断不支持的默认参数"""
+        family = BROWSER_FAMILIES.get(name, name)
+        version = None
+        if name in dict(BROWSERS):
+            try:
+                result = subprocess.run([path] + BROWSER_VERSION_ARGS.get(name, ['--version']),
+                                        stdin=subprocess.DEVNULL, capture_output=True,
+                                        text=True, timeout=self.timeout)
+                match = re.search(r'\d+(?:\.\d+)+', result.stdout + result.stderr)
+                version = match.group(0) if match else None
+            except (OSError, subprocess.SubprocessError) as e:
+                logging.warning(f"Failed to probe {name} version: {e}")
+        major = int(version.split('.')[0]) if version else None
+        unsupported = []
+        if major is not None:
+            for flag, (first, removed) in FLAG_VERSION_RANGES.get(family, {}).items():
+                if (first is not None and major < first) or (removed is not None and major >= removed):
+                    unsupported.append(flag)
+        return {
+            'family': family,
+            'version': version,
+            'major': major,
+            'devtools': name in DEVTOOLS_BROWSERS,
+            'unsupported_args': unsupported,
+        }
+
+class BrowserManager:
+    """浏览器管理类
+    
+    每个实例管理一个槽位（slot）上的浏览器。不同槽位的实例互不共享锁，
+    因此多个显示器上的启动、关闭和就绪等待可以并行进行。
+    """
+    
+    def __init__(self, config, slot=None, proxy=None, probe=None, calibration=None):
+        self.config = config
+        self.slot = slot or SlotConfig()
+        # 同一台机器上运行多个服务时，可通过 PID_FILE 区分默认槽位的PID文件
+        self.pid_file = config.pid_file if self.slot.is_default else self.slot.pid_file
+        state_file = Path(config.state_file)
+        if not self.slot.is_default:
+            state_file = state_file.with_name(f'{state_file.stem}-{self.slot.slot_id}'
+                                              f'{state_file.suffix}')
+        self.state_file = state_file
+        self.current_pid = None
+        self.current_url = None
+        self.browser_cmd = None
+        self.default_browser = None
+        self.capabilities = None
+        self.detect_ms = None
+        self.process = None
+        self.state = 'closed'
+        self.events = EventBroadcaster()
+        self.watchdog = None
+        self.last_termination = None
+        self._cancel = None
+        # 播放列表预热的下一个URL：后台标签页或热备进程
+        self._preloaded = None
+        self.supervisor = ProcessSupervisor()
+        # 每个槽位使用独立的 DevTools 端口
+        self.devtools = DevToolsClient(config.devtools_port + self.slot.index)
+        self.display_monitor = DisplayMonitor(display=self.slot.display)
+        self.profiles = None
+        if config.ram_profile:
+            self.profiles = ProfileManager(config.ram_profile_dir, config.profile_snapshot,
+                                           config.profile_sync_paths,
+                                           config.profile_sync_interval)
+        self.standby = StandbyPool(self.supervisor, config.standby_max, config.standby_ready,
+                                   config.standby_ready_timeout, self.profiles,
+                                   name='' if self.slot.is_default else self.slot.slot_id,
+                                   display=self.slot.display)
+        # 缓存代理由所有槽位共享
+        self.proxy = proxy
+        if proxy is None and config.cache_proxy:
+            self.proxy = CachingProxy(config.cache_proxy_dir, config.cache_proxy_max_mb * 1024 * 1024,
+                                      port=config.cache_proxy_port,
+                                      origin_timeout=config.cache_proxy_timeout)
+        # 能力探测缓存同样由所有槽位共享
+        self.probe = probe or BrowserProbe(config.browser_probe_cache or None)
+        self.calibration = (load_calibration(config.browser_calibration)
+                            if calibration is None else calibration)
+        # 串行化浏览器状态的修改（启动/关闭），读取类请求不需要持有此锁
+        self._lock = threading.RLock()
+        self._detect_browser()
+        if config.adopt_browser and self.browser_cmd:
+            self.adopt_browser()
+    
+    def _browser_candidates(self):
+        """按检测顺序返回 (浏览器, 默认参数)"""
+        return browser_candidates(self.config, self.calibration)
+    
+    def _detect_browser(self):
+        """检测可用的浏览器，作为没有匹配 BROWSER_OVERRIDES 规则时使用的默认浏览器"""
+        start_time = time.perf_counter()
+        for browser_name, default_args in self._browser_candidates():
+            if not self._use_browser(browser_name, default_args):
+                continue
+            self.default_browser = browser_name
+            self.detect_ms = round((time.perf_counter() - start_time) * 1000, 2)
+            version = self.capabilities['version']
+            logging.info(f"Detected browser: {browser_name}"
+                         f"{' ' + version if version else ''} at {self.capabilities['path']} "
+                         f"({'cached' if self.capabilities['cached'] else 'probed'} "
+                         f"in {self.detect_ms:.1f}ms)")
+            return
+        
+        logging.error("No browser found")
+        self.browser_cmd = None
+    
+    def _use_browser(self, browser_name, default_args=None):
+        """切换到指定浏览器并按探测到的能力和GPU配置准备参数，未安装时返回 False"""
+        if default_args is None:
+            default_args = dict(BROWSERS).get(browser_name, [])
+        path = self.probe.resolve(browser_name)
+        if path is None:
+            return False
+        try:
+            capabilities = self.probe.capabilities(browser_name, path)
+        except OSError:
+            return False
+        self.browser_cmd = browser_name
+        self.capabilities = capabilities
+        unsupported = capabilities['unsupported_args']
+        self.browser_args = [arg for arg in default_args if arg not in unsupported]
+        
+        # 根据GPU配置调整参数
+        if not self.config.enable_gpu and default_args:
+            self.browser_args = [arg for arg in self.browser_args 
+                                if not arg.startswith('--enable-gpu')]
+            if '--disable-gpu' not in self.browser_args:
+                self.browser_args.append('--disable-gpu')
+        elif self.config.enable_gpu:
+            self.browser_args = [arg for arg in self.browser_args if arg != '--disable-gpu']
+        
+        if unsupported:
+            logging.info(f"Dropping arguments unsupported by {browser_name} "
+                         f"{capabilities['version']}: {' '.join(unsupported)}")
+        return True
+    
+    def _browser_for(self, url):
+        """打开该URL应使用的浏览器
+        
+        按 BROWSER_OVERRIDES 的第一条匹配规则选择；规则可以指定浏览器，也可以
+        指定策略（在已安装的浏览器中按校准结果挑选）。没有匹配规则或指定的
+        浏览器未安装时使用默认浏览器。
+        """
+        default = self.default_browser or self.browser_cmd
+        target = match_browser_override(self.config.browser_overrides, url)
+        if target is None or target == 'explicit':
+            return default
+        if target in BROWSER_POLICIES:
+            names = [name for name, _ in rank_browsers(BROWSERS, target, self.calibration)]
+        else:
+            names = [target]
+        for name in names:
+            if self.probe.resolve(name):
+                return name
+        logging.warning(f"Browser override {target} for URL {url} is not installed, "
+                        f"using {default}")
+        return default
+    
+    def _get_browser_pid(self):
+        """获取当前浏览器进程PID
+        
+        由本进程启动的浏览器直接从内存状态读取；仅当没有受监管的进程时，
+        才回退到PID文件（例如上一次运行遗留的浏览器）。
+        """
+        if self.process is not None:
+            return self.process.pid if self.process.is_alive() else None
+        
+        if not os.path.exists(self.pid_file):
+            return None
+        
+        try:
+            with open(self.pid_file, 'r') as f:
+                pid = int(f.read().strip())
+            
+            # 检查进程是否还存在
+            try:
+                os.kill(pid, 0)
+                return pid
+            except OSError:
+                # 进程不存在，删除PID文件
+                os.remove(self.pid_file)
+                return None
+        except (ValueError, IOError):
+            return None
+    
+    def _save_browser_pid(self, pid):
+        """保存浏览器进程PID"""
+        with open(self.pid_file, 'w') as f:
+            f.write(str(pid))
+        self.current_pid = pid
+    
+    def _spawn_browser(self, cmd):
+        """通过监管器启动浏览器进程"""
+        return self.supervisor.spawn(cmd, on_exit=self._on_browser_exit, env=self._browser_env())
+    
+    def _browser_env(self):
+        """浏览器进程的环境变量
+        
+        槽位指定了显示器时设置 DISPLAY；启用缓存代理时通过 http_proxy
+        传给非 Chromium 浏览器。
+        """
+        env = display_env(self.slot.display)
+        if not self.proxy or not self.proxy.url:
+            return env
+        env = env or dict(os.environ)
+        for name in ('http_proxy', 'HTTP_PROXY', 'https_proxy', 'HTTPS_PROXY'):
+            env[name] = self.proxy.url
+        env['no_proxy'] = env['NO_PROXY'] = 'localhost,127.0.0.1,::1'
+        return env
+    
+    def _on_browser_exit(self, process):
+        """浏览器进程退出通知（在监管线程中调用，不得持有锁）"""
+        if process.terminating:
+            return
+        BROWSER_CRASHES.inc()
+        if process is self.process:
+            self._publish('crashed', returncode=process.returncode)
+        logging.warning(f"Browser process {process.pid} exited unexpectedly "
+                        f"with code {process.returncode}")
+    
+    def _set_current_process(self, process, url):
+        """记录当前前台浏览器"""
+        self.process = process
+        self._save_browser_pid(process.pid)
+        self.current_url = url
+        self._save_state()
+    
+    def _save_state(self):
+        """持久化当前浏览器状态，供服务重启后重新接管"""
+        process = self.process
+        stat = read_proc_stat(process.pid) if process else None
+        if stat is None:
+            return
+        state = {
+            'pid': process.pid,
+            'pgid': process.pgid,
+            'start_ticks': stat[2],
+            'boot_id': read_boot_id(),
+            'started_at': process.started_at,
+            'url': self.current_url,
+            'browser': self.browser_cmd,
+            'cmd': process.cmd
+        }
+        try:
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            staging = self.state_file.with_name(self.state_file.name + '.tmp')
+            staging.write_text(json.dumps(state))
+            os.replace(staging, self.state_file)
+        except OSError as e:
+            logging.warning(f"Failed to save browser state: {e}")
+    
+    def adopt_browser(self):
+        """接管上一次运行时启动、仍在运行的浏览器
+        
+        仅当保存的 PID 在本次系统启动中仍存在、且 /proc 中的启动时间与保存
+        时一致（排除 PID 复用）时才接管，否则删除过期的状态文件。
+        """
+        try:
+            state = json.loads(self.state_file.read_text())
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable browser state {self.state_file}: {e}")
+            self.state_file.unlink(missing_ok=True)
+            return False
+        
+        pid = state.get('pid')
+        stat = read_proc_stat(pid) if isinstance(pid, int) else None
+        reason = None
+        if state.get('boot_id') != read_boot_id():
+            reason = "system rebooted"
+        elif stat is None or stat[0] == 'Z':
+            reason = "process exited"
+        elif stat[2] != state.get('start_ticks'):
+            reason = "PID reused by another process"
+        elif state.get('browser') != self._browser_for(state.get('url')):
+            reason = f"browser changed to {self._browser_for(state.get('url'))}"
+        if reason:
+            logging.info(f"Not adopting browser PID {pid}: {reason}")
+            self.state_file.unlink(missing_ok=True)
+            return False
+        
+        with self._lock:
+            if state['browser'] != self.browser_cmd:
+                self._use_browser(state['browser'])
+            self.process = self.supervisor.adopt(pid, state['pgid'], state.get('cmd') or [],
+                                                 state.get('started_at') or time.time(),
+                                                 stat[2], on_exit=self._on_browser_exit)
+            self._save_browser_pid(pid)
+            self.current_url = state.get('url')
+            self.state = 'ready'
+        logging.info(f"Adopted running browser {self.browser_cmd} PID {pid} showing {self.current_url}")
+        return True
+    
+    def _kill_browser(self, timeout=5):
+        """关闭浏览器进程"""
+        if self.process is not None:
+            result = self.process.terminate(timeout)
+            self.last_termination = result
+            KILL_SECONDS.observe(result['latency_ms'] / 1000,
+                                 forced='true' if result['forced'] else 'false')
+            if result['forced']:
+                logging.info(f"Force killed browser process {result['pid']}")
+            logging.info(f"Browser process {result['pid']} terminated in {result['latency_ms']}ms")
+            self._clear_state()
+            return True
+        
+        pid = self._get_browser_pid()
+        if not pid:
+            return True
+        
+        # 非本进程启动的浏览器无法获得退出通知，只能轮询
+        try:
+            start_time = time.monotonic()
+            os.kill(pid, signal.SIGTERM)
+            forced = False
+            while True:
+                try:
+                    os.kill(pid, 0)
+                except OSError:
+                    break
+                if time.monotonic() - start_time >= timeout:
+                    os.kill(pid, signal.SIGKILL)
+                    forced = True
+                    logging.info(f"Force killed browser process {pid}")
+                    break
+                time.sleep(0.1)
+            
+            self.last_termination = {
+                'pid': pid,
+                'latency_ms': round((time.monotonic() - start_time) * 1000, 1),
+                'forced': forced,
+                'returncode': None
+            }
+            KILL_SECONDS.observe(time.monotonic() - start_time,
+                                 forced='true' if forced else 'false')
+            self._clear_state()
+            return True
+            
+        except OSError as e:
+            logging.error(f"Failed to kill browser process: {e}")
+            return False
+    
+    def _clear_state(self):
+        """清除当前浏览器状态、PID文件和状态文件"""
+        if os.path.exists(self.pid_file):
+            os.remove(self.pid_file)
+        try:
+            self.state_file.unlink(missing_ok=True)
+        except OSError:
+            pass
+        self.process = None
+        self.current_pid = None
+        self.current_url = None
+    
+    def supports_devtools(self):
+        """当前浏览器是否可通过 DevTools 原地导航"""
+        return self.config.devtools_navigation and self.browser_cmd in DEVTOOLS_BROWSERS
+    
+    def _launch_args(self, profile=True):
+        """组合本次启动使用的浏览器参数
+        
+        profile 为 False 时不附加内存配置目录参数（热备实例与前台浏览器同时运行，
+        不能使用前台的配置目录，需要时由 StandbyPool 提供独立目录）。
+        """
+        args = list(self.browser_args)
+        if profile and self.profiles:
+            busy = [p for p in [self.process] + self.standby._alive() if p is not None]
+            args += self.profiles.args(self.browser_cmd,
+                                       'main' if self.slot.is_default else self.slot.slot_id,
+                                       busy)
+        elif (profile and self.browser_cmd in PROFILE_ARGS and
+              (self.slot.profile_dir or not self.slot.is_default)):
+            # 同一浏览器的多个实例必须使用不同的配置目录，否则会合并为一个进程
+            profile_dir = Path(self.slot.profile_dir or SLOT_PROFILE_DIR / self.slot.slot_id)
+            profile_dir.mkdir(parents=True, exist_ok=True)
+            args += [arg.replace('{profile_dir}', str(profile_dir))
+                     for arg in PROFILE_ARGS.get(self.browser_cmd, [])]
+        if self.slot.geometry and self.browser_cmd in DEVTOOLS_BROWSERS:
+            width, height, x, y = self.slot.geometry
+            args += [f'--window-position={x},{y}', f'--window-size={width},{height}']
+        if self.proxy and self.proxy.url and self.browser_cmd in DEVTOOLS_BROWSERS:
+            args.append(f'--proxy-server={self.proxy.url}')
+        if self.supports_devtools():
+            args += [f'--remote-debugging-port={self.devtools.port}',
+                     '--remote-debugging-address=127.0.0.1']
+        return args
+    
+    def open_url(self, url, details=None, cancel=None):
+        """打开指定URL
+        
+        details 为可选的字典，用于返回本次打开采用的方式（reuse/navigate/launch）
+        及耗时（毫秒）。cancel 为可选的 threading.Event，被置位时在下一个
+        检查点放弃本次启动。
+        """
+        if details is None:
+            details = {}
+        start_time = time.monotonic()
+        with self._lock:
+            self._cancel = cancel
+            try:
+                result = self._open_url_locked(url, details)
+            finally:
+                self._cancel = None
+        elapsed = time.monotonic() - start_time
+        details['elapsed_ms'] = round(elapsed * 1000, 1)
+        OPEN_SECONDS.observe(elapsed, method=details.get('method') or 'failed')
+        if not result[0] and details.get('method') != 'cancelled':
+            OPEN_FAILURES.inc(reason=details.get('failure', 'other'))
+        return result
+    
+    def _cancelled(self, details):
+        """本次启动是否已被更新的请求取代"""
+        if self._cancel is not None and self._cancel.is_set():
+            details['method'] = 'cancelled'
+            return True
+        return False
+    
+    def check_url(self, url):
+        """校验URL格式和白名单，返回错误信息，合法时返回 None"""
+        if not self._validate_url(url):
+            return "Invalid URL"
+        if self.config.allow_list and not self._check_whitelist(url):
+            return "URL not in whitelist"
+        return None
+    
+    def _navigate_in_place(self, url):
+        """尝试通过 DevTools 在运行中的浏览器里导航，失败返回 False"""
+        if not self.supports_devtools() or not self._get_browser_pid():
+            return False
+        try:
+            self.devtools.navigate(url)
+        except DevToolsError as e:
+            logging.info(f"In-place navigation unavailable, relaunching: {e}")
+            return False
+        self.current_url = url
+        self._save_state()
+        logging.info(f"Navigated browser PID {self.current_pid} to URL {url}")
+        return True
+    
+    def _spawn_standby(self, url):
+        """在后台启动一个打开该URL的热备浏览器，失败或超过上限时返回 None"""
+        try:
+            cmd = ([self.browser_cmd] +
+                   self._launch_args(profile=False) +
+                   self.standby.standby_args(self.browser_cmd, foreground=self.process) + [url])
+            return self.standby.spawn(cmd, on_exit=self._on_browser_exit, env=self._browser_env())
+        except Exception as e:
+            logging.error(f"Failed to spawn standby browser: {e}")
+            return None
+    
+    def _promote_standby(self, process, url):
+        """等待热备浏览器就绪后切到前台并回收旧浏览器，未就绪时返回 False"""
+        ready, _ = self.standby.wait_ready(process, self._cancel)
+        if not ready:
+            logging.warning(f"Standby browser PID {process.pid} not ready, falling back to relaunch")
+            self.standby.discard(process)
+            return False
+        
+        # 就绪后才显示热备窗口并切到前台，然后回收旧浏览器
+        self.standby.show(process)
+        self.standby.release(process)
+        self._kill_browser()
+        self._set_current_process(process, url)
+        logging.info(f"Swapped to standby browser PID {process.pid} for URL {url}")
+        return True
+    
+    def _swap_via_standby(self, url):
+        """热备切换：先在后台启动新浏览器，就绪后再关闭旧浏览器"""
+        # 第二个 Chromium 进程只会把URL转交给已运行的实例后退出，无法作为热备
+        if (not self.config.standby_mode or self.browser_cmd in DEVTOOLS_BROWSERS or
+                not self._get_browser_pid() or not self.standby.has_capacity()):
+            return False
+        process = self._spawn_standby(url)
+        return process is not None and self._promote_standby(process, url)
+    
+    def preload(self, url):
+        """提前在后台加载下一个URL，随后的 open_url(url) 直接切换到已加载的页面
+        
+        支持 DevTools 的 Chromium 在运行中的浏览器里打开后台标签页；其他浏览器
+        启动一个热备进程（不要求 STANDBY_MODE，但受 STANDBY_MAX 限制）。
+        返回预热方式（tab/standby），无法预热时返回 None。
+        """
+        with self._lock:
+            preloaded = self._preloaded
+            if preloaded and preloaded['url'] == url and self._preload_alive(preloaded):
+                return preloaded['kind']
+            self._discard_preload()
+            pid = self._get_browser_pid()
+            # 换用其他浏览器或浏览器未运行时只能冷启动，已显示的URL会被复用
+            if (not pid or self.check_url(url) or self._browser_for(url) != self.browser_cmd or
+                    (self.config.reuse_instance and url == self.current_url)):
+                return None
+            
+            if self.supports_devtools():
+                try:
+                    target_id = self.devtools.open_background_page(url)
+                except DevToolsError as e:
+                    logging.info(f"Background tab unavailable, not preloading {url}: {e}")
+                    return None
+                self._preloaded = {'kind': 'tab', 'url': url, 'target': target_id, 'pid': pid}
+            elif self.browser_cmd in DEVTOOLS_BROWSERS:
+                # 第二个 Chromium 进程只会在已运行的实例中打开标签页，无法作为热备
+                return None
+            else:
+                if not self._check_display():
+                    return None
+                process = self._spawn_standby(url)
+                if process is None:
+                    return None
+                self._preloaded = {'kind': 'standby', 'url': url, 'process': process}
+            logging.info(f"Preloading {url} in a {self._preloaded['kind']}")
+            return self._preloaded['kind']
+    
+    def _preload_alive(self, preloaded):
+        """预热的页面是否仍然可用（后台标签页随所在浏览器一起退出）"""
+        if preloaded['kind'] == 'tab':
+            return preloaded['pid'] == self._get_browser_pid()
+        return preloaded['process'].poll() is None
+    
+    def _discard_preload(self):
+        """丢弃尚未使用的预热页面（调用方需持有锁）"""
+        preloaded, self._preloaded = self._preloaded, None
+        if preloaded is None or not self._preload_alive(preloaded):
+            return
+        if preloaded['kind'] == 'standby':
+            self.standby.discard(preloaded['process'])
+            return
+        try:
+            self.devtools.close_page(preloaded['target'])
+        except DevToolsError as e:
+            logging.debug(f"Failed to close preloaded tab: {e}")
+    
+    def _activate_preload(self, url):
+        """切换到为该URL预热的标签页或热备浏览器，没有可用的预热时返回 False"""
+        preloaded = self._preloaded
+        if preloaded is None or preloaded['url'] != url:
+            return False
+        self._preloaded = None
+        if not self._preload_alive(preloaded):
+            return False
+        if preloaded['kind'] == 'standby':
+            return self._promote_standby(preloaded['process'], url)
+        
+        try:
+            self.devtools.activate_page(preloaded['target'])
+        except DevToolsError as e:
+            logging.info(f"Preloaded tab unavailable, switching normally: {e}")
+            return False
+        self.current_url = url
+        self._save_state()
+        logging.info(f"Activated preloaded tab for URL {url} in browser PID {preloaded['pid']}")
+        return True
+    
+    def _open_url_locked(self, url, details):
+        """打开指定URL（调用方需持有锁）"""
+        # 验证URL和白名单
+        phase_start = time.monotonic()
+        error = self.check_url(url)
+        OPEN_PHASE_SECONDS.observe(time.monotonic() - phase_start, phase='validate')
+        if error:
+            details['failure'] = 'invalid_url' if error == "Invalid URL" else 'not_whitelisted'
+            return False, error
+        
+        # 检查是否复用实例
+        if (self.config.reuse_instance and 
+            self.current_url == url and 
+            self._get_browser_pid()):
+            details['method'] = 'reuse'
+            REUSE_HITS.inc()
+            return True, "URL already open"
+        
+        self._publish('launching', target=url)
+        success, message = self._switch_locked(url, details)
+        if success:
+            self._publish('ready', method=details.get('method'))
+        elif details.get('method') != 'cancelled':
+            self._publish('failed', target=url, message=message)
+        return success, message
+    
+    def _switch_locked(self, url, details):
+        """切换到新URL：原地导航、热备切换或重启浏览器"""
+        # 按 BROWSER_OVERRIDES 换用其他浏览器时只能重启
+        browser = self._browser_for(url)
+        switching = browser != self.browser_cmd
+        
+        # 已为该URL预热时直接切换，页面已在后台加载完成
+        if not switching and self._activate_preload(url):
+            details['method'] = 'preload'
+            return True, f"Switched to preloaded {self.browser_cmd}"
+        # 为其他URL预热的标签页或热备浏览器已无用，先丢弃，
+        # 以免后台标签页成为导航目标或热备进程占着槽位
+        self._discard_preload()
+        
+        # 优先在现有浏览器中原地导航
+        if not switching and self._navigate_in_place(url):
+            details['method'] = 'navigate'
+            return True, f"Navigated {self.browser_cmd}"
+        
+        # 检查显示环境
+        phase_start = time.monotonic()
+        display_ok = self._check_display()
+        OPEN_PHASE_SECONDS.observe(time.monotonic() - phase_start, phase='display')
+        if not display_ok:
+            self._kill_browser()
+            details['failure'] = 'no_display'
+            return False, "No display available"
+        
+        # 热备模式：新浏览器就绪后再替换旧浏览器
+        if not switching and self._swap_via_standby(url):
+            details['method'] = 'standby'
+            return True, f"Swapped {self.browser_cmd}"
+        
+        if self._cancelled(details):
+            return False, "Superseded by a newer request"
+        
+        # 关闭现有浏览器
+        self.last_termination = None
+        phase_start = time.monotonic()
+        self._kill_browser()
+        OPEN_PHASE_SECONDS.observe(time.monotonic() - phase_start, phase='kill')
+        
+        if self._cancelled(details):
+            return False, "Superseded by a newer request"
+        
+        if switching:
+            logging.info(f"Switching browser from {self.browser_cmd} to {browser} for URL {url}")
+            self._use_browser(browser)
+        
+        # 启动浏览器
+        try:
+            # 内存配置目录的填充耗时计入 spawn 阶段
+            phase_start = time.monotonic()
+            cmd = [self.browser_cmd] + self._launch_args() + [url]
+            process = self._spawn_browser(cmd)
+            OPEN_PHASE_SECONDS.observe(time.monotonic() - phase_start, phase='spawn')
+            
+            self._set_current_process(process, url)
+            details['method'] = 'launch'
+            if self.last_termination:
+                details['kill_ms'] = self.last_termination['latency_ms']
+            
+            logging.info(f"Launched browser {self.browser_cmd} with PID {process.pid} for URL {url}")
+            return True, f"Launched {self.browser_cmd}"
+            
+        except Exception as e:
+            logging.error(f"Failed to launch browser: {e}")
+            details['failure'] = 'spawn_error'
+            return False, f"Failed to launch browser: {e}"
+    
+    def apply_config(self, previous):
+        """配置热加载后重建浏览器相关的派生状态
+        
+        BROWSER_FIELDS 有变化时重新检测浏览器和启动参数；只有实际的启动命令
+        改变且浏览器正在运行时才重启浏览器。返回是否重启了浏览器。
+        """
+        config = self.config
+        if all(getattr(config, name) == getattr(previous, name) for name in Config.BROWSER_FIELDS):
+            return False
+        with self._lock:
+            before = (self.browser_cmd, list(self.browser_args), self.default_browser)
+            if config.browser_probe_cache != previous.browser_probe_cache:
+                self.probe = BrowserProbe(config.browser_probe_cache or None)
+            self.calibration = load_calibration(config.browser_calibration)
+            self._detect_browser()
+            if self.browser_cmd is None:
+                logging.error("No browser found after config reload, keeping "
+                              f"{before[0]} {' '.join(before[1])}")
+                self.browser_cmd, self.browser_args, self.default_browser = before
+                return False
+            # 当前显示的URL可能由 BROWSER_OVERRIDES 指定了其他浏览器
+            browser = self._browser_for(self.current_url)
+            if browser != self.browser_cmd:
+                self._use_browser(browser)
+            if (self.browser_cmd, self.browser_args) == tuple(before[:2]) or not self._get_browser_pid():
+                return False
+            logging.info(f"Launch command changed to {self.browser_cmd} {' '.join(self.browser_args)}, "
+                         "relaunching browser")
+        self.recycle('config')
+        return True
+    
+    def recycle(self, reason):
+        """重启浏览器并重新打开当前URL（由看门狗或配置热加载调用）"""
+        with self._lock:
+            url = self.current_url
+            if not url:
+                return False, "No URL to reopen"
+            self._publish('recycling', reason=reason)
+            self._kill_browser()
+            details = {}
+            return self._open_url_locked(url, details)
+    
+    def close_browser(self, details=None):
+        """关闭浏览器
+        
+        details 为可选的字典，用于返回终止耗时等信息。
+        """
+        with self._lock:
+            self.last_termination = None
+            self._discard_preload()
+            success = self._kill_browser()
+            if details is not None and self.last_termination:
+                details.update(self.last_termination)
+            if success and self.profiles:
+                # 浏览器已退出，此时回写的配置状态是一致的
+                self.profiles.sync()
+            if success:
+                self._publish('closed')
+        if success:
+            logging.info("Browser closed successfully")
+            return True, "Browser closed"
+        else:
+            return False, "Failed to close browser"
+    
+    def _publish(self, state, **extra):
+        """记录状态变化并推送给所有 /events 订阅者"""
+        self.state = state
+        data = self.status()
+        data.update(extra)
+        self.events.publish('state', data)
+    
+    def status(self):
+        """返回当前浏览器状态（只读，不获取锁）"""
+        process = self.process
+        preloaded = self._preloaded
+        pid = self._get_browser_pid()
+        return {
+            'slot': self.slot.slot_id,
+            'state': self.state,
+            'browser': self.browser_cmd,
+            'browser_version': self.capabilities['version'] if self.capabilities else None,
+            'running': bool(pid),
+            'pid': pid,
+            'url': self.current_url if pid else None,
+            'started_at': process.started_at if process and pid else None,
+            'preloaded': preloaded['url'] if preloaded else None,
+            'watchdog': self.watchdog.summary() if self.watchdog else None,
+            'proxy': self.proxy.summary() if self.proxy else None
+        }
+    
+    def _validate_url(self, url):
+        """验证URL格式"""
+        if not url:
+            return False
+        
+        if not url.startswith(('http://', 'https://')):
+            return False
+        
+        try:
+            parsed = urlparse(url)
+            return bool(parsed.netloc)
+        except:
+            return False
+    
+    def _check_whitelist(self, url):
+        """检查URL是否在白名单中"""
+        if not self.config.allow_list:
+            return True
+        
+        return self.config.allow_index.allows(url)
+    
+    def _check_display(self):
+        """检查显示环境"""
+        return self.display_monitor.is_available()
+
+class EventBroadcaster:
+    """Server-Sent Events 广播器
+    
+    订阅连接在发送完响应头后从HTTP处理线程中分离出来，由单个后台线程
+    以非阻塞方式统一写出，因此空闲的订阅者不占用线程。写缓冲超过
+    MAX_BUFFER 的慢速订阅者会被断开；每 HEARTBEAT 秒发送一次注释行，
+    用于保持连接并发现已断开的客户端。
+    """
+    
+    MAX_BUFFER = 64 * 1024
+    HEARTBEAT = 15
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._thread = None
+        self._wake_r = self._wake_w = None
+    
+    @staticmethod
+    def format_event(event, data):
+        """编码一条SSE消息"""
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode('utf-8')
+    
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+    
+    def subscribe(self, sock, initial=b''):
+        """接管一个已发送响应头的连接"""
+        sock.setblocking(False)
+        with self._lock:
+            if self._thread is None:
+                self._wake_r, self._wake_w = os.pipe()
+                os.set_blocking(self._wake_r, False)
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._subscribers[sock] = bytearray(initial)
+        self._wake()
+    
+    def publish(self, event, data):
+        """向所有订阅者广播一条事件"""
+        message = self.format_event(event, data)
+        with self._lock:
+            if not self._subscribers:
+                return
+            for buffer in self._subscribers.values():
+                buffer += message
+        self._wake()
+    
+    def _wake(self):
+        try:
+            os.write(self._wake_w, b'x')
+        except (OSError, TypeError):
+            pass
+    
+    def _drop(self, sock):
+        with self._lock:
+            self._subscribers.pop(sock, None)
+        try:
+            sock.close()
+        except OSError:
+            pass
+    
+    def _run(self):
+        """广播线程：把各订阅者的缓冲写入套接字
+        
+        使用 selectors（Linux 上为 epoll），订阅者的文件描述符超过 1024 时
+        也能正常工作；select 调用失败时稍等再重试，不会空转占满CPU。
+        """
+        selector = selectors.DefaultSelector()
+        selector.register(self._wake_r, selectors.EVENT_READ)
+        registered = {}
+        
+        def drop(sock):
+            # 先注销再关闭，避免文件描述符被新连接复用后与旧注册冲突
+            if registered.pop(sock, None) is not None:
+                try:
+                    selector.unregister(sock)
+                except (KeyError, ValueError):
+                    pass
+            self._drop(sock)
+        
+        last_heartbeat = time.monotonic()
+        while True:
+            with self._lock:
+                wanted = {sock: selectors.EVENT_READ | (selectors.EVENT_WRITE if buf else 0)
+                          for sock, buf in self._subscribers.items()}
+            for sock in [sock for sock in registered if sock not in wanted]:
+                drop(sock)
+            for sock, events in wanted.items():
+                if registered.get(sock) == events:
+                    continue
+                try:
+                    if sock in registered:
+                        selector.modify(sock, events)
+                    else:
+                        selector.register(sock, events)
+                    registered[sock] = events
+                except (KeyError, ValueError, OSError):
+                    # 套接字已关闭或失效
+                    drop(sock)
+            
+            try:
+                ready = selector.select(self.HEARTBEAT)
+            except OSError as e:
+                logging.error(f"Event broadcaster select failed: {e}")
+                time.sleep(1)
+                continue
+            readable = [key.fileobj for key, mask in ready if mask & selectors.EVENT_READ]
+            writable = [key.fileobj for key, mask in ready if mask & selectors.EVENT_WRITE]
+            
+            if self._wake_r in readable:
+                try:
+                    os.read(self._wake_r, 4096)
+                except BlockingIOError:
+                    pass
+                readable.remove(self._wake_r)
+            
+            # 订阅者不应发送数据，可读即表示连接关闭
+            for sock in readable:
+                try:
+                    if not sock.recv(1024):
+                        drop(sock)
+                except (BlockingIOError, InterruptedError):
+                    pass
+                except OSError:
+                    drop(sock)
+            
+            if time.monotonic() - last_heartbeat >= self.HEARTBEAT:
+                last_heartbeat = time.monotonic()
+                with self._lock:
+                    for buffer in self._subscribers.values():
+                        buffer += b': keepalive\n\n'
+                    writable = list(self._subscribers)
+            
+            for sock in writable:
+                with self._lock:
+                    buffer = self._subscribers.get(sock)
+                    if buffer is None:
+                        continue
+                    try:
+                        sent = sock.send(buffer)
+                        del buffer[:sent]
+                    except (BlockingIOError, InterruptedError):
+                        sent = 0
+                    except OSError:
+                        buffer = None
+                    overflow = buffer is not None and len(buffer) > self.MAX_BUFFER
+                if buffer is None or overflow:
+                    drop(sock)
+
+class LaunchIntent:
+    """一次打开/关闭请求（url 为 None 表示关闭浏览器）"""
+    
+    def __init__(self, url):
+        self.url = url
+        self.result = None
+        self.details = {}
+        self._done = threading.Event()
+    
+    def resolve(self, result, details):
+        self.result = result
+        self.details = details
+        self._done.set()
+    
+    def wait(self, timeout=None):
+        """等待最终结果，返回 (success, message)"""
+        if not self._done.wait(timeout):
+            return False, "Timed out waiting for launch"
+        return self.result
+
+class LaunchScheduler:
+    """浏览器启动调度器
+    
+    由单个工作线程独占调用 BrowserManager。短时间内的多个请求只执行最新
+    的一个（后写者胜出），被取代的请求与最终执行的请求获得同一结果；
+    正在执行的启动在被取代时会在下一个检查点取消。同时等待的请求数受
+    max_pending 限制，两次启动之间至少间隔 min_interval 秒。
+    """
+    
+    def __init__(self, browser_manager, min_interval=0.0, max_pending=32):
+        self.browser_manager = browser_manager
+        self.min_interval = min_interval
+        self.max_pending = max_pending
+        self._cond = threading.Condition()
+        self._pending = []
+        self._superseded = []
+        self._in_flight = None
+        self._cancel = threading.Event()
+        self._last_run = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def submit(self, url):
+        """提交请求，等待中的请求过多时返回 None"""
+        intent = LaunchIntent(url)
+        with self._cond:
+            if len(self._pending) + len(self._superseded) >= self.max_pending:
+                return None
+            self._pending.append(intent)
+            if self._in_flight is not None:
+                self._cancel.set()
+            self._cond.notify()
+        return intent
+    
+    def _execute(self, intent, details):
+        if intent.url is None:
+            return self.browser_manager.close_browser(details)
+        return self.browser_manager.open_url(intent.url, details, cancel=self._cancel)
+    
+    def open(self, url, details=None, timeout=None):
+        """排队打开URL并等待最终结果"""
+        if details is None:
+            details = {}
+        error = self.browser_manager.check_url(url)
+        if error:
+            return False, error
+        return self._submit_and_wait(url, details, timeout)
+    
+    def close(self, details=None, timeout=None):
+        """排队关闭浏览器并等待最终结果"""
+        return self._submit_and_wait(None, {} if details is None else details, timeout)
+    
+    def _submit_and_wait(self, url, details, timeout):
+        intent = self.submit(url)
+        if intent is None:
+            details['rejected'] = True
+            return False, "Too many pending launch requests"
+        result = intent.wait(timeout)
+        details.update(intent.details)
+        return result
+    
+    def _run(self):
+        """工作线程：始终只执行最新的请求"""
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                # 限制启动频率，等待期间到达的新请求会继续合并
+                while self._last_run is not None:
+                    remaining = self._last_run + self.min_interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending
+                self._pending = []
+                intent = batch[-1]
+                self._superseded.extend(batch[:-1])
+                self._in_flight = intent
+                self._cancel.clear()
+            
+            details = {}
+            try:
+                result = self._execute(intent, details)
+            except Exception as e:
+                logging.error(f"Launch scheduler failed: {e}")
+                result = (False, f"Internal error: {e}")
+            
+            with self._cond:
+                self._in_flight = None
+                self._last_run = time.monotonic()
+                if self._cancel.is_set() and self._pending:
+                    # 已被取代，本次请求改为等待最新请求的结果
+                    self._superseded.append(intent)
+                    continue
+                waiters = self._superseded
+                self._superseded = []
+            
+            details['url'] = intent.url
+            if waiters:
+                logging.info(f"Coalesced {len(waiters)} superseded request(s) into {intent.url}")
+            intent.resolve(result, details)
+            for waiter in waiters:
+                waiter.resolve(result, dict(details, superseded=True))
+
+class ReadinessProbe:
+    """浏览器就绪检测
+    
+    按可用性依次选择就绪信号：
+      devtools-load  DevTools 报告新页面已触发 load 事件（Chromium）
+      window-mapped  xdotool 检测到浏览器的可见窗口
+      spawned        无可用信号时，进程启动即视为就绪
+    """
+    
+    def __init__(self, browser_manager, interval=0.1):
+        self.browser_manager = browser_manager
+        self.interval = interval
+    
+    def wait(self, since, timeout):
+        """等待当前浏览器就绪，返回信号名；超时返回 None，浏览器退出时抛出 RuntimeError"""
+        manager = self.browser_manager
+        deadline = time.monotonic() + timeout
+        use_devtools = manager.supports_devtools()
+        use_window = not use_devtools and shutil.which('xdotool') is not None
+        
+        while True:
+            process = manager.process
+            if process is not None and not process.is_alive():
+                raise RuntimeError(f"Browser exited with code {process.returncode} before becoming ready")
+            
+            if use_devtools:
+                try:
+                    if manager.devtools.page_loaded(since):
+                        return 'devtools-load'
+                except DevToolsError:
+                    pass
+            elif use_window and process is not None:
+                try:
+                    if find_window(process.pid, manager.slot.display):
+                        return 'window-mapped'
+                except (OSError, subprocess.TimeoutExpired):
+                    use_window = False
+            else:
+                return 'spawned'
+            
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(self.interval)
+
+class LaunchJob:
+    """异步启动任务"""
+    
+    def __init__(self, url):
+        self.id = uuid.uuid4().hex[:12]
+        self.url = url
+        self.status = 'pending'
+        self.message = None
+        self.method = None
+        self.signal = None
+        self.created_at = time.time()
+        self.time_to_ready_ms = None
+        self._cond = threading.Condition()
+    
+    def update(self, status, **fields):
+        with self._cond:
+            self.status = status
+            for key, value in fields.items():
+                setattr(self, key, value)
+            self._cond.notify_all()
+    
+    @property
+    def finished(self):
+        return self.status in ('ready', 'failed', 'timeout')
+    
+    def wait(self, timeout, known_status=None):
+        """长轮询：等待任务结束或状态不同于 known_status，最多 timeout 秒"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.finished or
+                                (known_status is not None and self.status != known_status),
+                                timeout)
+    
+    def to_dict(self):
+        return {
+            'job': self.id,
+            'url': self.url,
+            'status': self.status,
+            'message': self.message,
+            'method': self.method,
+            'signal': self.signal,
+            'created_at': self.created_at,
+            'time_to_ready_ms': self.time_to_ready_ms
+        }
+
+class JobManager:
+    """异步启动任务管理
+    
+    每个任务先经 LaunchScheduler 打开URL，再等待就绪信号，记录从请求到
+    就绪的耗时（按URL和浏览器统计）；超过 timeout 秒未就绪的任务标记为
+    timeout。只保留最近 MAX_JOBS 个任务和 MAX_URL_STATS 个URL的统计。
+    """
+    
+    MAX_JOBS = 100
+    MAX_URL_STATS = 100
+    
+    def __init__(self, browser_manager, scheduler, timeout=30):
+        self.browser_manager = browser_manager
+        self.scheduler = scheduler
+        self.timeout = timeout
+        self.probe = ReadinessProbe(browser_manager)
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._url_stats = OrderedDict()
+    
+    def submit(self, url):
+        """创建任务并在后台执行，立即返回"""
+        job = LaunchJob(url)
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.MAX_JOBS:
+                self._jobs.popitem(last=False)
+        threading.Thread(target=self._run, args=(job,), daemon=True).start()
+        return job
+    
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+    
+    def list(self):
+        with self._lock:
+            jobs = [job.to_dict() for job in self._jobs.values()]
+            stats = {url: dict(entry) for url, entry in self._url_stats.items()}
+        return jobs, stats
+    
+    def _record(self, url, seconds):
+        browser = self.browser_manager.browser_cmd or 'unknown'
+        TIME_TO_READY_SECONDS.observe(seconds, browser=browser)
+        ms = round(seconds * 1000, 1)
+        with self._lock:
+            entry = self._url_stats.pop(url, None) or {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+            entry['count'] += 1
+            entry['total_ms'] += ms
+            entry['max_ms'] = max(entry['max_ms'], ms)
+            entry['last_ms'] = ms
+            entry['avg_ms'] = round(entry['total_ms'] / entry['count'], 1)
+            entry['browser'] = browser
+            self._url_stats[url] = entry
+            while len(self._url_stats) > self.MAX_URL_STATS:
+                self._url_stats.popitem(last=False)
+    
+    def _run(self, job):
+        since = time.time()
+        start_time = time.monotonic()
+        job.update('launching')
+        details = {}
+        try:
+            if self.scheduler:
+                success, message = self.scheduler.open(job.url, details)
+            else:
+                success, message = self.browser_manager.open_url(job.url, details)
+        except Exception as e:
+            success, message = False, f"Internal error: {e}"
+        
+        if not success:
+            job.update('failed', message=message, method=details.get('method'))
+            return
+        if details.get('superseded'):
+            job.update('failed', message=f"Superseded by {details.get('url')}")
+            return
+        
+        method = details.get('method')
+        if method == 'reuse':
+            job.update('ready', message=message, method=method, signal='reuse',
+                       time_to_ready_ms=0.0)
+            return
+        
+        job.update('waiting_ready', message=message, method=method)
+        remaining = max(0, self.timeout - (time.monotonic() - start_time))
+        try:
+            signal_name = self.probe.wait(since, remaining)
+        except RuntimeError as e:
+            job.update('failed', message=str(e))
+            return
+        
+        if signal_name is None:
+            logging.warning(f"Browser did not become ready within {self.timeout}s for URL {job.url}")
+            job.update('timeout', message=f"Browser did not become ready within {self.timeout:g}s")
+            return
+        
+        elapsed = time.monotonic() - start_time
+        self._record(job.url, elapsed)
+        logging.info(f"URL {job.url} ready via {signal_name} in {elapsed * 1000:.0f}ms")
+        job.update('ready', signal=signal_name, time_to_ready_ms=round(elapsed * 1000, 1))
+
+def sample_process_group(pgid):
+    """从 /proc 统计进程组的 RSS（字节）、累计CPU时间（秒）和进程数"""
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    clock_ticks = os.sysconf('SC_CLK_TCK')
+    rss = 0
+    cpu_ticks = 0
+    count = 0
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'rb') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # comm 字段可能包含空格，从最后一个 ')' 之后开始解析
+        fields = stat[stat.rfind(b')') + 2:].split()
+        if int(fields[2]) != pgid:
+            continue
+        cpu_ticks += int(fields[11]) + int(fields[12])
+        rss += int(fields[21]) * page_size
+        count += 1
+    return rss, cpu_ticks / clock_ticks, count
+
+def parse_time_window(window):
+    """解析 HH:MM-HH:MM 时间窗口，返回 (开始, 结束)，格式错误时抛出 ValueError"""
+    start, sep, end = window.partition('-')
+    if not sep:
+        raise ValueError(f"Invalid time window (expected HH:MM-HH:MM): {window}")
+    return tuple(datetime.strptime(part.strip(), '%H:%M').time() for part in (start, end))
+
+def in_time_window(window, now):
+    """now 是否在时间窗口内（可跨午夜），窗口为空或格式错误时返回 False"""
+    try:
+        start, end = parse_time_window(window)
+    except ValueError:
+        return False
+    current = now.time()
+    if start <= end:
+        return start <= current < end
+    return current >= start or current < end
+
+class BrowserWatchdog:
+    """浏览器资源看门狗
+    
+    定期从 /proc 采样浏览器进程组的内存和CPU占用，在超过阈值或进入
+    计划回收时间窗口时重启浏览器并重新打开当前URL；浏览器崩溃时自动
+    重启，连续快速崩溃时按指数退避延迟重启。
+    """
+    
+    # 存活超过该时长（秒）的浏览器再崩溃不计入连续崩溃
+    STABLE_UPTIME = 60
+    
+    def __init__(self, browser_manager, config):
+        self.browser_manager = browser_manager
+        self.config = config
+        self.last_sample = None
+        self.events = deque(maxlen=20)
+        self.consecutive_crashes = 0
+        self.next_restart_at = None
+        self._cpu_over = 0
+        self._prev_cpu = None
+        self._last_window_recycle = None
+        self._relaunch_pending = False
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        self.browser_manager.watchdog = self
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+    
+    def summary(self):
+        """供状态接口使用的摘要"""
+        return {
+            'last_sample': self.last_sample,
+            'consecutive_crashes': self.consecutive_crashes,
+            'next_restart_at': self.next_restart_at,
+            'events': list(self.events)
+        }
+    
+    def _run(self):
+        while not self._stop.wait(self.config.watchdog_interval):
+            try:
+                self.check()
+            except Exception as e:
+                logging.error(f"Watchdog check failed: {e}")
+    
+    def _in_recycle_window(self, now):
+        """当前时间是否在 RECYCLE_WINDOW（HH:MM-HH:MM，可跨午夜）内"""
+        return in_time_window(self.config.recycle_window, now)
+    
+    def _record(self, kind, reason, **extra):
+        event = {'time': time.time(), 'kind': kind, 'reason': reason}
+        event.update(extra)
+        self.events.append(event)
+    
+    def check(self, now=None):
+        """执行一次检查（由后台线程周期调用）"""
+        manager = self.browser_manager
+        process = manager.process
+        if process is None:
+            self._prev_cpu = None
+            return
+        
+        if not process.is_alive():
+            self._handle_crash(process)
+            return
+        
+        if process.started_at and time.time() - process.started_at > self.STABLE_UPTIME:
+            self.consecutive_crashes = 0
+        
+        rss, cpu_seconds, count = sample_process_group(process.pgid)
+        sampled_at = time.monotonic()
+        cpu_percent = None
+        if self._prev_cpu and self._prev_cpu[0] == process.pid:
+            elapsed = sampled_at - self._prev_cpu[1]
+            if elapsed > 0:
+                cpu_percent = round((cpu_seconds - self._prev_cpu[2]) / elapsed * 100, 1)
+        self._prev_cpu = (process.pid, sampled_at, cpu_seconds)
+        self.last_sample = {
+            'time': time.time(),
+            'pid': process.pid,
+            'processes': count,
+            'rss_mb': round(rss / 1024 / 1024, 1),
+            'cpu_percent': cpu_percent
+        }
+        
+        max_rss = self.config.watchdog_max_rss_mb
+        if max_rss and rss > max_rss * 1024 * 1024:
+            self._recycle('memory', f"RSS {self.last_sample['rss_mb']}MB exceeds {max_rss}MB")
+            return
+        
+        max_cpu = self.config.watchdog_max_cpu_percent
+        if max_cpu and cpu_percent is not None:
+            self._cpu_over = self._cpu_over + 1 if cpu_percent > max_cpu else 0
+            if self._cpu_over >= self.config.watchdog_cpu_samples:
+                self._recycle('cpu', f"CPU {cpu_percent}% above {max_cpu}% for "
+                                     f"{self._cpu_over} samples")
+                return
+        
+        now = now or datetime.now()
+        uptime_hours = (time.time() - process.started_at) / 3600
+        if (self._in_recycle_window(now) and uptime_hours >= self.config.recycle_min_uptime and
+                self._last_window_recycle != now.date()):
+            self._last_window_recycle = now.date()
+            self._recycle('scheduled', f"Uptime {uptime_hours:.1f}h in recycle window")
+    
+    def _handle_crash(self, process):
+        """浏览器意外退出：按指数退避重启"""
+        manager = self.browser_manager
+        if not manager.current_url:
+            return
+        # 上次崩溃重启失败时状态为 failed，仍需继续按退避重试
+        if manager.state != 'crashed' and not (manager.state == 'failed' and
+                                               self._relaunch_pending):
+            return
+        
+        now = time.monotonic()
+        if self.next_restart_at is None:
+            uptime = (process.exited_at or time.time()) - process.started_at
+            if uptime < self.STABLE_UPTIME:
+                self.consecutive_crashes += 1
+            else:
+                self.consecutive_crashes = 1
+            delay = 0
+            if self.consecutive_crashes > 1:
+                delay = min(self.config.crash_backoff_base * 2 ** (self.consecutive_crashes - 2),
+                            self.config.crash_backoff_max)
+            self.next_restart_at = now + delay
+            if delay:
+                logging.warning(f"Browser crash loop detected ({self.consecutive_crashes} "
+                                f"consecutive crashes), restarting in {delay:g}s")
+        
+        if now >= self.next_restart_at:
+            self.next_restart_at = None
+            success = self._recycle('crash', f"Browser exited with code {process.returncode}")
+            self._relaunch_pending = not success
+    
+    def _recycle(self, reason, detail):
+        """重启浏览器并重新打开当前URL"""
+        logging.warning(f"Watchdog recycling browser ({reason}): {detail}")
+        BROWSER_RECYCLES.inc(reason=reason)
+        self._cpu_over = 0
+        self._prev_cpu = None
+        success, message = self.browser_manager.recycle(reason)
+        self._record('recycle', reason, detail=detail, ok=success, message=message)
+        if not success:
+            logging.error(f"Watchdog recycle failed: {message}")
+        return success
+
+class BrowserSlot:
+    """HTTP接口中的一个槽位：浏览器管理器及其专属的调度器和任务管理器"""
+    
+    def __init__(self, manager, scheduler, jobs):
+        self.manager = manager
+        self.scheduler = scheduler
+        self.jobs = jobs
+        self.playlist = None
+    
+    @property
+    def slot_id(self):
+        return self.manager.slot.slot_id
+    
+    def to_dict(self):
+        info = self.manager.slot.to_dict()
+        info.update(self.manager.status())
+        return info
+
+def create_browser_managers(config, manager_class=None, **kwargs):
+    """按 config.slots 为每个槽位创建浏览器管理器，缓存代理和能力探测由各槽位共享"""
+    manager_class = manager_class or BrowserManager
+    managers = []
+    proxy = None
+    probe = BrowserProbe(config.browser_probe_cache or None)
+    calibration = load_calibration(config.browser_calibration)
+    for slot in config.slots:
+        manager = manager_class(config, slot=slot, proxy=proxy, probe=probe,
+                                calibration=calibration, **kwargs)
+        proxy = manager.proxy
+        managers.append(manager)
+    return managers
+
+class BootTimeline:
+    """启动时间线
+    
+    记录开机快速路径中各阶段的时间点，同时给出距系统启动和距本进程启动的
+    耗时。进程启动时间取自 /proc/self/stat，因此包含解释器启动和模块导入；
+    同名事件只记录第一次。非默认槽位的事件名带 ":<槽位ID>" 后缀。
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.process_start = self._process_start_time()
+        self.marks = OrderedDict([('process_start', self.process_start)])
+    
+    @staticmethod
+    def clock():
+        return time.clock_gettime(BOOT_CLOCK)
+    
+    def _process_start_time(self):
+        stat = read_proc_stat(os.getpid()) if BOOT_CLOCK != time.CLOCK_MONOTONIC else None
+        if stat is None:
+            return self.clock()
+        return stat[2] / os.sysconf('SC_CLK_TCK')
+    
+    def mark(self, event):
+        """记录事件，返回距进程启动的秒数；已记录过的事件返回 None"""
+        now = self.clock()
+        with self._lock:
+            if event in self.marks:
+                return None
+            self.marks[event] = now
+        elapsed = now - self.process_start
+        BOOT_STAGE_SECONDS.observe(elapsed, stage=event)
+        logging.debug(f"Boot stage {event} at +{elapsed * 1000:.0f}ms")
+        return elapsed
+    
+    def elapsed_ms(self, event):
+        with self._lock:
+            at = self.marks.get(event)
+        return None if at is None else round((at - self.process_start) * 1000, 1)
+    
+    def summary(self):
+        with self._lock:
+            marks = list(self.marks.items())[1:]
+        return ' '.join(f'{event}=+{(at - self.process_start) * 1000:.0f}ms' for event, at in marks)
+    
+    def to_dict(self):
+        with self._lock:
+            marks = list(self.marks.items())
+        return {
+            'process_start_s': round(self.process_start, 3),
+            'events': [{
+                'event': event,
+                'since_boot_s': round(at, 3),
+                'since_process_start_ms': round((at - self.process_start) * 1000, 1)
+            } for event, at in marks]
+        }
+
+BOOT_TIMELINE = BootTimeline()
+
+def autolaunch(manager, timeline=BOOT_TIMELINE, url=None, timeout=None):
+    """开机快速路径：与控制服务的初始化并行，直接打开槽位的默认URL
+    
+    开机时X服务器可能晚于本服务就绪，因此先在 timeout 秒内等待显示可用，
+    再打开URL并等待就绪信号，各阶段记入启动时间线。接管的浏览器已显示
+    该URL时直接复用。返回是否成功打开。
+    """
+    config = manager.config
+    url = url or manager.slot.url or config.default_url
+    timeout = config.browser_timeout if timeout is None else timeout
+    suffix = '' if manager.slot.is_default else f':{manager.slot.slot_id}'
+    deadline = time.monotonic() + timeout
+    
+    while not manager._check_display():
+        if time.monotonic() >= deadline:
+            logging.error(f"Autolaunch{suffix} gave up: no display within {timeout:g}s")
+            return False
+        time.sleep(AUTOLAUNCH_DISPLAY_POLL)
+    timeline.mark('display_ready' + suffix)
+    
+    since = time.time()
+    details = {}
+    try:
+        success, message = manager.open_url(url, details)
+    except Exception as e:
+        success, message = False, f"Internal error: {e}"
+    if not success:
+        logging.error(f"Autolaunch{suffix} failed for {url}: {message}")
+        return False
+    
+    if details.get('method') == 'reuse':
+        timeline.mark('browser_reused' + suffix)
+        signal_name = 'reuse'
+    else:
+        timeline.mark('browser_spawned' + suffix)
+        remaining = max(0, deadline - time.monotonic())
+        try:
+            signal_name = ReadinessProbe(manager).wait(since, remaining)
+        except RuntimeError as e:
+            logging.error(f"Autolaunch{suffix} failed for {url}: {e}")
+            return False
+        if signal_name is None:
+            logging.warning(f"Autolaunch{suffix}: {url} not ready within {timeout:g}s")
+            return True
+    
+    timeline.mark('page_ready' + suffix)
+    logging.info(f"Autolaunch{suffix} showed {url} via {signal_name}; boot timeline: "
+                 f"{timeline.summary()}")
+    return True
+
+class PlaylistItem:
+    """播放列表中的一项：URL、显示时长（秒）和可选的时间窗口"""
+    
+    def __init__(self, url, duration, window=''):
+        self.url = url
+        self.duration = float(duration)
+        self.window = window or ''
+        if self.duration <= 0:
+            raise ValueError(f"Playlist item duration must be positive: {url}")
+        if self.window:
+            parse_time_window(self.window)
+    
+    @classmethod
+    def from_dict(cls, entry):
+        if not isinstance(entry, dict) or 'url' not in entry or 'duration' not in entry:
+            raise ValueError(f"Playlist item needs url and duration: {entry!r}")
+        return cls(entry['url'], entry['duration'], entry.get('window', ''))
+    
+    def is_active(self, now):
+        """该项目在 now 时刻是否参与轮播"""
+        return not self.window or in_time_window(self.window, now)
+    
+    def to_dict(self):
+        return {'url': self.url, 'duration': self.duration, 'window': self.window or None}
+
+def load_playlist(path):
+    """读取播放列表文件，返回 {槽位ID: [PlaylistItem]}
+    
+    文件为 JSON：项目数组（用于第一个槽位，键为 None），或以槽位ID为键的
+    对象。每个项目包含 url、duration（秒）和可选的 window（HH:MM-HH:MM，
+    可跨午夜）。格式错误时抛出 ValueError。
+    """
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except OSError as e:
+        raise ValueError(f"Cannot read playlist {path}: {e}")
+    except ValueError as e:
+        raise ValueError(f"Invalid playlist {path}: {e}")
+    if isinstance(data, list):
+        data = {None: data}
+    if not isinstance(data, dict) or not all(isinstance(v, list) for v in data.values()):
+        raise ValueError(f"Invalid playlist {path}: expected a list or an object of lists")
+    return {slot_id: [PlaylistItem.from_dict(entry) for entry in entries]
+            for slot_id, entries in data.items()}
+
+def slot_playlist(playlists, slot):
+    """从 load_playlist() 的结果中取出该槽位的项目"""
+    if slot.slot_id in playlists:
+        return playlists[slot.slot_id]
+    return playlists.get(None, []) if slot.index == 0 else []
+
+def playlist_start_url(config, slot):
+    """该槽位的播放列表当前应显示的第一个URL，未配置播放列表时返回 None"""
+    if not config.playlist:
+        return None
+    try:
+        items = slot_playlist(load_playlist(config.playlist), slot)
+    except ValueError:
+        return None
+    now = datetime.now()
+    return next((item.url for item in items if item.is_active(now)), None)
+
+class PlaylistScheduler:
+    """播放列表轮播
+    
+    依次显示 PLAYLIST 中的项目，每项显示 duration 秒；带 window 的项目只在
+    该时间段内参与轮播。下一项在计划开始前 PLAYLIST_PRELOAD 秒预热（后台
+    标签页或热备浏览器），到点后经由槽位的 LaunchScheduler 切换，与 /open
+    请求共用同一个串行队列。每项的计划开始时间由上一项的计划时间累加得出，
+    切换耗时不会累积；整个时段都已过去的项目记为错过并跳过。播放列表文件
+    或 PLAYLIST 配置变化时重新加载并从第一项开始。
+    """
+    
+    def __init__(self, slot, config):
+        self.slot = slot
+        self.config = config
+        self.items = []
+        self.error = None
+        # index 为当前显示的项目；next_at 为下一项的计划开始时间（monotonic）
+        self.index = None
+        self.next_index = None
+        self.next_at = None
+        self.preloaded = None
+        self.transitions = 0
+        self.missed = 0
+        self.drifts = deque(maxlen=100)
+        self.events = deque(maxlen=20)
+        self._preload_started = False
+        self._signature = None
+        self._stop = threading.Event()
+        self._thread = None
+        manager = slot.manager
+        self._suffix = '' if manager.slot.is_default else f':{manager.slot.slot_id}'
+    
+    def start(self):
+        self.slot.playlist = self
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name=f'playlist-{self.slot.slot_id}')
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+    
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                delay = self.step()
+            except Exception as e:
+                logging.error(f"Playlist{self._suffix} step failed: {e}")
+                delay = PLAYLIST_IDLE_POLL
+            if delay > 0:
+                self._stop.wait(delay)
+    
+    def _record(self, kind, item, **extra):
+        event = {'time': time.time(), 'kind': kind, 'url': item.url}
+        event.update(extra)
+        self.events.append(event)
+    
+    def _reload(self):
+        """PLAYLIST 配置或文件内容变化时重新加载，解析失败时保留当前播放列表"""
+        path = self.config.playlist
+        signature = None
+        if path:
+            try:
+                st = os.stat(path)
+                signature = (path, st.st_mtime_ns, st.st_size)
+            except OSError:
+                signature = (path, None, None)
+        if signature == self._signature:
+            return
+        self._signature = signature
+        items = []
+        if path:
+            try:
+                items = slot_playlist(load_playlist(path), self.slot.manager.slot)
+            except ValueError as e:
+                self.error = str(e)
+                logging.error(f"Playlist{self._suffix} not reloaded: {e}")
+                return
+        self.error = None
+        self.items = items
+        self.index = self.next_index = self.next_at = None
+        self._preload_started = False
+        if path:
+            logging.info(f"Playlist{self._suffix} loaded {len(items)} item(s) from {path}")
+    
+    @staticmethod
+    def _wall_time(at):
+        """把 monotonic 时刻换算为本地时间"""
+        return datetime.now() + timedelta(seconds=at - time.monotonic())
+    
+    def _choose(self, at):
+        """从当前项目之后找出 at 时刻处于时间窗口内的下一项，没有时返回 None"""
+        now = self._wall_time(at)
+        start = -1 if self.index is None else self.index
+        count = len(self.items)
+        for offset in range(1, count + 1):
+            index = (start + offset) % count
+            if self.items[index].is_active(now):
+                return index
+        return None
+    
+    def step(self):
+        """推进一次调度，返回距离下一次需要处理的秒数"""
+        self._reload()
+        if not self.items:
+            return PLAYLIST_IDLE_POLL
+        manager = self.slot.manager
+        now = time.monotonic()
+        if self.next_at is None:
+            # 开机时显示器可能尚未就绪，第一项等到可以显示时再开始计时
+            if self.index is None and not manager._check_display():
+                return AUTOLAUNCH_DISPLAY_POLL
+            self.next_at = now
+        if self.next_index is None:
+            self.next_index = self._choose(self.next_at)
+            self._preload_started = False
+            if self.next_index is None:
+                # 没有处于时间窗口内的项目：保持当前画面，稍后重新计时
+                self.next_at = None
+                return PLAYLIST_IDLE_POLL
+        item = self.items[self.next_index]
+        
+        # 整个时段都已过去（切换阻塞过久、系统挂起），跳过该项
+        if now >= self.next_at + item.duration:
+            self.missed += 1
+            PLAYLIST_MISSED.inc(slot=self.slot.slot_id)
+            self._record('missed', item, late_ms=round((now - self.next_at) * 1000, 1))
+            logging.warning(f"Playlist{self._suffix} missed {item.url}: its {item.duration:g}s "
+                            f"slot ended {now - self.next_at - item.duration:.1f}s ago")
+            self._advance(item)
+            return 0
+        
+        preload_at = self.next_at - self.config.playlist_preload
+        if now < preload_at:
+            return preload_at - now
+        if not self._preload_started and self.config.playlist_preload > 0:
+            self._preload_started = True
+            self.preloaded = manager.preload(item.url)
+            # 预热可能因等待锁而耗时，重新检查是否已错过该时段
+            return 0
+        if now < self.next_at:
+            return self.next_at - now
+        
+        self._show(item)
+        self._advance(item)
+        return 0
+    
+    def _advance(self, item):
+        self.index = self.next_index
+        self.next_index = None
+        self.next_at += item.duration
+    
+    def _show(self, item):
+        """切换到该项目，记录相对计划开始时间的漂移"""
+        details = {}
+        try:
+            success, message = self.slot.scheduler.open(item.url, details,
+                                                        timeout=self.config.browser_timeout)
+        except Exception as e:
+            success, message = False, f"Internal error: {e}"
+        drift = time.monotonic() - self.next_at
+        method = details.get('method') or 'failed'
+        self.preloaded = None
+        if not success:
+            self._record('failed', item, message=message)
+            logging.warning(f"Playlist{self._suffix} could not show {item.url}: {message}")
+            return
+        self.transitions += 1
+        self.drifts.append(drift)
+        PLAYLIST_DRIFT_SECONDS.observe(drift, slot=self.slot.slot_id, method=method)
+        self._record('shown', item, method=method, drift_ms=round(drift * 1000, 1))
+        logging.info(f"Playlist{self._suffix} showed {item.url} via {method}, "
+                     f"{drift * 1000:.0f}ms after its scheduled start")
+    
+    def summary(self):
+        """供 /api/v1/playlist 使用的摘要"""
+        items = self.items
+        index, next_index, next_at = self.index, self.next_index, self.next_at
+        drifts = sorted(self.drifts)
+        return {
+            'file': self.config.playlist or None,
+            'error': self.error,
+            'items': [item.to_dict() for item in items],
+            'current': items[index].url if index is not None and index < len(items) else None,
+            'next': (items[next_index].url
+                     if next_index is not None and next_index < len(items) else None),
+            'next_at': (time.time() + next_at - time.monotonic()) if next_at is not None else None,
+            'preloaded': self.preloaded,
+            'transitions': self.transitions,
+            'missed': self.missed,
+            'drift_ms': {
+                'last': round(self.drifts[-1] * 1000, 1) if drifts else None,
+                'p50': round(drifts[len(drifts) // 2] * 1000, 1) if drifts else None,
+                'max': round(drifts[-1] * 1000, 1) if drifts else None,
+            },
+            'events': list(self.events)
+        }
+
+class ConfigReloader:
+    """配置热加载
+    
+    每 CONFIG_RELOAD_INTERVAL 秒检查一次 .env 的修改时间和大小（为 0 时只
+    响应 SIGHUP）。新配置完整解析并校验通过后才一次性替换正在使用的
+    Config，随后更新派生状态：白名单索引随新配置重建，主页按新的
+    DEFAULT_URL 重新渲染，调度器和任务超时、日志级别立即生效，浏览器
+    参数按新配置重新生成；只有启动命令真正改变（如 ENABLE_GPU）时才重启
+    浏览器。RESTART_FIELDS 中的配置项保持运行中的值，并提示需要重启服务。
+    """
+    
+    def __init__(self, config, slots):
+        self.config = config
+        self.slots = slots
+        self.last_reload = None
+        self._signature = self._file_signature()
+        self._lock = threading.Lock()
+        self._trigger = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def _file_signature(self):
+        try:
+            st = os.stat(self.config.env_file)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True, name='config-reloader')
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        self._trigger.set()
+    
+    def trigger(self):
+        """请求立即重新加载（SIGHUP），可在信号处理函数中调用"""
+        self._trigger.set()
+    
+    def _run(self):
+        while not self._stop.is_set():
+            interval = self.config.config_reload_interval
+            triggered = self._trigger.wait(interval if interval > 0 else None)
+            self._trigger.clear()
+            if self._stop.is_set():
+                return
+            signature = self._file_signature()
+            if triggered or signature != self._signature:
+                self._signature = signature
+                try:
+                    self.reload()
+                except Exception as e:
+                    logging.error(f"Config reload failed: {e}")
+    
+    def reload(self):
+        """重新加载配置，返回 (是否成功, 变化的配置项或错误信息)"""
+        with self._lock:
+            try:
+                new = Config(self.config.env_file, export=False)
+                errors = new.validate()
+            except ValueError as e:
+                errors = [str(e)]
+            if errors:
+                CONFIG_RELOADS.inc(result='invalid')
+                logging.error(f"Config reload rejected, keeping current config: {'; '.join(errors)}")
+                self.last_reload = {'at': time.time(), 'ok': False, 'errors': errors}
+                return False, errors
+            
+            changed = self.config.diff(new)
+            for name in [name for name in changed if name in Config.RESTART_FIELDS]:
+                logging.warning(f"{name.upper()} changed in {self.config.env_file}; "
+                                "restart the service to apply it")
+                setattr(new, name, getattr(self.config, name))
+                changed.remove(name)
+            if not changed:
+                CONFIG_RELOADS.inc(result='unchanged')
+                new.export_env()
+                return True, []
+            
+            previous = copy.copy(self.config)
+            self.config.replace_with(new)
+            # 新配置生效后才导出到进程环境，被拒绝的配置不会影响之后启动的浏览器
+            self.config.export_env()
+            logging.info(f"Config reloaded: {', '.join(name.upper() for name in changed)}")
+            apply_log_levels(self.config)
+            for slot in self.slots.values():
+                self._apply_slot(slot, previous)
+            CONFIG_RELOADS.inc(result='applied')
+            self.last_reload = {'at': time.time(), 'ok': True, 'changed': changed}
+            return True, changed
+    
+    def _apply_slot(self, slot, previous):
+        config = self.config
+        slot.scheduler.min_interval = config.launch_min_interval
+        slot.scheduler.max_pending = config.launch_max_pending
+        slot.jobs.timeout = config.browser_timeout
+        manager = slot.manager
+        manager.standby.max_standby = config.standby_max
+        manager.standby.ready_spec = config.standby_ready
+        manager.standby.ready_timeout = config.standby_ready_timeout
+        if manager.apply_config(previous):
+            return
+        # 正在显示旧的默认URL时切换到新的默认URL
+        if (config.default_url != previous.default_url and not manager.slot.url and
+                manager.current_url == previous.default_url and manager._get_browser_pid()):
+            slot.scheduler.open(config.default_url)
+        elif (manager.current_url and manager._get_browser_pid() and
+              manager.check_url(manager.current_url)):
+            logging.warning(f"Current URL {manager.current_url} is no longer allowed "
+                            f"by ALLOW_LIST; it stays open until the next change")
+
+class Asset:
+    """内存中的静态资源（原始字节、gzip 版本和 ETag 均预先计算）"""
+    
+    # 小于该大小的文件压缩收益不大
+    GZIP_MIN_SIZE = 256
+    
+    def __init__(self, body, content_type, signature=None):
+        self.body = body
+        self.content_type = content_type
+        self.signature = signature
+        self.etag = '"%s"' % hashlib.sha1(body).hexdigest()[:16]
+        self.gzip_body = None
+        if content_type.startswith(('text/', 'application/javascript', 'application/json',
+                                    'image/svg')) and len(body) >= self.GZIP_MIN_SIZE:
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                self.gzip_body = compressed
+
+class StaticAssets:
+    """静态资源缓存
+    
+    文件只在首次请求或其修改时间/大小变化时读取，之后直接返回内存中的
+    字节。主页模板按 (文件签名, 默认URL) 缓存渲染结果。
+    """
+    
+    def __init__(self, root=STATIC_DIR):
+        self.root = Path(root).resolve()
+        self._lock = threading.Lock()
+        self._assets = {}
+        self._index = None
+    
+    def _resolve(self, name):
+        """将请求路径映射到 root 下的文件，越界时返回 None"""
+        path = (self.root / name).resolve()
+        if self.root not in path.parents or not path.is_file():
+            return None
+        return path
     
-    def close_browser(self):
-        """关闭浏览器"""
-        success = self._kill_browser()
-        if success:
-            logging.info("Browser closed successfully")
-            return True, "Browser closed"
-        else:
-            return False, "Failed to close browser"
+    @staticmethod
+    def _signature(path):
+        st = path.stat()
+        return (st.st_mtime_ns, st.st_size)
     
-    def _validate_url(self, url):
-        """验证URL格式"""
-        if not url:
-            return False
-        
-        if not url.startswith(('http://', 'https://')):
-            return False
-        
-        try:
-            parsed = urlparse(url)
-            return bool(parsed.netloc)
-        except:
-            return False
+    @staticmethod
+    def _content_type(path):
+        content_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type == 'application/javascript':
+            content_type += '; charset=utf-8'
+        return content_type
     
-    def _check_whitelist(self, url):
-        """检查URL是否在白名单中"""
-        if not self.config.allow_list:
-            return True
-        
-        try:
-            domain = urlparse(url).netloc
-            return any(allowed in domain for allowed in self.config.allow_list)
-        except:
-            return False
+    def get(self, name):
+        """返回静态资源，文件不存在时返回 None"""
+        path = self._resolve(name)
+        if path is None:
+            return None
+        signature = self._signature(path)
+        with self._lock:
+            asset = self._assets.get(path)
+            if asset is None or asset.signature != signature:
+                asset = Asset(path.read_bytes(), self._content_type(path), signature)
+                self._assets[path] = asset
+            return asset
     
-    def _check_display(self):
-        """检查显示环境"""
-        display = os.environ.get('DISPLAY')
-        if not display:
-            return False
-        
-        # 检查X11服务器是否运行
-        try:
-            subprocess.run(['xset', 'q'], capture_output=True, check=True, timeout=5)
-            return True
-        except:
-            return False
+    def index(self, default_url):
+        """返回替换了默认URL的主页"""
+        path = self.root / 'index.html'
+        key = (self._signature(path), default_url)
+        with self._lock:
+            if self._index is None or self._index.signature != key:
+                content = path.read_text(encoding='utf-8').replace('{{DEFAULT_URL}}', default_url)
+                self._index = Asset(content.encode('utf-8'), 'text/html; charset=utf-8', key)
+            return self._index
 
 class WebKioskHandler(BaseHTTPRequestHandler):
-    """HTTP请求处理器"""
+    """HTTP请求处理器
     
-    def __init__(self, *args, browser_manager=None, config=None, **kwargs):
+    除表单接口（/open、/close）外，还提供 JSON 接口 /api/v1/open、
+    /api/v1/close 和 /api/v1/status。所有响应都带 Content-Length，
+    以支持 HTTP/1.1 持久连接。
+    
+    多槽位时通过 /api/v1/slots/<id>/<操作> 或 slot 参数指定槽位，
+    未指定时使用第一个槽位。
+    """
+    
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT
+    # 缓冲响应并在每个请求结束时一次性发送，避免 Nagle 与延迟确认叠加造成的 40ms 停顿
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+    
+    def __init__(self, *args, browser_manager=None, config=None, assets=None,
+                 scheduler=None, jobs=None, slots=None, **kwargs):
         self.browser_manager = browser_manager
+        self.scheduler = scheduler
+        self.jobs = jobs
+        self.slots = slots or OrderedDict()
         self.config = config
+        self.assets = assets or StaticAssets()
         super().__init__(*args, **kwargs)
     
     def do_GET(self):
         """处理GET请求"""
-        if self.path == '/':
+        start_time = time.monotonic()
+        endpoint = self._route_get(urlparse(self.path).path)
+        HTTP_REQUEST_SECONDS.observe(time.monotonic() - start_time, endpoint=endpoint)
+    
+    def do_POST(self):
+        """处理POST请求"""
+        start_time = time.monotonic()
+        endpoint = self._route_post(urlparse(self.path).path)
+        HTTP_REQUEST_SECONDS.observe(time.monotonic() - start_time, endpoint=endpoint)
+    
+    def _select_slot(self, slot_id):
+        """切换本次请求操作的槽位；槽位不存在时发送 404 并返回 False"""
+        if not slot_id:
+            return True
+        slot = self.slots.get(slot_id)
+        if slot is None:
+            self._send_json_response(False, f"Unknown slot: {slot_id}", status=404)
+            return False
+        self.browser_manager = slot.manager
+        self.scheduler = slot.scheduler
+        self.jobs = slot.jobs
+        return True
+    
+    def _route_slot(self, path, route):
+        """处理 /api/v1/slots/<id>/<操作>：选中槽位后按 /api/v1/<操作> 分发"""
+        slot_id, _, action = path[len(API_PREFIX + '/slots/'):].partition('/')
+        if not self._select_slot(slot_id):
+            return API_PREFIX + '/slots/*'
+        endpoint = route(f'{API_PREFIX}/{action}', slot_selected=True)
+        return API_PREFIX + '/slots/*/' + action if endpoint != 'other' else endpoint
+    
+    def _route_get(self, path, slot_selected=False):
+        """分发GET请求，返回用于统计的端点名"""
+        if path.startswith(API_PREFIX + '/slots/'):
+            return self._route_slot(path, self._route_get)
+        if not slot_selected:
+            query = parse_qs(urlparse(self.path).query)
+            if not self._select_slot(query.get('slot', [None])[0]):
+                # 未知槽位的请求不按原始路径计数，避免任意路径产生新的指标序列
+                return 'other'
+        if path == '/':
             self._serve_index()
-        elif self.path.startswith('/static/'):
+        elif path.startswith('/static/'):
             self._serve_static()
+            return '/static'
+        elif path in ('/status', API_PREFIX + '/status'):
+            self._handle_status()
+        elif path == '/metrics':
+            self._handle_metrics()
+        elif path == API_PREFIX + '/slots':
+            self._handle_slot_list()
+        elif path == API_PREFIX + '/boot':
+            self._handle_boot()
+        elif path == API_PREFIX + '/playlist':
+            self._handle_playlist()
+        elif path in ('/events', API_PREFIX + '/events'):
+            self._handle_events()
+        elif path == API_PREFIX + '/jobs':
+            self._handle_job_list()
+        elif path.startswith(('/jobs/', API_PREFIX + '/jobs/')):
+            self._handle_job(path.rsplit('/', 1)[1])
+            return '/jobs'
         else:
             self._send_error(404, "Not Found")
+            return 'other'
+        return path
     
-    def do_POST(self):
-        """处理POST请求"""
-        if self.path == '/open':
+    def _route_post(self, path, slot_selected=False):
+        """分发POST请求，返回用于统计的端点名"""
+        # 先读取请求体，保证持久连接上的下一个请求能被正确解析
+        if not slot_selected:
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                if length < 0:
+                    raise ValueError(length)
+            except ValueError:
+                # 负数长度会变成 rfile.read(-1)，一直阻塞到客户端断开
+                self.close_connection = True
+                self._send_error(400, "Bad Request")
+                return 'other'
+            self._body = self.rfile.read(length)
+        
+        if path.startswith(API_PREFIX + '/slots/'):
+            return self._route_slot(path, self._route_post)
+        if not slot_selected:
+            try:
+                params = self._parse_params()
+            except ValueError:
+                params = {}
+            query = parse_qs(urlparse(self.path).query)
+            if not self._select_slot(params.get('slot') or query.get('slot', [None])[0]):
+                return 'other'
+        
+        if path in ('/open', API_PREFIX + '/open'):
             self._handle_open()
-        elif self.path == '/close':
+        elif path in ('/close', API_PREFIX + '/close'):
             self._handle_close()
         else:
             self._send_error(404, "Not Found")
+            return 'other'
+        return path
+    
+    def _parse_params(self):
+        """解析请求参数，支持表单和 JSON 请求体"""
+        content_type = self.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        body = self._body.decode('utf-8')
+        if content_type == 'application/json':
+            params = json.loads(body or '{}')
+            if not isinstance(params, dict):
+                raise ValueError("JSON body must be an object")
+            return params
+        return {key: values[0] for key, values in parse_qs(body).items()}
     
     def _serve_index(self):
         """提供主页"""
         try:
-            with open('static/index.html', 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # 替换默认URL
-            content = content.replace('{{DEFAULT_URL}}', self.config.default_url)
-            
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/html; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(content.encode('utf-8'))
-            
+            self._send_asset(self.assets.index(self.config.default_url))
         except Exception as e:
             logging.error(f"Failed to serve index: {e}")
             self._send_error(500, "Internal Server Error")
@@ -316,46 +3848,77 @@ class WebKioskHandler(BaseHTTPRequestHandler):
     def _serve_static(self):
         """提供静态文件"""
         try:
-            file_path = self.path[1:]  # 移除开头的'/'
-            
-            if file_path.endswith('.css'):
-                content_type = 'text/css'
-            elif file_path.endswith('.js'):
-                content_type = 'application/javascript'
-            else:
-                content_type = 'text/plain'
-            
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            self.send_response(200)
-            self.send_header('Content-Type', f'{content_type}; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(content.encode('utf-8'))
+            name = urlparse(self.path).path[len('/static/'):]
+            asset = self.assets.get(name)
+            if asset is None:
+                self._send_error(404, "File Not Found")
+                return
+            self._send_asset(asset)
             
         except Exception as e:
             logging.error(f"Failed to serve static file {self.path}: {e}")
             self._send_error(404, "File Not Found")
     
+    def _send_asset(self, asset):
+        """发送缓存的资源，支持 If-None-Match 和 gzip"""
+        if self.headers.get('If-None-Match') == asset.etag:
+            self.send_response(304)
+            self.send_header('ETag', asset.etag)
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            return
+        
+        body = asset.body
+        use_gzip = (asset.gzip_body is not None and
+                    'gzip' in self.headers.get('Accept-Encoding', ''))
+        if use_gzip:
+            body = asset.gzip_body
+        
+        self.send_response(200)
+        self.send_header('Content-Type', asset.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', asset.etag)
+        self.send_header('Cache-Control', 'no-cache')
+        if asset.gzip_body is not None:
+            self.send_header('Vary', 'Accept-Encoding')
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        self.wfile.write(body)
+    
     def _handle_open(self):
         """处理打开URL请求"""
         try:
-            content_length = int(self.headers.get('Content-Length', 0))
-            post_data = self.rfile.read(content_length).decode('utf-8')
-            
-            # 解析POST数据
-            params = parse_qs(post_data)
-            url = params.get('url', [''])[0]
+            try:
+                params = self._parse_params()
+            except ValueError as e:
+                self._send_json_response(False, f"Invalid request body: {e}", status=400)
+                return
+            url = params.get('url') or ''
             
             if not url:
                 self._send_json_response(False, "URL is required")
                 return
             
-            success, message = self.browser_manager.open_url(url)
-            self._send_json_response(success, message, {
-                'launched': url,
-                'browser': self.browser_manager.browser_cmd
-            })
+            if str(params.get('async', '')).lower() in ('1', 'true') and self.jobs:
+                self._start_job(url)
+                return
+            
+            details = {}
+            if self.scheduler:
+                success, message = self.scheduler.open(url, details)
+            else:
+                success, message = self.browser_manager.open_url(url, details)
+            extra = {
+                'launched': details.get('url', url),
+                'browser': self.browser_manager.browser_cmd,
+                'method': details.get('method'),
+                'elapsed_ms': details.get('elapsed_ms')
+            }
+            if details.get('superseded'):
+                extra['superseded'] = True
+            self._send_json_response(success, message, extra,
+                                     status=429 if details.get('rejected') else 200)
             
         except Exception as e:
             logging.error(f"Failed to handle open request: {e}")
@@ -364,14 +3927,110 @@ class WebKioskHandler(BaseHTTPRequestHandler):
     def _handle_close(self):
         """处理关闭浏览器请求"""
         try:
-            success, message = self.browser_manager.close_browser()
-            self._send_json_response(success, message)
+            details = {}
+            if self.scheduler:
+                success, message = self.scheduler.close(details)
+            else:
+                success, message = self.browser_manager.close_browser(details)
+            if details.get('rejected'):
+                self._send_json_response(success, message, status=429)
+                return
+            terminated = {key: details[key] for key in ('pid', 'latency_ms', 'forced', 'returncode')
+                          if key in details}
+            self._send_json_response(success, message,
+                                     {'terminated': terminated} if terminated else None)
             
         except Exception as e:
             logging.error(f"Failed to handle close request: {e}")
             self._send_json_response(False, f"Internal error: {e}")
     
-    def _send_json_response(self, success, message, extra_data=None):
+    def _start_job(self, url):
+        """创建异步启动任务并立即返回任务ID"""
+        error = self.browser_manager.check_url(url)
+        if error:
+            self._send_json_response(False, error)
+            return
+        job = self.jobs.submit(url)
+        self._send_json_response(True, "Launch accepted", {
+            'job': job.id,
+            'status': job.status,
+            'status_url': f"{API_PREFIX}/jobs/{job.id}"
+        }, status=202)
+    
+    def _handle_job(self, job_id):
+        """查询任务状态；?wait=N 时最多等待 N 秒直到任务结束或状态变化（长轮询）"""
+        job = self.jobs.get(job_id) if self.jobs else None
+        for slot in self.slots.values():
+            if job is not None:
+                break
+            job = slot.jobs.get(job_id)
+        if job is None:
+            self._send_json_response(False, "Job not found", status=404)
+            return
+        query = parse_qs(urlparse(self.path).query)
+        try:
+            wait = min(float(query.get('wait', ['0'])[0]), 60)
+        except ValueError:
+            wait = 0
+        if wait > 0 and not job.finished:
+            job.wait(wait, query.get('status', [None])[0])
+        self._send_json_response(job.status not in ('failed', 'timeout'),
+                                 job.message or job.status, job.to_dict())
+    
+    def _handle_job_list(self):
+        """列出最近的任务和按URL统计的就绪耗时"""
+        jobs, url_stats = self.jobs.list() if self.jobs else ([], {})
+        self._send_json_response(True, "OK", {'jobs': jobs, 'ready_stats': url_stats})
+    
+    def _handle_status(self):
+        """处理状态查询请求"""
+        try:
+            self._send_json_response(True, "OK", self.browser_manager.status())
+        except Exception as e:
+            logging.error(f"Failed to handle status request: {e}")
+            self._send_json_response(False, f"Internal error: {e}")
+    
+    def _handle_boot(self):
+        """返回启动时间线"""
+        self._send_json_response(True, "OK", {'boot': BOOT_TIMELINE.to_dict()})
+    
+    def _handle_playlist(self):
+        """返回当前槽位的播放列表进度、漂移和错过的时段"""
+        slot = next((s for s in self.slots.values() if s.manager is self.browser_manager), None)
+        playlist = slot.playlist if slot else None
+        self._send_json_response(True, "OK", {'playlist': playlist.summary() if playlist else None})
+    
+    def _handle_slot_list(self):
+        """列出所有槽位及其状态"""
+        self._send_json_response(True, "OK", {
+            'slots': [slot.to_dict() for slot in self.slots.values()]
+        })
+    
+    def _handle_events(self):
+        """订阅浏览器状态事件流（Server-Sent Events）"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.flush()
+        self.close_connection = True
+        
+        # 连接交由广播器管理，本处理线程随即返回
+        initial = EventBroadcaster.format_event('state', self.browser_manager.status())
+        self.server.detach_request(self.request)
+        self.browser_manager.events.subscribe(self.request, initial)
+    
+    def _handle_metrics(self):
+        """以 Prometheus 文本格式输出指标"""
+        body = METRICS.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _send_json_response(self, success, message, extra_data=None, status=200):
         """发送JSON响应"""
         response = {
             'ok': success,
@@ -381,67 +4040,1025 @@ class WebKioskHandler(BaseHTTPRequestHandler):
         if extra_data:
             response.update(extra_data)
         
-        self.send_response(200)
+        body = json.dumps(response).encode('utf-8')
+        self.send_response(status)
         self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
         self.send_header('Access-Control-Allow-Origin', '*')
         self.end_headers()
-        self.wfile.write(json.dumps(response).encode('utf-8'))
+        self.wfile.write(body)
     
     def _send_error(self, code, message):
         """发送错误响应"""
+        body = message.encode('utf-8')
         self.send_response(code)
         self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
         self.end_headers()
-        self.wfile.write(message.encode('utf-8'))
+        self.wfile.write(body)
+    
+    def log_request(self, code='-', size='-'):
+        """访问日志（可按 ACCESS_LOG_SAMPLE 采样，4xx/5xx 始终记录）"""
+        status = code.value if isinstance(code, HTTPStatus) else code
+        ACCESS_LOG.info('%s - "%s" %s %s', self.address_string(), self.requestline,
+                        status, size, extra={'status': int(status) if str(status).isdigit() else 0,
+                                             'client': self.client_address[0],
+                                             'request': self.requestline})
     
     def log_message(self, format, *args):
         """重写日志方法"""
         logging.info(f"{self.address_string()} - {format % args}")
 
-def setup_logging():
-    """设置日志"""
-    LOG_DIR.mkdir(parents=True, exist_ok=True)
+class AccessLogSampler(logging.Filter):
+    """访问日志采样：按比例保留普通请求，警告以上级别和 4xx/5xx 响应始终保留
+    
+    采用累加计数而非随机数，rate=0.1 时恰好每 10 条保留 1 条。
+    """
     
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(LOG_FILE),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+        self._credit = 0.0
+        self._lock = threading.Lock()
+    
+    def filter(self, record):
+        if self.rate >= 1 or record.levelno >= logging.WARNING:
+            return True
+        if getattr(record, 'status', 0) >= 400:
+            return True
+        with self._lock:
+            self._credit += self.rate
+            if self._credit >= 1:
+                self._credit -= 1
+                return True
+        return False
 
-def main():
-    """主函数"""
-    setup_logging()
+class JsonLogFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON"""
+    
+    EXTRA_FIELDS = ('status', 'client', 'request')
+    
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for field in self.EXTRA_FIELDS:
+            if hasattr(record, field):
+                entry[field] = getattr(record, field)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+class _LogQueueHandler(logging.handlers.QueueHandler):
+    """把日志放入有界队列，由后台线程写入
+    
+    队列满时丢弃 INFO 及以下级别的日志（并计数），警告和错误则等待入队，
+    保证请求处理线程不会被磁盘写入阻塞，同时不丢失重要日志。
+    """
+    
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+    
+    def enqueue(self, record):
+        if record.levelno >= logging.WARNING:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            LOG_RECORDS_DROPPED.inc()
+
+# 访问日志使用独立的 logger，以便单独采样
+ACCESS_LOG = logging.getLogger('web_kiosk.access')
+
+def apply_log_levels(config):
+    """按配置设置日志级别和访问日志采样（启动和配置热加载时调用）"""
+    level = logging.DEBUG if config.verbose_logging else getattr(logging, config.log_level,
+                                                                 logging.INFO)
+    logging.getLogger().setLevel(level)
+    
+    # 详细日志模式下记录全部访问日志
+    for log_filter in list(ACCESS_LOG.filters):
+        ACCESS_LOG.removeFilter(log_filter)
+    if not config.verbose_logging and config.access_log_sample < 1:
+        ACCESS_LOG.addFilter(AccessLogSampler(config.access_log_sample))
+
+def setup_logging(config=None):
+    """设置日志
+    
+    日志先进入内存队列，由后台线程写入按大小（LOG_MAX_MB）或时间
+    （LOG_ROTATE_WHEN）轮转的日志文件和标准输出。返回后台写入线程的
+    QueueListener，退出前应调用其 stop() 以写完剩余日志。
+    """
+    config = config or Config()
+    log_file = Path(config.log_file)
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+    
+    if config.log_rotate_when:
+        file_handler = logging.handlers.TimedRotatingFileHandler(
+            log_file, when=config.log_rotate_when, backupCount=config.log_backups)
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=int(config.log_max_mb * 1024 * 1024),
+            backupCount=config.log_backups)
+    if config.log_format == 'json':
+        formatter = JsonLogFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    handlers = [file_handler, logging.StreamHandler(sys.stdout)]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(_LogQueueHandler(queue.Queue(maxsize=10000)))
+    apply_log_levels(config)
+    
+    listener = logging.handlers.QueueListener(root.handlers[0].queue, *handlers,
+                                              respect_handler_level=True)
+    listener.start()
+    return listener
+
+class _DetachableServerMixin:
+    """允许处理器把连接移交给其他组件（如SSE广播器），处理结束后不再关闭"""
+    
+    def __init__(self, *args, **kwargs):
+        self._detached = set()
+        super().__init__(*args, **kwargs)
+    
+    def detach_request(self, request):
+        self._detached.add(request)
+    
+    def shutdown_request(self, request):
+        if request in self._detached:
+            self._detached.discard(request)
+            return
+        super().shutdown_request(request)
+
+class KioskHTTPServer(_DetachableServerMixin, HTTPServer):
+    """单线程HTTP服务器"""
+
+class KioskThreadingHTTPServer(_DetachableServerMixin, ThreadingHTTPServer):
+    """多线程HTTP服务器"""
+    daemon_threads = True
+
+# 逐跳头部，代理转发时不透传
+HOP_BY_HOP_HEADERS = {'connection', 'keep-alive', 'proxy-connection', 'proxy-authorization',
+                      'proxy-authenticate', 'te', 'trailer', 'trailers', 'transfer-encoding',
+                      'upgrade'}
+
+def parse_cache_control(value):
+    """解析 Cache-Control 头部为 {指令: 值} 字典"""
+    directives = {}
+    for part in (value or '').split(','):
+        name, _, arg = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = arg.strip().strip('"')
+    return directives
+
+def _http_date(value):
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp() if value else None
+    except (TypeError, ValueError):
+        return None
+
+def freshness_lifetime(headers, now):
+    """按缓存头部（(名称, 值) 列表）计算响应的新鲜期（秒），不可缓存时返回 None"""
+    headers = {key.lower(): value for key, value in headers}
+    cache_control = parse_cache_control(headers.get('cache-control'))
+    if 'no-store' in cache_control or 'private' in cache_control:
+        return None
+    vary = headers.get('vary', '')
+    if vary and any(v.strip().lower() not in ('accept-encoding', '') for v in vary.split(',')):
+        return None
+    if 'no-cache' in cache_control:
+        return 0
+    for directive in ('s-maxage', 'max-age'):
+        if directive in cache_control:
+            try:
+                lifetime = int(cache_control[directive])
+            except ValueError:
+                return 0
+            try:
+                lifetime -= int(headers.get('age', 0))
+            except ValueError:
+                pass
+            return max(0, lifetime)
+    date = _http_date(headers.get('date')) or now
+    expires = headers.get('expires')
+    if expires is not None:
+        expires_at = _http_date(expires)
+        return max(0, expires_at - date) if expires_at else 0
+    # 只有 Last-Modified 时按距上次修改时间的 10% 估算，最多一天
+    last_modified = _http_date(headers.get('last-modified'))
+    if last_modified:
+        return min(max(0, date - last_modified) / 10, 86400)
+    return 0
+
+class CachedResponse:
+    """磁盘缓存中的一个响应"""
+    
+    def __init__(self, url, status, headers, size, stored_at, expires_at):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.size = size
+        self.stored_at = stored_at
+        self.expires_at = expires_at
+    
+    def is_fresh(self, now):
+        return now < self.expires_at
+    
+    def header(self, name):
+        name = name.lower()
+        for key, value in self.headers:
+            if key.lower() == name:
+                return value
+        return None
+    
+    def to_dict(self):
+        return {'url': self.url, 'status': self.status, 'headers': self.headers,
+                'size': self.size, 'stored_at': self.stored_at, 'expires_at': self.expires_at}
+
+class ProxyCache:
+    """容量受限的LRU磁盘缓存
+    
+    每个响应保存为 <sha256>.body 和 <sha256>.json 两个文件，内存中只保留
+    按最近使用排序的索引。总大小超过 max_bytes 时淘汰最久未使用的条目。
+    文件的修改时间记录最近使用时间，重启后据此恢复LRU顺序。
+    """
+    
+    def __init__(self, root, max_bytes):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._index = OrderedDict()
+        self._lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._load()
+    
+    def _key(self, url):
+        return hashlib.sha256(url.encode()).hexdigest()
+    
+    def _load(self):
+        entries = []
+        for meta_path in self.root.glob('*.json'):
+            body_path = meta_path.with_suffix('.body')
+            try:
+                entry = CachedResponse(**json.loads(meta_path.read_text()))
+                entries.append((body_path.stat().st_mtime, entry))
+            except (OSError, ValueError, TypeError):
+                meta_path.unlink(missing_ok=True)
+                body_path.unlink(missing_ok=True)
+        for _, entry in sorted(entries, key=lambda item: item[0]):
+            self._index[self._key(entry.url)] = entry
+            self.total_bytes += entry.size
+        with self._lock:
+            self._evict_locked()
+    
+    def __len__(self):
+        return len(self._index)
+    
+    def get(self, url):
+        """返回 (条目, 响应体)，未命中时返回 (None, None)"""
+        key = self._key(url)
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                return None, None
+            self._index.move_to_end(key)
+        try:
+            body_path = self.root / f'{key}.body'
+            body = body_path.read_bytes()
+            os.utime(body_path)
+        except OSError:
+            self._remove(key)
+            return None, None
+        return entry, body
+    
+    def put(self, url, status, headers, body, expires_at):
+        """保存响应（先写临时文件再原子替换）"""
+        if len(body) > self.max_bytes:
+            return
+        key = self._key(url)
+        entry = CachedResponse(url, status, headers, len(body), time.time(), expires_at)
+        for suffix, data in (('.body', body), ('.json', json.dumps(entry.to_dict()).encode())):
+            path = self.root / f'{key}{suffix}'
+            staging = path.with_name(f'.{path.name}.{threading.get_ident()}')
+            staging.write_bytes(data)
+            os.replace(staging, path)
+        with self._lock:
+            old = self._index.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old.size
+            self._index[key] = entry
+            self.total_bytes += entry.size
+            self._evict_locked()
+    
+    def refresh(self, entry, headers, expires_at):
+        """304 重新验证成功后更新头部和过期时间"""
+        updated = dict((k.lower(), (k, v)) for k, v in entry.headers)
+        for key, value in headers:
+            if key.lower() not in HOP_BY_HOP_HEADERS and key.lower() != 'content-length':
+                updated[key.lower()] = (key, value)
+        entry.headers = list(updated.values())
+        entry.stored_at = time.time()
+        entry.expires_at = expires_at
+        path = self.root / f'{self._key(entry.url)}.json'
+        try:
+            staging = path.with_name(f'.{path.name}.{threading.get_ident()}')
+            staging.write_text(json.dumps(entry.to_dict()))
+            os.replace(staging, path)
+        except OSError as e:
+            logging.warning(f"Failed to refresh cache entry {entry.url}: {e}")
+    
+    def _remove(self, key):
+        with self._lock:
+            entry = self._index.pop(key, None)
+            if entry is not None:
+                self.total_bytes -= entry.size
+        for suffix in ('.body', '.json'):
+            (self.root / f'{key}{suffix}').unlink(missing_ok=True)
+    
+    def _evict_locked(self):
+        while self.total_bytes > self.max_bytes and self._index:
+            key, entry = self._index.popitem(last=False)
+            self.total_bytes -= entry.size
+            for suffix in ('.body', '.json'):
+                (self.root / f'{key}{suffix}').unlink(missing_ok=True)
+            PROXY_EVICTIONS.inc()
+
+class CachingProxyHandler(BaseHTTPRequestHandler):
+    """缓存代理请求处理器
+    
+    HTTP 的 GET 请求按缓存头部缓存；源站不可达或返回 5xx 时使用过期缓存
+    应答。HTTPS 通过 CONNECT 隧道直接转发（加密内容无法缓存）。
+    """
+    
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+    
+    def __init__(self, *args, proxy=None, **kwargs):
+        self.proxy = proxy
+        super().__init__(*args, **kwargs)
+    
+    def do_CONNECT(self):
+        host, _, port = self.path.rpartition(':')
+        try:
+            upstream = socket.create_connection((host, int(port)),
+                                                timeout=self.proxy.origin_timeout)
+        except (OSError, ValueError) as e:
+            PROXY_REQUESTS.inc(result='error')
+            self.send_error(502, f"Cannot connect to {self.path}: {e}")
+            return
+        PROXY_REQUESTS.inc(result='tunnel')
+        self.send_response(200, 'Connection Established')
+        self.end_headers()
+        self.wfile.flush()
+        self.close_connection = True
+        self._relay(upstream)
+    
+    def _relay(self, upstream):
+        """在客户端和源站之间双向转发，任一方关闭即结束"""
+        client = self.connection
+        upstream.settimeout(None)
+        sockets = [client, upstream]
+        try:
+            while True:
+                readable, _, _ = select.select(sockets, [], [], KEEPALIVE_TIMEOUT * 4)
+                if not readable:
+                    return
+                for sock in readable:
+                    data = sock.recv(64 * 1024)
+                    if not data:
+                        return
+                    (upstream if sock is client else client).sendall(data)
+        except OSError:
+            pass
+        finally:
+            upstream.close()
+    
+    def do_GET(self):
+        self._proxy_request()
+    
+    def do_HEAD(self):
+        self._proxy_request()
+    
+    def do_POST(self):
+        self._proxy_request()
+    
+    do_PUT = do_DELETE = do_OPTIONS = do_PATCH = do_POST
+    
+    def _proxy_request(self):
+        parsed = urlparse(self.path)
+        if parsed.scheme != 'http' or not parsed.hostname:
+            self.send_error(400, "Proxy requests must use an absolute http:// URL")
+            return
+        
+        try:
+            if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+                body = self._read_chunked_body()
+            else:
+                length = int(self.headers.get('Content-Length') or 0)
+                if length < 0:
+                    raise ValueError(length)
+                body = self.rfile.read(length) if length else None
+        except ValueError:
+            self.close_connection = True
+            self.send_error(400, "Invalid request body framing")
+            return
+        # 请求体已解码，按 Content-Length 转发给源站
+        headers = [(k, v) for k, v in self.headers.items()
+                   if k.lower() not in HOP_BY_HOP_HEADERS and k.lower() != 'content-length']
+        
+        if self.command != 'GET':
+            PROXY_REQUESTS.inc(result='bypass')
+            self._forward(parsed, headers, body)
+            return
+        
+        now = time.time()
+        entry, cached_body = self.proxy.cache.get(self.path)
+        request_cc = parse_cache_control(self.headers.get('Cache-Control'))
+        client_revalidate = 'no-cache' in request_cc or request_cc.get('max-age') == '0'
+        if entry and entry.is_fresh(now) and not client_revalidate:
+            PROXY_REQUESTS.inc(result='hit')
+            self._send_cached(entry, cached_body, 'HIT')
+            return
+        
+        if entry:
+            # 过期或客户端要求刷新：带条件头部向源站重新验证
+            headers = [(k, v) for k, v in headers
+                       if k.lower() not in ('if-none-match', 'if-modified-since')]
+            if entry.header('ETag'):
+                headers.append(('If-None-Match', entry.header('ETag')))
+            if entry.header('Last-Modified'):
+                headers.append(('If-Modified-Since', entry.header('Last-Modified')))
+        
+        try:
+            response = self.proxy.request(parsed, 'GET', headers, None)
+            status = response.status
+            response_headers = [(k, v) for k, v in response.getheaders()
+                                if k.lower() not in HOP_BY_HOP_HEADERS]
+        except (OSError, http.client.HTTPException) as e:
+            if entry:
+                self._serve_stale(entry, cached_body, str(e))
+            else:
+                PROXY_REQUESTS.inc(result='error')
+                self.send_error(502, f"Origin unreachable: {e}")
+            return
+        
+        if entry and status >= 500:
+            response.close()
+            self._serve_stale(entry, cached_body, f"origin returned {status}")
+            return
+        
+        now = time.time()
+        if entry and status == 304:
+            response.read()
+            lifetime = freshness_lifetime(response_headers, now) or 0
+            self.proxy.cache.refresh(entry, response_headers, now + lifetime)
+            PROXY_REQUESTS.inc(result='revalidated')
+            self._send_cached(entry, cached_body, 'REVALIDATED')
+            return
+        
+        PROXY_REQUESTS.inc(result='miss')
+        expires_at = None
+        if status == 200:
+            lifetime = freshness_lifetime(response_headers, now)
+            if lifetime is not None and 'set-cookie' not in (k.lower() for k, _ in response_headers):
+                expires_at = now + lifetime
+        self._stream_upstream(response, response_headers, 'MISS', expires_at)
+    
+    def _read_chunked_body(self):
+        """读取并解码分块编码的请求体，格式错误时抛出 ValueError"""
+        body = b''
+        while True:
+            size_line = self.rfile.readline(1024)
+            if not size_line.endswith(b'\n'):
+                raise ValueError("truncated chunk size")
+            size = int(size_line.split(b';', 1)[0].strip(), 16)
+            if size < 0:
+                raise ValueError(size)
+            if size == 0:
+                break
+            chunk = self.rfile.read(size)
+            if len(chunk) != size or self.rfile.readline(1024).strip():
+                raise ValueError("truncated chunk")
+            body += chunk
+        # 跳过尾部头部，直到空行
+        while True:
+            line = self.rfile.readline(8192)
+            if not line.endswith(b'\n'):
+                raise ValueError("truncated trailer")
+            if not line.strip():
+                return body or None
+    
+    def _forward(self, parsed, headers, body):
+        """不缓存的请求直接转发"""
+        try:
+            response = self.proxy.request(parsed, self.command, headers, body)
+            response_headers = [(k, v) for k, v in response.getheaders()
+                                if k.lower() not in HOP_BY_HOP_HEADERS]
+        except (OSError, http.client.HTTPException) as e:
+            PROXY_REQUESTS.inc(result='error')
+            self.send_error(502, f"Origin unreachable: {e}")
+            return
+        self._stream_upstream(response, response_headers, 'BYPASS')
+    
+    def _stream_upstream(self, response, headers, cache_status, expires_at=None):
+        """边读边把源站响应转发给客户端
+        
+        SSE、MJPEG、长轮询等响应不会被整体缓冲。源站给出 Content-Length 时
+        原样转发，否则对 HTTP/1.1 客户端使用分块编码、对 HTTP/1.0 客户端读到
+        源站关闭为止。expires_at 不为 None 时同时收集响应体，完整读完且
+        不超过缓存上限时写入缓存。
+        """
+        status = response.status
+        has_body = self.command != 'HEAD' and status not in (204, 304) and status >= 200
+        limit = self.proxy.cache.max_bytes
+        if response.length is not None and response.length > limit:
+            expires_at = None
+        
+        self.send_response(status, response.reason)
+        for key, value in headers:
+            if key.lower() != 'content-length':
+                self.send_header(key, value)
+        self.send_header('X-Cache', cache_status)
+        chunked = False
+        if has_body:
+            if response.length is not None:
+                self.send_header('Content-Length', str(response.length))
+            elif self.request_version == 'HTTP/1.1':
+                chunked = True
+                self.send_header('Transfer-Encoding', 'chunked')
+            else:
+                self.close_connection = True
+        self.end_headers()
+        
+        if not has_body:
+            response.read()
+            return
+        collected = []
+        size = 0
+        try:
+            for chunk in response.stream():
+                if chunked:
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+                else:
+                    self.wfile.write(chunk)
+                self.wfile.flush()
+                if expires_at is not None:
+                    size += len(chunk)
+                    if size > limit:
+                        expires_at, collected = None, []
+                    else:
+                        collected.append(chunk)
+            if chunked:
+                self.wfile.write(b'0\r\n\r\n')
+        except (OSError, http.client.HTTPException) as e:
+            # 响应头已发出，只能断开连接；未读完的源站连接不放回连接池
+            logging.debug(f"Proxy stream for {self.path} aborted: {e}")
+            response.close()
+            self.close_connection = True
+            return
+        
+        if expires_at is not None:
+            try:
+                self.proxy.cache.put(self.path, status, headers, b''.join(collected), expires_at)
+            except OSError as e:
+                logging.warning(f"Failed to cache {self.path}: {e}")
+    
+    def _serve_stale(self, entry, body, reason):
+        logging.warning(f"Serving stale cache for {entry.url}: {reason}")
+        PROXY_REQUESTS.inc(result='stale')
+        self._send_cached(entry, body, 'STALE', [('Warning', '110 - "Response is Stale"')])
+    
+    def _send_cached(self, entry, body, cache_status, extra_headers=()):
+        age = max(0, int(time.time() - entry.stored_at))
+        headers = [(k, v) for k, v in entry.headers if k.lower() not in ('age', 'content-length')]
+        headers += [('Age', str(age))] + list(extra_headers)
+        self._send_upstream(entry.status, None, headers, body, cache_status)
+    
+    def _send_upstream(self, status, reason, headers, body, cache_status):
+        self.send_response(status, reason)
+        for key, value in headers:
+            if key.lower() != 'content-length':
+                self.send_header(key, value)
+        self.send_header('X-Cache', cache_status)
+        if self.command != 'HEAD' and status not in (204, 304) and status >= 200:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD' and body:
+            self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        logging.debug(f"Proxy {self.address_string()} - {format % args}")
+
+class CachingProxy:
+    """启动器托管的本地缓存代理
+    
+    浏览器通过代理参数（Chromium）或 http_proxy 环境变量（其他浏览器）
+    使用该代理。到源站的连接按主机复用。
+    """
+    
+    def __init__(self, cache_dir, max_bytes, host='127.0.0.1', port=0, origin_timeout=10):
+        self.cache = ProxyCache(cache_dir, max_bytes)
+        self.host = host
+        self.requested_port = port
+        self.origin_timeout = origin_timeout
+        self.port = None
+        self.server = None
+        self._pool = {}
+        self._pool_lock = threading.Lock()
+    
+    @property
+    def url(self):
+        return f'http://{self.host}:{self.port}' if self.port else None
+    
+    def summary(self):
+        """供状态接口使用的摘要"""
+        return {
+            'url': self.url,
+            'entries': len(self.cache),
+            'bytes': self.cache.total_bytes,
+            'requests': {result: PROXY_REQUESTS.value(result=result)
+                         for result in ('hit', 'miss', 'revalidated', 'stale')}
+        }
+    
+    def start(self):
+        proxy = self
+        
+        class Handler(CachingProxyHandler):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, proxy=proxy, **kwargs)
+        
+        self.server = KioskThreadingHTTPServer((self.host, self.requested_port), Handler)
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        logging.info(f"Caching proxy listening on {self.url} "
+                     f"({len(self.cache)} cached responses, {self.cache.total_bytes} bytes)")
+    
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+    
+    def request(self, parsed, method, headers, body):
+        """向源站发送请求，复用空闲连接；复用的连接失效时重试一次"""
+        origin = (parsed.hostname, parsed.port or 80)
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+        for attempt in range(2):
+            conn = self._acquire(origin) if attempt == 0 else None
+            reused = conn is not None
+            if conn is None:
+                conn = http.client.HTTPConnection(*origin, timeout=self.origin_timeout)
+            try:
+                conn.putrequest(method, path, skip_host=True, skip_accept_encoding=True)
+                if not any(key.lower() == 'host' for key, _ in headers):
+                    conn.putheader('Host', parsed.netloc)
+                for key, value in headers:
+                    conn.putheader(key, value)
+                if body:
+                    conn.putheader('Content-Length', str(len(body)))
+                conn.endheaders(body)
+                response = conn.getresponse()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                if reused:
+                    continue
+                raise
+            return _PooledResponse(response, lambda: self._release(origin, conn, response),
+                                   conn.close)
+        raise http.client.HTTPException("Origin connection failed")
+    
+    def _acquire(self, origin):
+        with self._pool_lock:
+            idle = self._pool.get(origin)
+            return idle.pop() if idle else None
+    
+    def _release(self, origin, conn, response):
+        if response.will_close:
+            conn.close()
+            return
+        with self._pool_lock:
+            idle = self._pool.setdefault(origin, [])
+            if len(idle) < 4:
+                idle.append(conn)
+                return
+        conn.close()
+
+class _PooledResponse:
+    """读取完响应体后把连接归还连接池"""
+    
+    def __init__(self, response, release, discard):
+        self._response = response
+        self._release = release
+        self._discard = discard
+        self.status = response.status
+        self.reason = response.reason
+    
+        # 剩余响应体长度，分块编码或读到关闭为止时为 None
+        self.length = response.length
+    
+    def getheaders(self):
+        return self._response.getheaders()
+    
+    def read(self):
+        body = self._response.read()
+        self._release()
+        return body
+    
+    def stream(self, size=64 * 1024):
+        """逐块返回已到达的响应体数据，读完后归还连接"""
+        while True:
+            chunk = self._response.read1(size)
+            if not chunk:
+                break
+            yield chunk
+        # read1 读完定长响应体后不会自行关闭响应，连接复用前需要 read() 收尾
+        self._response.read()
+        self._release()
+    
+    def close(self):
+        """放弃未读完的响应，连接随之关闭而不归还连接池"""
+        self._response.close()
+        self._discard()
+
+def create_server(config, browser_manager, scheduler=None, managers=None):
+    """创建HTTP服务器
+    
+    默认使用多线程服务器，使得 /open 等耗时的浏览器操作不会阻塞
+    主页和静态文件请求；THREADED_SERVER=false 时退回单线程模式。
+    打开/关闭请求经由 LaunchScheduler 合并后执行，每个槽位有各自的
+    调度器，不同槽位的请求互不等待。
+    """
+    assets = StaticAssets()
+    if scheduler is None:
+        scheduler = LaunchScheduler(browser_manager, config.launch_min_interval,
+                                    config.launch_max_pending)
+    jobs = JobManager(browser_manager, scheduler, config.browser_timeout)
+    slots = OrderedDict()
+    for manager in managers or [browser_manager]:
+        if manager is browser_manager:
+            slot = BrowserSlot(manager, scheduler, jobs)
+        else:
+            slot_scheduler = LaunchScheduler(manager, config.launch_min_interval,
+                                             config.launch_max_pending)
+            slot = BrowserSlot(manager, slot_scheduler,
+                               JobManager(manager, slot_scheduler, config.browser_timeout))
+        slots[slot.slot_id] = slot
+    
+    class Handler(WebKioskHandler):
+        # 单线程模式下持久连接会独占服务器，因此只在多线程模式下启用
+        protocol_version = 'HTTP/1.1' if config.threaded_server else 'HTTP/1.0'
+        
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, browser_manager=browser_manager, config=config,
+                             assets=assets, scheduler=scheduler, jobs=jobs, slots=slots,
+                             **kwargs)
+    
+    if config.threaded_server:
+        server = KioskThreadingHTTPServer((config.host, config.port), Handler)
+    else:
+        server = KioskHTTPServer((config.host, config.port), Handler)
+    server.slots = slots
+    return server
+
+def probe_browsers(config, refresh=False):
+    """探测所有已安装的候选浏览器，返回各自的能力和耗时（--probe-browser）"""
+    probe = BrowserProbe(config.browser_probe_cache or None)
+    report = {'cache_file': probe.cache_file, 'selected': None, 'browsers': []}
+    start_time = time.perf_counter()
+    for name, _ in browser_candidates(config):
+        browser_start = time.perf_counter()
+        path = probe.resolve(name)
+        if path is None:
+            continue
+        info = {'name': name}
+        info.update(probe.capabilities(name, path, refresh=refresh))
+        info['elapsed_ms'] = round((time.perf_counter() - browser_start) * 1000, 2)
+        report['browsers'].append(info)
+        if report['selected'] is None:
+            report['selected'] = name
+            report['detect_ms'] = round((time.perf_counter() - start_time) * 1000, 2)
+    report['total_ms'] = round((time.perf_counter() - start_time) * 1000, 2)
+    return report
+
+class _CalibrationPageHandler(BaseHTTPRequestHandler):
+    """校准用的本地测试页"""
+    
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(CALIBRATION_PAGE)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(CALIBRATION_PAGE)
+    
+    def log_message(self, format, *args):
+        pass
+
+def calibrate_browsers(config, runs=3, settle=2.0, manager_class=None):
+    """校准本机已安装的浏览器（--calibrate）
+    
+    每个浏览器冷启动 runs 次打开本地测试页，测量从启动到就绪信号的耗时，
+    并在就绪 settle 秒后统计进程组的内存占用。结果写入 BROWSER_CALIBRATION，
+    供 fastest/leanest 策略使用。测量期间不接管也不写入正在使用的浏览器状态；
+    每个浏览器使用临时配置目录和空闲的 DevTools 端口，不会把测试页交给
+    正在运行的 kiosk 浏览器。
+    """
+    manager_class = manager_class or BrowserManager
+    page = ThreadingHTTPServer(('127.0.0.1', 0), _CalibrationPageHandler)
+    threading.Thread(target=page.serve_forever, daemon=True).start()
+    page_url = f'http://127.0.0.1:{page.server_address[1]}/'
+    probe = BrowserProbe(config.browser_probe_cache or None)
+    results = OrderedDict()
+    default_slot = config.slots[0] if config.slots else SlotConfig()
+    
+    try:
+        with tempfile.TemporaryDirectory(prefix='web-kiosk-calibrate-') as tmp:
+            for name, _ in BROWSERS:
+                path = probe.resolve(name)
+                if path is None:
+                    continue
+                trial = copy.copy(config)
+                trial.browser = name
+                trial.browser_overrides = []
+                trial.adopt_browser = False
+                trial.reuse_instance = False
+                trial.standby_mode = False
+                trial.cache_proxy = False
+                trial.ram_profile = False
+                trial.devtools_port = _free_port()
+                trial.pid_file = os.path.join(tmp, f'{name}.pid')
+                trial.state_file = os.path.join(tmp, f'{name}-state.json')
+                slot = SlotConfig(display=default_slot.display, geometry=default_slot.geometry,
+                                  profile_dir=os.path.join(tmp, f'{name}-profile'))
+                manager = manager_class(trial, slot=slot, probe=probe, calibration={})
+                results[name] = _calibrate_browser(manager, page_url, runs, settle)
+                results[name]['path'] = path
+                results[name]['version'] = manager.capabilities['version']
+    finally:
+        page.shutdown()
+        page.server_close()
+    
+    report = {
+        'host': socket.gethostname(),
+        'calibrated_at': datetime.now().isoformat(timespec='seconds'),
+        'runs': runs,
+        'settle_s': settle,
+        'browsers': results,
+    }
+    if config.browser_calibration:
+        os.makedirs(os.path.dirname(config.browser_calibration) or '.', exist_ok=True)
+        tmp_file = f'{config.browser_calibration}.{os.getpid()}.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_file, config.browser_calibration)
+    return report
+
+def _free_port():
+    """返回本机当前空闲的 TCP 端口"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def _calibrate_browser(manager, page_url, runs, settle):
+    """对单个浏览器执行 runs 次冷启动测量"""
+    ready = []
+    rss = []
+    signals = set()
+    error = None
+    for run in range(runs):
+        since = time.time()
+        start_time = time.monotonic()
+        try:
+            success, message = manager.open_url(f'{page_url}?run={run}')
+            if not success:
+                error = message
+                break
+            signal_name = ReadinessProbe(manager).wait(since, manager.config.browser_timeout)
+            if signal_name is None:
+                error = f"not ready within {manager.config.browser_timeout:g}s"
+                break
+            ready.append(time.monotonic() - start_time)
+            signals.add(signal_name)
+            time.sleep(settle)
+            rss.append(sample_process_group(manager.process.pgid)[0])
+        except RuntimeError as e:
+            error = str(e)
+            break
+        finally:
+            manager.close_browser()
     
+    result = {'samples': len(ready), 'signals': sorted(signals), 'error': error}
+    if ready:
+        ready.sort()
+        result['ready_ms'] = [round(value * 1000, 1) for value in ready]
+        result['ready_p50_ms'] = round(ready[len(ready) // 2] * 1000, 1)
+        result['rss_mb'] = round(sorted(rss)[len(rss) // 2] / (1024 * 1024), 1)
+    if error:
+        logging.warning(f"Calibration of {manager.browser_cmd} failed: {error}")
+    return result
+
+def parse_args(argv=None):
+    """解析命令行参数（服务配置仍通过环境变量和 .env 设置）"""
+    parser = argparse.ArgumentParser(description='Web Kiosk Launcher')
+    parser.add_argument('--probe-browser', action='store_true',
+                        help='探测已安装浏览器的版本和能力，以 JSON 输出耗时后退出')
+    parser.add_argument('--refresh-probe', action='store_true',
+                        help='忽略能力缓存重新探测（与 --probe-browser 一起使用）')
+    parser.add_argument('--calibrate', action='store_true',
+                        help='测量已安装浏览器的启动耗时和内存占用，供 BROWSER_POLICY 使用')
+    parser.add_argument('--runs', type=int, default=3, help='校准时每个浏览器的启动次数')
+    parser.add_argument('--settle', type=float, default=2.0,
+                        help='校准时就绪后等待多少秒再统计内存')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
     # 加载配置
     config = Config()
+    BOOT_TIMELINE.mark('config_loaded')
+    if args.probe_browser:
+        print(json.dumps(probe_browsers(config, args.refresh_probe), indent=2, ensure_ascii=False))
+        return
+    if args.calibrate:
+        logging.basicConfig(level=logging.INFO, format='%(levelname)s %(message)s', force=True)
+        report = calibrate_browsers(config, args.runs, args.settle)
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+    log_listener = setup_logging(config)
     
-    # 初始化浏览器管理器
-    browser_manager = BrowserManager(config)
+    # 为每个槽位初始化浏览器管理器
+    managers = create_browser_managers(config)
+    browser_manager = managers[0]
+    BOOT_TIMELINE.mark('browser_detected')
     
     if not browser_manager.browser_cmd:
         logging.error("No browser available. Please install chromium-browser, firefox, or another supported browser.")
+        log_listener.stop()
         sys.exit(1)
     
+    for manager in managers:
+        if manager.profiles:
+            manager.profiles.start()
+        # 启动资源看门狗
+        if config.watchdog_enabled:
+            BrowserWatchdog(manager, config).start()
+    if browser_manager.proxy:
+        browser_manager.proxy.start()
+    
+    # 开机快速路径：浏览器与HTTP服务器并行启动，不等待外部的 /open 请求
+    if config.autolaunch:
+        for manager in managers:
+            # 配置了播放列表的槽位直接打开第一项，播放列表随后复用该页面
+            url = playlist_start_url(config, manager.slot)
+            threading.Thread(target=autolaunch, args=(manager,), kwargs={'url': url}, daemon=True,
+                             name=f'autolaunch-{manager.slot.slot_id}').start()
+    
     # 创建HTTP服务器
-    class Handler(WebKioskHandler):
-        def __init__(self, *args, **kwargs):
-            super().__init__(*args, browser_manager=browser_manager, config=config, **kwargs)
+    server = create_server(config, browser_manager, managers=managers)
+    BOOT_TIMELINE.mark('server_listening')
+    
+    # 配置热加载：.env 变化或收到 SIGHUP 时重新加载
+    reloader = ConfigReloader(config, server.slots)
+    reloader.start()
+    signal.signal(signal.SIGHUP, lambda signum, frame: reloader.trigger())
     
-    server = HTTPServer((config.host, config.port), Handler)
+    # 播放列表轮播（未配置 PLAYLIST 时空闲，热加载设置后开始）
+    for slot in server.slots.values():
+        PlaylistScheduler(slot, config).start()
     
-    logging.info(f"Starting Web Kiosk Launcher on {config.host}:{config.port}")
+    logging.info(f"Starting Web Kiosk Launcher on {config.host}:{config.port} "
+                 f"(+{BOOT_TIMELINE.elapsed_ms('server_listening'):.0f}ms after process start)")
     logging.info(f"Default URL: {config.default_url}")
     logging.info(f"Browser: {browser_manager.browser_cmd}")
+    if len(managers) > 1:
+        logging.info(f"Slots: {', '.join(m.slot.slot_id for m in managers)}")
     
     try:
         server.serve_forever()
     except KeyboardInterrupt:
         logging.info("Shutting down server...")
         server.shutdown()
-        browser_manager.close_browser()
+        for manager in managers:
+            manager.close_browser()
+    finally:
+        log_listener.stop()
 
 if __name__ == '__main__':
     main()
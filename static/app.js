@@ -28,6 +28,45 @@ class WebKioskApp {
         
         // 显示初始状态
         this.showStatus('准备就绪', 'info');
+        
+        // 订阅浏览器状态推送
+        this.connectEvents();
+    }
+    
+    connectEvents() {
+        if (!window.EventSource) {
+            return;
+        }
+        
+        // EventSource 断线后会自动重连，重连时服务器会先推送当前状态
+        this.events = new EventSource('/events');
+        this.events.addEventListener('state', (e) => {
+            try {
+                this.handleState(JSON.parse(e.data));
+            } catch (error) {
+                console.error('状态事件解析失败:', error);
+            }
+        });
+    }
+    
+    handleState(data) {
+        switch (data.state) {
+            case 'launching':
+                this.showStatus(`正在打开: ${data.target}`, 'info');
+                break;
+            case 'ready':
+                this.showStatus(`当前页面: ${data.url}`, 'success');
+                break;
+            case 'crashed':
+                this.showStatus(`浏览器意外退出（退出码 ${data.returncode}）`, 'error');
+                break;
+            case 'failed':
+                this.showStatus(`打开失败: ${data.message}`, 'error');
+                break;
+            case 'closed':
+                this.showStatus('浏览器已关闭', 'info');
+                break;
+        }
     }
     
     async openUrl() {
@@ -6,11 +6,22 @@ Web Kiosk Launcher 测试脚本
 
 import os
 import sys
+import time
 import subprocess
 import tempfile
 import shutil
 from pathlib import Path
 
+# 测试中的 PID 文件和状态文件都放在这里，避免读取或删除正在运行的服务的文件
+TEST_STATE_DIR = tempfile.TemporaryDirectory(prefix='kiosk-test-')
+
+def _isolated_config(config):
+    """把配置的 PID 文件和状态文件指向独立的临时目录，返回该配置"""
+    state_dir = tempfile.mkdtemp(dir=TEST_STATE_DIR.name)
+    config.pid_file = os.path.join(state_dir, 'browser.pid')
+    config.state_file = os.path.join(state_dir, 'browser-state.json')
+    return config
+
 def test_imports():
     """测试导入"""
     print("测试导入...")
@@ -136,7 +147,7 @@ def test_url_validation():
         sys.path.insert(0, '.')
         from server import BrowserManager, Config
         
-        config = Config()
+        config = _isolated_config(Config())
         browser_manager = BrowserManager(config)
         
         # 测试有效URL
@@ -171,6 +182,2034 @@ def test_url_validation():
         print(f"✗ URL验证测试失败: {e}")
         return False
 
+def test_concurrent_requests():
+    """测试浏览器启动期间主页仍可访问"""
+    print("测试并发请求处理...")
+    try:
+        import http.client
+        sys.path.insert(0, '.')
+        from benchmark import SlowBrowserManager, start_server
+        from server import Config
+        
+        config = _isolated_config(Config())
+        config.host = '127.0.0.1'
+        manager = SlowBrowserManager(config, launch_delay=2.0)
+        server, port = start_server(manager, config)
+        
+        def slow_open():
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            conn.request('POST', '/open', body='url=https%3A%2F%2Fexample.org',
+                         headers={'Content-Type': 'application/x-www-form-urlencoded'})
+            conn.getresponse().read()
+            conn.close()
+        
+        import threading
+        opener = threading.Thread(target=slow_open)
+        opener.start()
+        time.sleep(0.2)
+        
+        start = time.time()
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        conn.request('GET', '/')
+        status = conn.getresponse().status
+        conn.close()
+        elapsed = time.time() - start
+        
+        opener.join()
+        server.shutdown()
+        server.server_close()
+        manager.close_browser()
+        
+        if status == 200 and elapsed < 1.0:
+            print(f"✓ 启动期间主页响应正常 ({elapsed * 1000:.1f}ms)")
+            return True
+        else:
+            print(f"✗ 主页响应被阻塞: status={status}, {elapsed:.2f}s")
+            return False
+        
+    except Exception as e:
+        print(f"✗ 并发测试失败: {e}")
+        return False
+
+def _start_fake_devtools():
+    """启动一个模拟 Chromium DevTools 端点的本地服务器，返回 (server, port, 收到的命令列表)"""
+    import json
+    import threading
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    sys.path.insert(0, '.')
+    from server import DevToolsError, _ws_recv, _ws_send
+    
+    commands = []
+    
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            port = self.server.server_address[1]
+            if self.path == '/json/version':
+                body = json.dumps({'Browser': 'FakeChromium/1.0',
+                                   'webSocketDebuggerUrl': f'ws://127.0.0.1:{port}/devtools/browser/0'})
+            elif self.path == '/json/list':
+                body = json.dumps([{'type': 'page', 'id': '1',
+                                    'webSocketDebuggerUrl': f'ws://127.0.0.1:{port}/devtools/page/1'}])
+            elif self.headers.get('Upgrade', '').lower() == 'websocket':
+                self.send_response(101)
+                self.send_header('Upgrade', 'websocket')
+                self.send_header('Connection', 'Upgrade')
+                self.end_headers()
+                self.wfile.flush()
+                self.close_connection = True
+                try:
+                    while True:
+                        message = json.loads(_ws_recv(self.connection))
+                        commands.append(message)
+                        _ws_send(self.connection, json.dumps({'id': message['id'],
+                                                              'result': {'frameId': '1', 'targetId': '2'}}),
+                                 mask=False)
+                except (DevToolsError, OSError):
+                    return
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body.encode('utf-8'))
+        
+        def log_message(self, format, *args):
+            pass
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_address[1], commands
+
+def test_devtools_navigation():
+    """测试通过 DevTools 原地导航"""
+    print("测试DevTools原地导航...")
+    try:
+        sys.path.insert(0, '.')
+        from server import BrowserManager, Config
+        
+        class FakeChromiumManager(BrowserManager):
+            def _detect_browser(self):
+                self.browser_cmd = 'chromium'
+                self.browser_args = ['--kiosk']
+            
+            def _get_browser_pid(self):
+                return os.getpid()
+        
+        fake, port, commands = _start_fake_devtools()
+        config = _isolated_config(Config())
+        config.devtools_navigation = True
+        config.devtools_port = port
+        manager = FakeChromiumManager(config)
+        
+        details = {}
+        success, message = manager.open_url('https://example.org/next', details)
+        fake.shutdown()
+        fake.server_close()
+        
+        if not (success and details.get('method') == 'navigate'):
+            print(f"✗ 未走原地导航: {message} {details}")
+            return False
+        if not commands or commands[0]['params'].get('url') != 'https://example.org/next':
+            print(f"✗ 导航命令不正确: {commands}")
+            return False
+        if f'--remote-debugging-port={port}' not in manager._launch_args():
+            print("✗ 启动参数缺少远程调试端口")
+            return False
+        
+        # 调试端点不可用时应回退到重启
+        if manager._navigate_in_place('https://example.org/other'):
+            print("✗ 调试端点不可用时未回退")
+            return False
+        
+        # pong 帧须原样带回 ping 的负载
+        import socket
+        from server import _ws_recv, _ws_send
+        client, peer = socket.socketpair()
+        peer.sendall(bytes([0x89, 4]) + b'beat')
+        _ws_send(peer, 'hello', mask=False)
+        message = _ws_recv(client)
+        header = peer.recv(2)
+        key = peer.recv(4)
+        pong = bytes(b ^ key[i % 4] for i, b in enumerate(peer.recv(header[1] & 0x7f)))
+        client.close()
+        peer.close()
+        if message != 'hello' or header[0] != 0x8a or pong != b'beat':
+            print(f"✗ pong 未带回 ping 负载: {header!r} {pong!r}")
+            return False
+        
+        print(f"✓ 原地导航正确 ({details['elapsed_ms']}ms)")
+        return True
+        
+    except Exception as e:
+        print(f"✗ DevTools导航测试失败: {e}")
+        return False
+
+def test_standby_swap():
+    """测试热备切换"""
+    print("测试热备切换...")
+    try:
+        sys.path.insert(0, '.')
+        from server import BrowserManager, Config, ProcessSupervisor, StandbyPool
+        
+        class ShellBrowserManager(BrowserManager):
+            def _detect_browser(self):
+                # URL 作为 $0 传入，进程持续运行以模拟浏览器
+                self.browser_cmd = 'sh'
+                self.browser_args = ['-c', 'sleep 30']
+            
+            def _check_display(self):
+                return True
+        
+        config = _isolated_config(Config())
+        config.standby_mode = True
+        config.standby_ready = 'delay:0.2'
+        config.devtools_navigation = False
+        manager = ShellBrowserManager(config)
+        
+        manager.open_url('https://example.org/a')
+        first_pid = manager.current_pid
+        details = {}
+        success, message = manager.open_url('https://example.org/b', details)
+        second_pid = manager.current_pid
+        manager.close_browser()
+        
+        if not (success and details.get('method') == 'standby'):
+            print(f"✗ 未走热备切换: {message} {details}")
+            return False
+        if second_pid == first_pid or manager.standby.has_capacity() is False:
+            print("✗ 热备进程状态不正确")
+            return False
+        
+        # Chromium 的第二个进程会并入已运行的实例，不能作为热备
+        manager.browser_cmd = 'chromium'
+        if manager._swap_via_standby('https://example.org/c'):
+            print("✗ Chromium 不应使用热备切换")
+            return False
+        
+        # 丢弃热备后，下一个热备仍不能使用前台浏览器的配置目录
+        pool = StandbyPool(ProcessSupervisor(), max_standby=1, name=f'test-{os.getpid()}')
+        foreground_args = pool.standby_args('firefox')
+        foreground = pool.spawn(['sh', '-c', 'sleep 30', 'firefox'] + foreground_args)
+        pool.release(foreground)
+        try:
+            standby_args = pool.standby_args('firefox', foreground)
+            discarded = pool.spawn(['sh', '-c', 'sleep 30', 'firefox'] + standby_args)
+            pool.discard(discarded)
+            next_args = pool.standby_args('firefox', foreground)
+        finally:
+            foreground.terminate(timeout=1)
+        if next_args == foreground_args:
+            print(f"✗ 热备复用了前台浏览器的配置目录: {next_args}")
+            return False
+        
+        # 热备窗口映射后立即隐藏，就绪并切换时才重新显示
+        with tempfile.TemporaryDirectory() as tmp:
+            xdotool_log = os.path.join(tmp, 'xdotool.log')
+            with open(os.path.join(tmp, 'xdotool'), 'w') as f:
+                f.write('#!/bin/sh\n'
+                        f'echo "$@" >> {xdotool_log}\n'
+                        '[ "$1" = search ] && echo 4242\n'
+                        'exit 0\n')
+            os.chmod(os.path.join(tmp, 'xdotool'), 0o755)
+            old_path = os.environ['PATH']
+            os.environ['PATH'] = tmp + os.pathsep + old_path
+            try:
+                pool = StandbyPool(ProcessSupervisor(), ready_spec='window', ready_timeout=3)
+                process = pool.spawn(['sleep', '30'])
+                ready, window_id = pool.wait_ready(process)
+                with open(xdotool_log) as f:
+                    before = f.read().splitlines()
+                pool.show(process)
+                pool.discard(process)
+            finally:
+                os.environ['PATH'] = old_path
+            with open(xdotool_log) as f:
+                after = f.read().splitlines()[len(before):]
+        if not ready or window_id != '4242' or 'windowunmap 4242' not in before:
+            print(f"✗ 热备窗口未在映射后隐藏: {ready} {window_id} {before}")
+            return False
+        if any(line.startswith(('windowmap', 'windowactivate')) for line in before):
+            print(f"✗ 热备窗口在就绪前被显示: {before}")
+            return False
+        if 'windowmap 4242' not in after or 'windowactivate 4242' not in after:
+            print(f"✗ 切换时未重新显示热备窗口: {after}")
+            return False
+        
+        print("✓ 热备切换正确")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 热备切换测试失败: {e}")
+        return False
+
+def test_process_supervisor():
+    """测试浏览器进程监管"""
+    print("测试进程监管...")
+    try:
+        sys.path.insert(0, '.')
+        from server import ProcessSupervisor
+        
+        supervisor = ProcessSupervisor()
+        
+        # 进程退出应被主动通知
+        exited = []
+        quick = supervisor.spawn(['true'], on_exit=exited.append)
+        if not quick.wait(2) or exited != [quick] or quick.returncode != 0:
+            print("✗ 未收到进程退出通知")
+            return False
+        
+        # 关闭时应回收整个进程组（包括子进程）
+        group = supervisor.spawn(['sh', '-c', 'sleep 30 & wait'])
+        time.sleep(0.2)
+        result = group.terminate(timeout=2)
+        def group_members(pgid):
+            # 忽略僵尸进程（由 init 回收）
+            members = []
+            for entry in Path('/proc').iterdir():
+                try:
+                    fields = (entry / 'stat').read_text().rsplit(')', 1)[1].split()
+                except (OSError, IndexError):
+                    continue
+                if int(fields[2]) == pgid and fields[0] != 'Z':
+                    members.append(entry.name)
+            return members
+        
+        for _ in range(20):
+            if not group_members(group.pgid):
+                break
+            time.sleep(0.05)
+        else:
+            print("✗ 进程组中仍有残留进程")
+            return False
+        if result['forced'] or result['latency_ms'] > 1000:
+            print(f"✗ 正常退出的进程被强制结束: {result}")
+            return False
+        
+        # 忽略 SIGTERM 的进程应在超时后被强制结束
+        stubborn = supervisor.spawn(['sh', '-c', 'trap "" TERM; sleep 30'])
+        time.sleep(0.2)
+        result = stubborn.terminate(timeout=0.3)
+        if not result['forced'] or stubborn.is_alive():
+            print(f"✗ 未强制结束忽略SIGTERM的进程: {result}")
+            return False
+        
+        print("✓ 进程监管正确")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 进程监管测试失败: {e}")
+        return False
+
+def test_display_monitor():
+    """测试X显示可用性缓存"""
+    print("测试显示监视器...")
+    try:
+        import socket
+        sys.path.insert(0, '.')
+        from server import DisplayMonitor
+        
+        socket_dir = tempfile.mkdtemp()
+        socket_path = os.path.join(socket_dir, 'X7')
+        
+        def start_fake_x():
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            server.bind(socket_path)
+            server.listen(5)
+            return server
+        
+        monitor = DisplayMonitor(display=':7', socket_dir=socket_dir)
+        if monitor.is_available():
+            print("✗ 无X服务器时误判为可用")
+            return False
+        
+        fake_x = start_fake_x()
+        if not monitor.is_available():
+            print("✗ X套接字出现后未重新探测")
+            return False
+        
+        # 缓存命中时不应再建立新连接
+        conn, _ = fake_x.accept()
+        fake_x.settimeout(0.2)
+        monitor.is_available()
+        try:
+            fake_x.accept()
+            print("✗ 缓存未生效")
+            return False
+        except socket.timeout:
+            pass
+        
+        # X服务器退出后应失效
+        conn.close()
+        fake_x.close()
+        os.unlink(socket_path)
+        if monitor.is_available():
+            print("✗ X服务器退出后仍判为可用")
+            return False
+        
+        # PrivateTmp=true 时套接字文件不可见，只能经由抽象命名空间连接
+        if sys.platform.startswith('linux'):
+            abstract_x = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            abstract_x.bind('\0' + socket_path)
+            abstract_x.listen(5)
+            monitor.invalidate()
+            available = monitor.is_available()
+            abstract_x.close()
+            if os.path.exists(socket_path) or not available:
+                print("✗ 套接字文件缺失时未回退到抽象套接字")
+                return False
+        
+        shutil.rmtree(socket_dir)
+        print("✓ 显示监视器正确")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 显示监视器测试失败: {e}")
+        return False
+
+def test_allow_list_index():
+    """测试白名单索引"""
+    print("测试白名单索引...")
+    try:
+        sys.path.insert(0, '.')
+        from server import AllowListIndex
+        
+        index = AllowListIndex(['example.com', '*.cdn.net', 'intranet.local:8080',
+                                'https://secure.org', 'dash.io/team', '10.0.0.5'])
+        cases = [
+            ('https://example.com/', True),
+            ('https://www.example.com/page', True),
+            ('https://evilexample.com/', False),
+            ('https://example.com.evil.org/', False),
+            ('https://cdn.net/', False),
+            ('https://img.cdn.net/a.png', True),
+            ('http://intranet.local:8080/', True),
+            ('http://intranet.local/', False),
+            ('https://secure.org/', True),
+            ('http://secure.org/', False),
+            ('https://dash.io/team/board', True),
+            ('https://dash.io/teamwork', False),
+            ('https://dash.io/', False),
+            ('http://10.0.0.5/', True),
+            ('http://1.10.0.0.5/', False),
+        ]
+        for url, expected in cases:
+            if index.allows(url) != expected:
+                print(f"✗ 白名单匹配错误: {url} 期望 {expected}")
+                return False
+        
+        print("✓ 白名单索引正确")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 白名单索引测试失败: {e}")
+        return False
+
+def test_static_assets():
+    """测试静态资源缓存、ETag 和 gzip"""
+    print("测试静态资源缓存...")
+    try:
+        import gzip
+        import http.client
+        sys.path.insert(0, '.')
+        from benchmark import SlowBrowserManager, start_server
+        from server import Config
+        
+        config = _isolated_config(Config())
+        config.host = '127.0.0.1'
+        server, port = start_server(SlowBrowserManager(config), config)
+        
+        def get(path, headers=None):
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', path, headers=headers or {})
+            response = conn.getresponse()
+            body = response.read()
+            conn.close()
+            return response, body
+        
+        try:
+            response, body = get('/static/style.css', {'Accept-Encoding': 'gzip'})
+            etag = response.getheader('ETag')
+            if (response.status != 200 or response.getheader('Content-Encoding') != 'gzip' or
+                    int(response.getheader('Content-Length')) != len(body) or
+                    gzip.decompress(body) != Path('static/style.css').read_bytes()):
+                print("✗ gzip 响应不正确")
+                return False
+            
+            response, body = get('/static/style.css', {'If-None-Match': etag})
+            if response.status != 304 or body:
+                print(f"✗ 条件请求未返回304: {response.status}")
+                return False
+            
+            response, _ = get('/static/../server.py')
+            if response.status != 404:
+                print("✗ 允许访问 static 目录之外的文件")
+                return False
+            
+            response, _ = get('/?from=test')
+            if response.status != 200 or not response.getheader('ETag'):
+                print("✗ 主页响应不正确")
+                return False
+        finally:
+            server.shutdown()
+            server.server_close()
+        
+        print("✓ 静态资源缓存正确")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 静态资源测试失败: {e}")
+        return False
+
+def test_keepalive_json_api():
+    """测试持久连接上的 JSON 接口"""
+    print("测试JSON接口和持久连接...")
+    try:
+        import json
+        import http.client
+        sys.path.insert(0, '.')
+        from benchmark import SlowBrowserManager, start_server
+        from server import Config
+        
+        config = _isolated_config(Config())
+        config.host = '127.0.0.1'
+        manager = SlowBrowserManager(config, launch_delay=0)
+        server, port = start_server(manager, config)
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+        
+        def call(method, path, payload=None, raw=None):
+            body = raw if raw is not None else (json.dumps(payload) if payload is not None else None)
+            conn.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            return response.status, json.loads(response.read())
+        
+        try:
+            conn.connect()
+            sock = conn.sock
+            status, data = call('POST', '/api/v1/open', {'url': 'https://example.org/json'})
+            if status != 200 or not data['ok']:
+                print(f"✗ JSON打开失败: {data}")
+                return False
+            
+            status, data = call('GET', '/api/v1/status')
+            if not data['running'] or data['url'] != 'https://example.org/json':
+                print(f"✗ 状态不正确: {data}")
+                return False
+            
+            status, data = call('POST', '/api/v1/open', raw='not json')
+            if status != 400 or data['ok']:
+                print(f"✗ 非法JSON未返回400: {status}")
+                return False
+            
+            status, data = call('POST', '/api/v1/close', {})
+            if not data['ok']:
+                print(f"✗ JSON关闭失败: {data}")
+                return False
+            
+            if conn.sock is not sock:
+                print("✗ 连接未被复用")
+                return False
+            
+            # 负数 Content-Length 立即返回 400，不会阻塞处理线程
+            negative = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            negative.putrequest('POST', '/api/v1/close')
+            negative.putheader('Content-Length', '-1')
+            negative.endheaders()
+            response = negative.getresponse()
+            negative.close()
+            if response.status != 400:
+                print(f"✗ 负数 Content-Length 状态码错误: {response.status}")
+                return False
+        finally:
+            conn.close()
+            server.shutdown()
+            server.server_close()
+            manager.close_browser()
+        
+        print("✓ JSON接口和持久连接正确")
+        return True
+        
+    except Exception as e:
+        print(f"✗ JSON接口测试失败: {e}")
+        return False
+
+def test_launch_coalescing():
+    """测试突发打开请求的合并"""
+    print("测试启动请求合并...")
+    try:
+        import threading
+        sys.path.insert(0, '.')
+        from benchmark import SlowBrowserManager
+        from server import Config, LaunchScheduler
+        
+        class CountingManager(SlowBrowserManager):
+            spawned = []
+            
+            def _spawn_browser(self, cmd):
+                self.spawned.append(cmd[-1])
+                return super()._spawn_browser(cmd)
+        
+        config = _isolated_config(Config())
+        config.devtools_navigation = False
+        manager = CountingManager(config, launch_delay=0.3)
+        scheduler = LaunchScheduler(manager, max_pending=32)
+        
+        results = {}
+        
+        def request(n):
+            details = {}
+            results[n] = (scheduler.open(f'https://example.org/{n}', details), details)
+        
+        threads = []
+        for n in range(10):
+            t = threading.Thread(target=request, args=(n,))
+            t.start()
+            threads.append(t)
+            time.sleep(0.02)
+        for t in threads:
+            t.join(10)
+        manager.close_browser()
+        
+        if manager.spawned != ['https://example.org/9']:
+            print(f"✗ 执行了多余的启动: {manager.spawned}")
+            return False
+        for n, ((success, _), details) in results.items():
+            if not success or details.get('url') != 'https://example.org/9':
+                print(f"✗ 请求 {n} 未获得最终结果: {details}")
+                return False
+        
+        print("✓ 启动请求合并正确")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 启动请求合并测试失败: {e}")
+        return False
+
+def test_metrics_endpoint():
+    """测试 /metrics 指标输出"""
+    print("测试指标接口...")
+    try:
+        import http.client
+        sys.path.insert(0, '.')
+        from benchmark import SlowBrowserManager, start_server
+        from server import Config, REUSE_HITS, BROWSER_CRASHES, OPEN_PHASE_SECONDS
+        
+        config = _isolated_config(Config())
+        config.host = '127.0.0.1'
+        config.devtools_navigation = False
+        manager = SlowBrowserManager(config, launch_delay=0)
+        server, port = start_server(manager, config)
+        reuse_before = REUSE_HITS.value()
+        crashes_before = BROWSER_CRASHES.value()
+        spawn_before = OPEN_PHASE_SECONDS.count(phase='spawn')
+        
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            for _ in range(2):
+                conn.request('POST', '/open', body='url=https%3A%2F%2Fexample.org%2Fm',
+                             headers={'Content-Type': 'application/x-www-form-urlencoded'})
+                conn.getresponse().read()
+            
+            # 浏览器意外退出应计入崩溃次数
+            os.killpg(manager.process.pgid, 9)
+            manager.process.wait(2)
+            time.sleep(0.05)
+            
+            conn.request('GET', '/metrics')
+            response = conn.getresponse()
+            text = response.read().decode('utf-8')
+            conn.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+            manager.close_browser()
+        
+        if REUSE_HITS.value() != reuse_before + 1:
+            print("✗ 复用计数不正确")
+            return False
+        if BROWSER_CRASHES.value() != crashes_before + 1:
+            print("✗ 崩溃计数不正确")
+            return False
+        if OPEN_PHASE_SECONDS.count(phase='spawn') != spawn_before + 1:
+            print("✗ 启动阶段耗时未记录")
+            return False
+        if 'kiosk_http_request_seconds_count{endpoint="/open"}' not in text:
+            print("✗ 缺少HTTP延迟直方图")
+            return False
+        
+        print("✓ 指标接口正确")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 指标接口测试失败: {e}")
+        return False
+
+def test_event_stream():
+    """测试 /events 状态推送"""
+    print("测试事件流...")
+    try:
+        import json
+        import socket
+        import http.client
+        sys.path.insert(0, '.')
+        from benchmark import SlowBrowserManager, start_server
+        from server import Config
+        
+        config = _isolated_config(Config())
+        config.host = '127.0.0.1'
+        config.devtools_navigation = False
+        manager = SlowBrowserManager(config, launch_delay=0)
+        server, port = start_server(manager, config)
+        
+        stream = socket.create_connection(('127.0.0.1', port), timeout=5)
+        stream.sendall(b'GET /events HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        buffer = b''
+        
+        def next_state():
+            nonlocal buffer
+            while b'\n\n' not in buffer.split(b'\r\n\r\n', 1)[-1]:
+                buffer += stream.recv(4096)
+            head, _, rest = buffer.partition(b'\r\n\r\n')
+            message, _, rest = rest.partition(b'\n\n')
+            buffer = head + b'\r\n\r\n' + rest
+            data = message.decode('utf-8').split('data: ', 1)[1]
+            return json.loads(data)['state']
+        
+        try:
+            states = [next_state()]
+            for _ in range(20):
+                if manager.events.subscriber_count():
+                    break
+                time.sleep(0.05)
+            
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('POST', '/open', body='url=https%3A%2F%2Fexample.org%2Fsse',
+                         headers={'Content-Type': 'application/x-www-form-urlencoded'})
+            conn.getresponse().read()
+            conn.request('POST', '/close')
+            conn.getresponse().read()
+            conn.close()
+            states += [next_state() for _ in range(3)]
+        finally:
+            stream.close()
+            server.shutdown()
+            server.server_close()
+            manager.close_browser()
+        
+        if states != ['closed', 'launching', 'ready', 'closed']:
+            print(f"✗ 事件序列不正确: {states}")
+            return False
+        
+        # 文件描述符超过 1024 的订阅者（select() 无法处理）也能收到事件
+        import resource
+        from server import EventBroadcaster
+        if resource.getrlimit(resource.RLIMIT_NOFILE)[0] > 1100:
+            broadcaster = EventBroadcaster()
+            local, remote = socket.socketpair()
+            high = socket.socket(fileno=os.dup2(local.fileno(), 1100))
+            local.close()
+            remote.settimeout(2)
+            try:
+                broadcaster.subscribe(high)
+                broadcaster.publish('state', {'state': 'ready'})
+                received = remote.recv(4096)
+            finally:
+                remote.close()
+            for _ in range(20):
+                if not broadcaster.subscriber_count():
+                    break
+                time.sleep(0.05)
+            if b'event: state' not in received or broadcaster.subscriber_count():
+                print(f"✗ 高编号文件描述符的订阅者处理错误: {received!r}")
+                return False
+        
+        print("✓ 事件流正确")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 事件流测试失败: {e}")
+        return False
+
+def test_async_launch_jobs():
+    """测试异步启动任务和就绪检测"""
+    print("测试异步启动任务...")
+    try:
+        import json
+        import socket
+        import http.client
+        sys.path.insert(0, '.')
+        from benchmark import SlowBrowserManager, start_server
+        from server import Config, JobManager
+        
+        config = _isolated_config(Config())
+        config.host = '127.0.0.1'
+        config.devtools_navigation = False
+        manager = SlowBrowserManager(config, launch_delay=0.2)
+        server, port = start_server(manager, config)
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        
+        def call(method, path, payload=None):
+            conn.request(method, path, body=json.dumps(payload) if payload else None,
+                         headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            return response.status, json.loads(response.read())
+        
+        try:
+            status, data = call('POST', '/api/v1/open',
+                                {'url': 'https://example.org/job', 'async': True})
+            if status != 202 or not data.get('job'):
+                print(f"✗ 未立即返回任务ID: {status} {data}")
+                return False
+            
+            status, data = call('GET', data['status_url'] + '?wait=5')
+            if data['status'] != 'ready' or data['time_to_ready_ms'] is None:
+                print(f"✗ 任务未就绪: {data}")
+                return False
+            
+            status, data = call('GET', '/api/v1/jobs')
+            if data['ready_stats'].get('https://example.org/job', {}).get('count') != 1:
+                print(f"✗ 就绪耗时统计不正确: {data['ready_stats']}")
+                return False
+        finally:
+            conn.close()
+            server.shutdown()
+            server.server_close()
+            manager.close_browser()
+        
+        # 无就绪信号的启动应超时
+        class UnresponsiveChromium(SlowBrowserManager):
+            def supports_devtools(self):
+                return True
+        
+        probe = socket.socket()
+        probe.bind(('127.0.0.1', 0))
+        config.devtools_port = probe.getsockname()[1]
+        probe.close()
+        manager = UnresponsiveChromium(config, launch_delay=0)
+        jobs = JobManager(manager, None, timeout=0.5)
+        job = jobs.submit('https://example.org/slow')
+        job.wait(5)
+        manager.close_browser()
+        if job.status != 'timeout':
+            print(f"✗ 慢启动未超时: {job.to_dict()}")
+            return False
+        
+        print("✓ 异步启动任务正确")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 异步启动任务测试失败: {e}")
+        return False
+
+def test_browser_watchdog():
+    """测试资源看门狗回收和崩溃退避重启"""
+    print("测试资源看门狗...")
+    try:
+        import signal
+        sys.path.insert(0, '.')
+        from benchmark import SlowBrowserManager
+        from server import Config, BrowserWatchdog
+        
+        config = _isolated_config(Config())
+        config.devtools_navigation = False
+        config.watchdog_max_rss_mb = 0.001
+        config.crash_backoff_base = 0.2
+        manager = SlowBrowserManager(config, launch_delay=0)
+        watchdog = BrowserWatchdog(manager, config)
+        manager.watchdog = watchdog
+        
+        def wait_for_state(state):
+            deadline = time.time() + 5
+            while manager.state != state and time.time() < deadline:
+                time.sleep(0.02)
+            return manager.state == state
+        
+        try:
+            manager.open_url('https://example.org/watch')
+            first_pid = manager.process.pid
+            
+            # 内存超限应重启并重新打开相同URL
+            watchdog.check()
+            if manager.process.pid == first_pid or manager.current_url != 'https://example.org/watch':
+                print(f"✗ 内存超限未回收: {watchdog.summary()}")
+                return False
+            if watchdog.events[-1]['reason'] != 'memory':
+                print(f"✗ 回收事件未记录: {list(watchdog.events)}")
+                return False
+            
+            # 崩溃后立即重启
+            config.watchdog_max_rss_mb = 0
+            os.killpg(manager.process.pgid, signal.SIGKILL)
+            if not wait_for_state('crashed'):
+                print("✗ 未检测到崩溃")
+                return False
+            crashed_pid = manager.process.pid
+            watchdog.check()
+            if manager.process.pid == crashed_pid or not manager.process.is_alive():
+                print("✗ 崩溃后未重启")
+                return False
+            
+            # 连续崩溃应按退避延迟重启
+            os.killpg(manager.process.pgid, signal.SIGKILL)
+            wait_for_state('crashed')
+            crashed_pid = manager.process.pid
+            watchdog.check()
+            if manager.process.pid != crashed_pid or watchdog.next_restart_at is None:
+                print("✗ 连续崩溃未退避")
+                return False
+            time.sleep(0.3)
+            watchdog.check()
+            if manager.process.pid == crashed_pid or watchdog.consecutive_crashes != 2:
+                print(f"✗ 退避后未重启: {watchdog.summary()}")
+                return False
+        finally:
+            manager.close_browser()
+        
+        # 计划回收窗口可跨午夜
+        from datetime import datetime
+        config.recycle_window = '23:30-01:00'
+        if not (watchdog._in_recycle_window(datetime(2024, 1, 1, 0, 30)) and
+                not watchdog._in_recycle_window(datetime(2024, 1, 1, 12, 0))):
+            print("✗ 回收时间窗口判断错误")
+            return False
+        
+        print("✓ 资源看门狗正确")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 资源看门狗测试失败: {e}")
+        return False
+
+def test_ram_profile():
+    """测试内存配置目录的快照填充和状态回写"""
+    print("测试内存配置目录...")
+    try:
+        import tempfile
+        from pathlib import Path
+        sys.path.insert(0, '.')
+        from benchmark import SlowBrowserManager
+        from server import Config, ProfileManager, ProcessSupervisor
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            snapshot = tmp / 'snapshot'
+            profiles = ProfileManager(tmp / 'ram', snapshot)
+            
+            # 无快照时从空目录启动，首次同步生成不含缓存的快照
+            args = profiles.args('chromium')
+            profile_dir = tmp / 'ram' / 'main'
+            if args != [f'--user-data-dir={profile_dir}']:
+                print(f"✗ 配置目录参数不正确: {args}")
+                return False
+            (profile_dir / 'Default' / 'Cache').mkdir(parents=True)
+            (profile_dir / 'Default' / 'Preferences').write_text('warm')
+            (profile_dir / 'Default' / 'Cookies').write_text('a')
+            profiles.sync()
+            if (not (snapshot / 'Default' / 'Preferences').exists() or
+                    (snapshot / 'Default' / 'Cache').exists()):
+                print("✗ 快照生成不正确")
+                return False
+            
+            # 重新启动时先回写状态，再用快照重新填充
+            (profile_dir / 'Default' / 'Cookies').write_text('b')
+            (profile_dir / 'Default' / 'History').write_text('discard')
+            profiles.args('chromium')
+            if ((profile_dir / 'Default' / 'Cookies').read_text() != 'b' or
+                    (profile_dir / 'Default' / 'History').exists()):
+                print("✗ 状态回写或重新填充不正确")
+                return False
+            
+            if profiles.args('surf') != []:
+                print("✗ 不支持的浏览器不应附加参数")
+                return False
+            
+            # 仍在运行的浏览器使用的配置目录不会被重新填充
+            live = ProcessSupervisor().spawn(['sh', '-c', 'sleep 30', 'chromium'] + args)
+            try:
+                profiles.args('chromium', busy=[live])
+                print("✗ 运行中浏览器的配置目录被重新填充")
+                return False
+            except RuntimeError:
+                pass
+            finally:
+                live.terminate(timeout=1)
+            if (profile_dir / 'Default' / 'Cookies').read_text() != 'b':
+                print("✗ 运行中浏览器的配置目录被修改")
+                return False
+            
+            # 启用后自动附加到浏览器参数
+            config = _isolated_config(Config())
+            config.ram_profile = True
+            config.ram_profile_dir = str(tmp / 'ram2')
+            config.profile_snapshot = str(snapshot)
+            manager = SlowBrowserManager(config, launch_delay=0)
+            manager.browser_cmd = 'firefox'
+            args = manager._launch_args()
+            if args[-3:] != ['--no-remote', '--profile', str(tmp / 'ram2' / 'main')]:
+                print(f"✗ 浏览器参数未组合配置目录: {args}")
+                return False
+            if not (tmp / 'ram2' / 'main' / 'Default' / 'Preferences').exists():
+                print("✗ 配置目录未从快照填充")
+                return False
+        
+        print("✓ 内存配置目录正确")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 内存配置目录测试失败: {e}")
+        return False
+
+def test_caching_proxy():
+    """测试缓存代理的命中、重新验证、过期兜底和LRU淘汰"""
+    print("测试缓存代理...")
+    try:
+        import tempfile
+        import threading
+        import http.client
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+        sys.path.insert(0, '.')
+        from server import CachingProxy, ProxyCache, PROXY_REQUESTS
+        
+        hits = {}
+        broken = threading.Event()
+        stream_read = threading.Event()
+        
+        class Origin(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def do_GET(self):
+                hits[self.path] = hits.get(self.path, 0) + 1
+                if self.path == '/stream':
+                    # 类似 SSE：第一段数据被客户端读到之前不发送后续数据
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/event-stream')
+                    self.send_header('Transfer-Encoding', 'chunked')
+                    self.end_headers()
+                    self.wfile.write(b'8\r\ndata: 1\n\r\n')
+                    self.wfile.flush()
+                    stream_read.wait(5)
+                    self.wfile.write(b'8\r\ndata: 2\n\r\n0\r\n\r\n')
+                    return
+                if broken.is_set():
+                    self.send_response(503)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                if self.path == '/etag' and self.headers.get('If-None-Match') == '"v1"':
+                    self.send_response(304)
+                    self.send_header('ETag', '"v1"')
+                    self.end_headers()
+                    return
+                body = f'{self.path} #{hits[self.path]}'.encode()
+                self.send_response(200)
+                cache_control = {'/fresh': 'max-age=60', '/etag': 'no-cache',
+                                 '/nostore': 'no-store'}[self.path]
+                self.send_header('Cache-Control', cache_control)
+                self.send_header('ETag', '"v1"')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, *args):
+                pass
+        
+        origin = ThreadingHTTPServer(('127.0.0.1', 0), Origin)
+        threading.Thread(target=origin.serve_forever, daemon=True).start()
+        base = f'http://127.0.0.1:{origin.server_address[1]}'
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            proxy = CachingProxy(tmp, 1024 * 1024, origin_timeout=2)
+            proxy.start()
+            conn = http.client.HTTPConnection('127.0.0.1', proxy.port, timeout=5)
+            
+            def fetch(path, origin_base=base):
+                conn.request('GET', origin_base + path)
+                response = conn.getresponse()
+                return response.getheader('X-Cache'), response.read().decode()
+            
+            hit_before = PROXY_REQUESTS.value(result='hit')
+            try:
+                results = [fetch('/fresh'), fetch('/fresh')]
+                if results[1] != ('HIT', '/fresh #1') or hits['/fresh'] != 1:
+                    print(f"✗ 新鲜响应未命中缓存: {results}")
+                    return False
+                
+                results = [fetch('/etag'), fetch('/etag')]
+                if results[1] != ('REVALIDATED', '/etag #1'):
+                    print(f"✗ 未通过 ETag 重新验证: {results}")
+                    return False
+                
+                fetch('/nostore')
+                if fetch('/nostore')[0] != 'MISS':
+                    print("✗ no-store 响应不应缓存")
+                    return False
+                
+                # 源站故障时返回过期缓存
+                broken.set()
+                result = fetch('/etag')
+                if result != ('STALE', '/etag #1'):
+                    print(f"✗ 源站故障时未返回过期缓存: {result}")
+                    return False
+                
+                # 源站不可达且无缓存时返回 502
+                import socket
+                closed = socket.socket()
+                closed.bind(('127.0.0.1', 0))
+                closed_port = closed.getsockname()[1]
+                closed.close()
+                conn.request('GET', f'http://127.0.0.1:{closed_port}/missing')
+                response = conn.getresponse()
+                response.read()
+                if response.status != 502:
+                    print(f"✗ 源站不可达时状态码错误: {response.status}")
+                    return False
+                
+                # 流式响应边读边转发，不等源站发完
+                conn.request('GET', base + '/stream')
+                response = conn.getresponse()
+                first = response.read1(64)
+                stream_read.set()
+                rest = response.read()
+                if first != b'data: 1\n' or rest != b'data: 2\n':
+                    print(f"✗ 流式响应未及时转发: {first!r} {rest!r}")
+                    return False
+                
+                # 分块编码的请求体应完整转发
+                conn.request('POST', base + '/echo', body=iter([b'ab', b'cd']),
+                             headers={'Transfer-Encoding': 'chunked'}, encode_chunked=True)
+                response = conn.getresponse()
+                echoed = response.read()
+                if response.status != 200 or echoed != b'abcd':
+                    print(f"✗ 分块请求体转发错误: {response.status} {echoed!r}")
+                    return False
+                
+                # Content-Length 格式错误时返回 400，而不是断开连接
+                bad = http.client.HTTPConnection('127.0.0.1', proxy.port, timeout=5)
+                bad.putrequest('POST', base + '/fresh', skip_accept_encoding=True)
+                bad.putheader('Content-Length', 'abc')
+                bad.endheaders()
+                response = bad.getresponse()
+                bad.close()
+                if response.status != 400:
+                    print(f"✗ 错误的 Content-Length 状态码错误: {response.status}")
+                    return False
+                if PROXY_REQUESTS.value(result='hit') - hit_before != 1:
+                    print("✗ 命中计数不正确")
+                    return False
+            finally:
+                conn.close()
+                proxy.stop()
+                origin.shutdown()
+                origin.server_close()
+            
+            # 超出容量时淘汰最久未使用的条目，重启后保留索引
+            cache = ProxyCache(f'{tmp}/lru', 100)
+            cache.put('http://a/', 200, [], b'a' * 40, 0)
+            cache.put('http://b/', 200, [], b'b' * 40, 0)
+            cache.get('http://a/')
+            cache.put('http://c/', 200, [], b'c' * 40, 0)
+            reloaded = ProxyCache(f'{tmp}/lru', 100)
+            if (cache.get('http://b/')[0] is not None or reloaded.get('http://a/')[1] != b'a' * 40
+                    or reloaded.total_bytes != 80):
+                print("✗ LRU 淘汰不正确")
+                return False
+        
+        print("✓ 缓存代理正确")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 缓存代理测试失败: {e}")
+        return False
+
+def test_browser_slots():
+    """测试多槽位浏览器管理"""
+    print("测试多槽位管理...")
+    try:
+        import json
+        import tempfile
+        import threading
+        import http.client
+        sys.path.insert(0, '.')
+        from benchmark import SlowBrowserManager
+        from server import Config, METRICS, PID_FILE, create_browser_managers, create_server
+        
+        os.environ.update({'SLOTS': 'left,right', 'SLOT_LEFT_DISPLAY': ':5',
+                           'SLOT_LEFT_GEOMETRY': '1920x1080+0+0',
+                           'SLOT_RIGHT_DISPLAY': ':6', 'SLOT_RIGHT_URL': 'https://example.org/r'})
+        try:
+            config = _isolated_config(Config())
+        finally:
+            for key in ('SLOTS', 'SLOT_LEFT_DISPLAY', 'SLOT_LEFT_GEOMETRY',
+                        'SLOT_RIGHT_DISPLAY', 'SLOT_RIGHT_URL'):
+                del os.environ[key]
+        left, right = config.slots
+        if left.geometry != (1920, 1080, 0, 0) or right.url != 'https://example.org/r':
+            print(f"✗ 槽位配置解析错误: {left.to_dict()} {right.to_dict()}")
+            return False
+        
+        config.host = '127.0.0.1'
+        config.port = 0
+        config.devtools_navigation = False
+        managers = create_browser_managers(config, SlowBrowserManager, launch_delay=0.5)
+        if len({m.pid_file for m in managers} | {PID_FILE}) != 3:
+            print("✗ 槽位未使用独立的PID文件")
+            return False
+        if managers[1]._browser_env().get('DISPLAY') != ':6':
+            print("✗ 槽位未设置 DISPLAY")
+            return False
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            left.profile_dir = tmp
+            managers[0].browser_cmd = 'chromium'
+            args = managers[0]._launch_args()
+            managers[0]._detect_browser()
+            if (f'--user-data-dir={tmp}' not in args or '--window-position=0,0' not in args
+                    or '--window-size=1920,1080' not in args):
+                print(f"✗ 槽位启动参数不正确: {args}")
+                return False
+        
+        server = create_server(config, managers[0], managers=managers)
+        port = server.server_address[1]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        
+        def call(method, path, payload=None):
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            conn.request(method, path, body=json.dumps(payload) if payload else None,
+                         headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            data = json.loads(response.read())
+            conn.close()
+            return response.status, data
+        
+        try:
+            # 不同槽位的启动并行进行
+            results = {}
+            start = time.time()
+            threads = [threading.Thread(target=lambda s=slot: results.update(
+                {s: call('POST', f'/api/v1/slots/{s}/open', {'url': f'https://example.org/{s}'})}))
+                for slot in ('left', 'right')]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.time() - start
+            if not all(data['ok'] for _, data in results.values()) or elapsed > 0.9:
+                print(f"✗ 槽位未并行启动（耗时 {elapsed:.2f}s）: {results}")
+                return False
+            
+            status, data = call('GET', '/api/v1/slots')
+            urls = {slot['id']: slot['url'] for slot in data['slots']}
+            if urls != {'left': 'https://example.org/left', 'right': 'https://example.org/right'}:
+                print(f"✗ 槽位状态不正确: {data}")
+                return False
+            
+            # 旧接口通过 slot 参数指定槽位，默认操作第一个槽位
+            status, data = call('POST', '/api/v1/close', {'slot': 'right'})
+            if not data['ok'] or managers[1]._get_browser_pid() or not managers[0]._get_browser_pid():
+                print(f"✗ 按 slot 参数关闭失败: {data}")
+                return False
+            status, data = call('GET', '/status')
+            if data['slot'] != 'left' or not data['running']:
+                print(f"✗ 默认槽位状态不正确: {data}")
+                return False
+            
+            status, _ = call('GET', '/api/v1/slots/missing/status')
+            if status != 404:
+                print(f"✗ 未知槽位应返回 404: {status}")
+                return False
+            
+            # 未知槽位的任意路径不应产生新的指标序列
+            status, _ = call('GET', '/bogus-path?slot=missing')
+            if status != 404 or '/bogus-path' in METRICS.render():
+                print("✗ 未知槽位的请求路径被用作指标标签")
+                return False
+        finally:
+            server.shutdown()
+            server.server_close()
+            for manager in managers:
+                manager.close_browser()
+        
+        print("✓ 多槽位管理正确")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 多槽位管理测试失败: {e}")
+        return False
+
+def test_fleet_controller():
+    """测试批量控制工具的并发、重试和连接复用"""
+    print("测试批量控制...")
+    try:
+        import socket
+        sys.path.insert(0, '.')
+        from benchmark import SlowBrowserManager, start_server
+        from fleet import FleetController, Host
+        from server import Config
+        
+        import tempfile
+        pid_dir = tempfile.TemporaryDirectory()
+        kiosks = []
+        for i in range(8):
+            config = _isolated_config(Config())
+            config.host = '127.0.0.1'
+            config.devtools_navigation = False
+            config.pid_file = os.path.join(pid_dir.name, f'kiosk{i}.pid')
+            manager = SlowBrowserManager(config, launch_delay=0.3)
+            server, port = start_server(manager, config)
+            kiosks.append((manager, server, port))
+        
+        closed = socket.socket()
+        closed.bind(('127.0.0.1', 0))
+        dead_port = closed.getsockname()[1]
+        closed.close()
+        
+        hosts = [Host(f'127.0.0.1:{port}') for _, _, port in kiosks]
+        hosts.append(Host(f'127.0.0.1:{dead_port}'))
+        try:
+            with FleetController(hosts, timeout=2, retries=1, backoff=0.05) as fleet:
+                report = fleet.open('https://example.org/fleet')
+                if report['succeeded'] != 8 or report['failed'] != 1:
+                    print(f"✗ 打开结果汇总不正确: {report}")
+                    return False
+                if report['elapsed_ms'] > 8 * 300 * 0.6:
+                    print(f"✗ 命令未并发发送（耗时 {report['elapsed_ms']}ms）")
+                    return False
+                dead = report['results'][-1]
+                if dead['ok'] or dead['attempts'] != 2 or not dead['error']:
+                    print(f"✗ 不可达主机未按次数重试: {dead}")
+                    return False
+                
+                report = fleet.status()
+                if not all(r['response']['url'] == 'https://example.org/fleet'
+                           for r in report['results'][:8]):
+                    print(f"✗ 状态查询不正确: {report['results']}")
+                    return False
+                if any(fleet.pool.idle_count(host) != 1 for host in hosts[:8]):
+                    print("✗ 连接未复用")
+                    return False
+                
+                report = fleet.close_browsers()
+                if report['succeeded'] != 8:
+                    print(f"✗ 关闭失败: {report}")
+                    return False
+        finally:
+            for manager, server, _ in kiosks:
+                server.shutdown()
+                server.server_close()
+                manager.close_browser()
+            pid_dir.cleanup()
+        
+        print("✓ 批量控制正确")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 批量控制测试失败: {e}")
+        return False
+
+def test_benchmark_suite():
+    """测试模拟浏览器和基准结果的基线比较"""
+    print("测试基准测试套件...")
+    try:
+        import tempfile
+        sys.path.insert(0, '.')
+        from benchmark import FAKE_BROWSER, StubDisplayManager, compare_with_baseline
+        from server import Config
+        
+        if not os.access(FAKE_BROWSER, os.X_OK):
+            print("✗ 模拟浏览器无执行权限")
+            return False
+        
+        # BROWSER 指定的模拟浏览器优先于系统浏览器，并由启动器按进程组回收
+        with tempfile.TemporaryDirectory() as tmp:
+            os.environ['FAKE_BROWSER_CHILDREN'] = '2'
+            try:
+                config = _isolated_config(Config())
+                config.browser = FAKE_BROWSER
+                config.pid_file = os.path.join(tmp, 'browser.pid')
+                manager = StubDisplayManager(config)
+                if manager.browser_cmd != FAKE_BROWSER or manager.browser_args:
+                    print(f"✗ 未优先选用模拟浏览器: {manager.browser_cmd}")
+                    return False
+                ok, message = manager.open_url('https://example.org/fake')
+                pgid = manager.process.pgid
+                time.sleep(0.3)
+                details = {}
+                manager.close_browser(details)
+            finally:
+                del os.environ['FAKE_BROWSER_CHILDREN']
+            if not ok or details.get('forced'):
+                print(f"✗ 模拟浏览器启动/关闭异常: {message} {details}")
+                return False
+            def live_members():
+                # 忽略僵尸进程（由 init 回收）
+                members = []
+                for entry in Path('/proc').iterdir():
+                    try:
+                        fields = (entry / 'stat').read_text().rsplit(')', 1)[1].split()
+                    except (OSError, IndexError):
+                        continue
+                    if int(fields[2]) == pgid and fields[0] != 'Z':
+                        members.append(entry.name)
+                return members
+            
+            for _ in range(20):
+                members = live_members()
+                if not members:
+                    break
+                time.sleep(0.05)
+            if members:
+                print(f"✗ 模拟浏览器子进程未回收: {members}")
+                return False
+        
+        baseline = {'load': {'rps': 1000, 'p99_ms': 2.0, 'requests': 10}}
+        rows = compare_with_baseline({'load': {'rps': 700, 'p99_ms': 2.1, 'requests': 5}},
+                                     baseline, tolerance=0.2)
+        regressions = {metric for metric, _, _, _, regressed in rows if regressed}
+        if regressions != {'load.rps'} or len(rows) != 2:
+            print(f"✗ 基线比较不正确: {rows}")
+            return False
+        
+        print("✓ 基准测试套件正确")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 基准测试套件测试失败: {e}")
+        return False
+
+def test_logging_pipeline():
+    """测试队列日志、轮转、JSON 格式和访问日志采样"""
+    print("测试日志管道...")
+    import logging
+    root = logging.getLogger()
+    saved_handlers, saved_level = list(root.handlers), root.level
+    try:
+        import json
+        import tempfile
+        sys.path.insert(0, '.')
+        from server import Config, ACCESS_LOG, setup_logging
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            config = _isolated_config(Config())
+            config.log_file = os.path.join(tmp, 'launcher.log')
+            config.log_format = 'json'
+            config.log_level = 'INFO'
+            config.verbose_logging = False
+            config.access_log_sample = 0.25
+            config.log_max_mb = 0.0005
+            config.log_backups = 3
+            listener = setup_logging(config)
+            try:
+                for n in range(20):
+                    ACCESS_LOG.info('GET /status %s', n, extra={'status': 200})
+                ACCESS_LOG.info('GET /missing', extra={'status': 404})
+                logging.error("Launch failed")
+                logging.debug("Hidden at INFO level")
+            finally:
+                listener.stop()
+            
+            files = sorted(os.listdir(tmp))
+            entries = []
+            for name in files:
+                with open(os.path.join(tmp, name)) as f:
+                    entries += [json.loads(line) for line in f if line.strip()]
+            messages = [entry['message'] for entry in entries]
+            sampled = [m for m in messages if m.startswith('GET /status')]
+            if len(sampled) != 5 or 'GET /missing' not in messages or 'Launch failed' not in messages:
+                print(f"✗ 访问日志采样不正确: {messages}")
+                return False
+            if 'Hidden at INFO level' in messages:
+                print("✗ LOG_LEVEL 未生效")
+                return False
+            if len(files) < 2:
+                print(f"✗ 日志未按大小轮转: {files}")
+                return False
+        
+        print("✓ 日志管道正确")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 日志管道测试失败: {e}")
+        return False
+    finally:
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        for handler in saved_handlers:
+            root.addHandler(handler)
+        root.setLevel(saved_level)
+        for log_filter in list(logging.getLogger('web_kiosk.access').filters):
+            logging.getLogger('web_kiosk.access').removeFilter(log_filter)
+
+def test_adopt_running_browser():
+    """测试服务重启后重新接管仍在运行的浏览器"""
+    print("测试重新接管浏览器...")
+    try:
+        import json
+        import signal
+        import tempfile
+        sys.path.insert(0, '.')
+        from benchmark import FAKE_BROWSER
+        from server import Config, BrowserManager
+        
+        class HeadlessManager(BrowserManager):
+            def _check_display(self):
+                return True
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            config = Config()
+            config.browser = FAKE_BROWSER
+            config.devtools_navigation = False
+            config.pid_file = os.path.join(tmp, 'browser.pid')
+            config.state_file = os.path.join(tmp, 'state.json')
+            
+            first = HeadlessManager(config)
+            first.open_url('https://example.org/adopt')
+            pid = first.process.pid
+            
+            # 模拟服务重启：新的管理器应接管浏览器，相同URL直接复用
+            second = HeadlessManager(config)
+            if second.process is None or second.process.pid != pid:
+                print("✗ 未接管运行中的浏览器")
+                return False
+            details = {}
+            second.open_url('https://example.org/adopt', details)
+            if details.get('method') != 'reuse' or second.process.pid != pid:
+                print(f"✗ 接管后未复用浏览器: {details}")
+                return False
+            
+            # 启动时间不一致（PID 被复用）时不接管，并删除过期状态
+            with open(config.state_file) as f:
+                state = json.load(f)
+            state['start_ticks'] += 1
+            with open(config.state_file, 'w') as f:
+                json.dump(state, f)
+            third = HeadlessManager(config)
+            if third.process is not None or os.path.exists(config.state_file):
+                print("✗ PID 复用时不应接管")
+                return False
+            
+            # 接管的浏览器退出时仍能收到通知
+            os.killpg(second.process.pgid, signal.SIGKILL)
+            deadline = time.time() + 3
+            while second.state != 'crashed' and time.time() < deadline:
+                time.sleep(0.05)
+            first.close_browser()
+            if second.state != 'crashed':
+                print(f"✗ 未检测到接管浏览器的退出: {second.state}")
+                return False
+        
+        print("✓ 重新接管浏览器正确")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 重新接管浏览器测试失败: {e}")
+        return False
+
+def test_boot_autolaunch():
+    """测试开机自动打开默认URL和启动时间线"""
+    print("测试开机快速路径...")
+    try:
+        import tempfile
+        sys.path.insert(0, '.')
+        from benchmark import FAKE_BROWSER
+        from server import Config, BrowserManager, BootTimeline, autolaunch
+        
+        class HeadlessManager(BrowserManager):
+            display_ready = True
+            
+            def _check_display(self):
+                return self.display_ready
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            config = Config()
+            config.browser = FAKE_BROWSER
+            config.devtools_navigation = False
+            config.default_url = 'https://example.org/boot'
+            config.pid_file = os.path.join(tmp, 'browser.pid')
+            config.state_file = os.path.join(tmp, 'state.json')
+            manager = HeadlessManager(config)
+            
+            # 显示不可用时在超时后放弃，不启动浏览器
+            manager.display_ready = False
+            timeline = BootTimeline()
+            if autolaunch(manager, timeline, timeout=0.3) or manager.process is not None:
+                print("✗ 显示不可用时不应启动浏览器")
+                return False
+            
+            manager.display_ready = True
+            timeline = BootTimeline()
+            timeline.mark('config_loaded')
+            if not autolaunch(manager, timeline):
+                print("✗ 自动启动失败")
+                return False
+            if manager.current_url != config.default_url:
+                print(f"✗ 未打开默认URL: {manager.current_url}")
+                return False
+            events = [e['event'] for e in timeline.to_dict()['events']]
+            expected = ['process_start', 'config_loaded', 'display_ready',
+                        'browser_spawned', 'page_ready']
+            if events != expected:
+                print(f"✗ 启动时间线事件不正确: {events}")
+                return False
+            offsets = [e['since_process_start_ms'] for e in timeline.to_dict()['events']]
+            if offsets != sorted(offsets) or offsets[0] != 0:
+                print(f"✗ 启动时间线时间顺序不正确: {offsets}")
+                return False
+            
+            # 浏览器已显示默认URL（例如服务重启后接管）时直接复用
+            timeline = BootTimeline()
+            autolaunch(manager, timeline)
+            events = [e['event'] for e in timeline.to_dict()['events']]
+            manager.close_browser()
+            if 'browser_reused' not in events or 'browser_spawned' in events:
+                print(f"✗ 已显示默认URL时应复用浏览器: {events}")
+                return False
+        
+        print("✓ 开机快速路径正确")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 开机快速路径测试失败: {e}")
+        return False
+
+def test_browser_probe_cache():
+    """测试浏览器能力探测及其缓存"""
+    print("测试浏览器能力探测...")
+    try:
+        import tempfile
+        sys.path.insert(0, '.')
+        from benchmark import FAKE_BROWSER
+        from server import Config, BrowserManager, BrowserProbe
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            # 以 fake-browser 冒充 chromium，并记录 --version 的调用次数
+            os.symlink(FAKE_BROWSER, os.path.join(tmp, 'chromium'))
+            log_file = os.path.join(tmp, 'browser.log')
+            cache_file = os.path.join(tmp, 'capabilities.json')
+            old_env = {key: os.environ.get(key) for key in ('PATH', 'FAKE_BROWSER_LOG')}
+            os.environ['PATH'] = tmp + os.pathsep + old_env['PATH']
+            os.environ['FAKE_BROWSER_LOG'] = log_file
+            
+            def version_runs():
+                if not os.path.exists(log_file):
+                    return 0
+                with open(log_file) as f:
+                    return sum(1 for line in f if line.rstrip().endswith(' version'))
+            
+            try:
+                config = _isolated_config(Config())
+                config.browser = 'chromium'
+                config.adopt_browser = False
+                config.browser_probe_cache = cache_file
+                manager = BrowserManager(config)
+                if manager.browser_cmd != 'chromium' or manager.capabilities['version'] != '120.0.0.0':
+                    print(f"✗ 探测结果不正确: {manager.capabilities}")
+                    return False
+                # Chromium 76 起已移除 --disable-infobars
+                if '--disable-infobars' in manager.browser_args or '--kiosk' not in manager.browser_args:
+                    print(f"✗ 未按版本过滤参数: {manager.browser_args}")
+                    return False
+                
+                # 热启动：从磁盘缓存读取，不再运行 --version
+                warm = BrowserManager(config)
+                if not warm.capabilities['cached'] or version_runs() != 1:
+                    print(f"✗ 热启动未使用缓存（--version 运行 {version_runs()} 次）")
+                    return False
+                
+                # 浏览器升级（mtime 变化）或 PATH 变化时重新探测
+                link = os.path.join(tmp, 'chromium')
+                os.remove(link)
+                with open(link, 'w') as f:
+                    f.write(f'#!/bin/sh\nexec {FAKE_BROWSER} "$@"\n')
+                os.chmod(link, 0o755)
+                if BrowserProbe(cache_file).capabilities('chromium', link)['cached']:
+                    print("✗ 浏览器升级后仍使用缓存")
+                    return False
+                os.environ['PATH'] += os.pathsep + tmp
+                if BrowserProbe(cache_file).capabilities('chromium', link)['cached']:
+                    print("✗ PATH 变化后仍使用缓存")
+                    return False
+            finally:
+                for key, value in old_env.items():
+                    if value is None:
+                        os.environ.pop(key, None)
+                    else:
+                        os.environ[key] = value
+        
+        print("✓ 浏览器能力探测正确")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 浏览器能力探测测试失败: {e}")
+        return False
+
+def test_browser_selection_policy():
+    """测试浏览器校准、选择策略和按URL覆盖"""
+    print("测试浏览器选择策略...")
+    try:
+        import json
+        import tempfile
+        sys.path.insert(0, '.')
+        from benchmark import FAKE_BROWSER
+        from server import Config, BrowserManager, calibrate_browsers, load_calibration
+        
+        class HeadlessManager(BrowserManager):
+            def _check_display(self):
+                return True
+        
+        trial_cmds = []
+        
+        class RecordingManager(HeadlessManager):
+            def _spawn_browser(self, cmd):
+                trial_cmds.append(cmd)
+                return super()._spawn_browser(cmd)
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ('chromium', 'firefox'):
+                os.symlink(FAKE_BROWSER, os.path.join(tmp, name))
+            old_path = os.environ['PATH']
+            os.environ['PATH'] = tmp + os.pathsep + old_path
+            try:
+                config = Config()
+                config.devtools_navigation = False
+                config.adopt_browser = False
+                config.browser_probe_cache = ''
+                config.browser_calibration = os.path.join(tmp, 'calibration.json')
+                config.pid_file = os.path.join(tmp, 'browser.pid')
+                config.state_file = os.path.join(tmp, 'state.json')
+                
+                report = calibrate_browsers(config, runs=2, settle=0.1,
+                                            manager_class=RecordingManager)
+                measured = report['browsers']
+                if sorted(measured) != ['chromium', 'firefox'] or any(
+                        m['samples'] != 2 or not m['rss_mb'] for m in measured.values()):
+                    print(f"✗ 校准结果不正确: {measured}")
+                    return False
+                # 校准使用临时配置目录，不会把测试页交给正在运行的浏览器
+                if not all(any(arg.startswith('--user-data-dir=') or arg == '--profile'
+                               for arg in cmd) for cmd in trial_cmds):
+                    print(f"✗ 校准未使用独立的配置目录: {trial_cmds}")
+                    return False
+                if sorted(load_calibration(config.browser_calibration)) != ['chromium', 'firefox']:
+                    print("✗ 校准结果未保存")
+                    return False
+                
+                # 按策略选择：firefox 更省内存，chromium 更快
+                with open(config.browser_calibration, 'w') as f:
+                    json.dump({'browsers': {
+                        'chromium': {'ready_p50_ms': 800, 'rss_mb': 300},
+                        'firefox': {'ready_p50_ms': 1500, 'rss_mb': 120}}}, f)
+                expected = {'explicit': 'chromium', 'fastest': 'chromium', 'leanest': 'firefox'}
+                for policy, browser in expected.items():
+                    config.browser_policy = policy
+                    selected = HeadlessManager(config).browser_cmd
+                    if selected != browser:
+                        print(f"✗ 策略 {policy} 选择了 {selected}，应为 {browser}")
+                        return False
+                
+                # 只测到 spawned 信号的耗时不参与 fastest 排序
+                with open(config.browser_calibration, 'w') as f:
+                    json.dump({'browsers': {
+                        'chromium': {'ready_p50_ms': 800, 'rss_mb': 300,
+                                     'signals': ['devtools-load']},
+                        'firefox': {'ready_p50_ms': 3, 'rss_mb': 120,
+                                    'signals': ['spawned']}}}, f)
+                config.browser_policy = 'fastest'
+                selected = HeadlessManager(config).browser_cmd
+                if selected != 'chromium':
+                    print(f"✗ fastest 策略误选了只测到进程启动的 {selected}")
+                    return False
+                
+                # 按URL覆盖：匹配的URL换用指定浏览器，其余URL切回默认浏览器
+                config.browser_policy = 'explicit'
+                config.browser_overrides = [('*.example.net', 'leanest'),
+                                            ('https://example.org/legacy/*', 'firefox')]
+                manager = HeadlessManager(config)
+                opened = []
+                for url in ('https://example.org/', 'https://example.org/legacy/app',
+                            'https://example.org/next', 'https://tv.example.net/'):
+                    manager.open_url(url)
+                    opened.append((manager.browser_cmd, manager.process.cmd[0]))
+                manager.close_browser()
+                if opened != [('chromium', 'chromium'), ('firefox', 'firefox'),
+                              ('chromium', 'chromium'), ('firefox', 'firefox')]:
+                    print(f"✗ 按URL覆盖的浏览器不正确: {opened}")
+                    return False
+            finally:
+                os.environ['PATH'] = old_path
+        
+        print("✓ 浏览器选择策略正确")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 浏览器选择策略测试失败: {e}")
+        return False
+
+def test_config_hot_reload():
+    """测试配置热加载"""
+    print("测试配置热加载...")
+    try:
+        import tempfile
+        sys.path.insert(0, '.')
+        from benchmark import FAKE_BROWSER
+        from server import Config, BrowserManager, ConfigReloader, StaticAssets, create_server
+        
+        class HeadlessManager(BrowserManager):
+            def _check_display(self):
+                return True
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            os.symlink(FAKE_BROWSER, os.path.join(tmp, 'chromium'))
+            env_file = os.path.join(tmp, '.env')
+            base = (f"BROWSER=chromium\nDEVTOOLS_NAVIGATION=false\nADOPT_BROWSER=false\n"
+                    f"BROWSER_PROBE_CACHE=\nPID_FILE={tmp}/browser.pid\n"
+                    f"STATE_FILE={tmp}/state.json\nPORT=0\n")
+            
+            def write_env(extra=''):
+                with open(env_file, 'w') as f:
+                    f.write(base + extra)
+            
+            old_path = os.environ['PATH']
+            os.environ['PATH'] = tmp + os.pathsep + old_path
+            write_env('DEFAULT_URL=https://example.org/a\n')
+            manager = server = None
+            try:
+                config = Config(env_file)
+                manager = HeadlessManager(config)
+                server = create_server(config, manager)
+                reloader = ConfigReloader(config, server.slots)
+                manager.open_url('https://example.org/shown')
+                pid = manager.process.pid
+                assets = StaticAssets()
+                old_index = assets.index(config.default_url)
+                
+                # 白名单和默认URL立即生效，浏览器不重启
+                write_env('DEFAULT_URL=https://example.org/b\nALLOW_LIST=example.org\n')
+                ok, changed = reloader.reload()
+                if not ok or sorted(changed) != ['allow_list', 'default_url']:
+                    print(f"✗ 重新加载结果不正确: {ok} {changed}")
+                    return False
+                if manager.process.pid != pid:
+                    print("✗ 白名单或默认URL变化时不应重启浏览器")
+                    return False
+                if manager.check_url('https://other.com/') != "URL not in whitelist":
+                    print("✗ 新白名单未生效")
+                    return False
+                new_index = assets.index(config.default_url)
+                if new_index is old_index or new_index.signature[1] != 'https://example.org/b':
+                    print("✗ 主页未使用新的默认URL")
+                    return False
+                
+                # 无效配置整体拒绝；需要重启服务的配置保持原值
+                write_env('DEFAULT_URL=https://example.org/c\nALLOW_LIST=example.org\nPORT=abc\n'
+                          'KIOSK_TEST_LEAK=1\n')
+                ok, errors = reloader.reload()
+                if ok or config.default_url != 'https://example.org/b':
+                    print(f"✗ 无效配置未被拒绝: {errors}")
+                    return False
+                # 被拒绝的配置不写入进程环境，之后启动的浏览器不会继承
+                if ('KIOSK_TEST_LEAK' in os.environ or os.environ.get('PORT') == 'abc' or
+                        os.environ.get('DEFAULT_URL') != 'https://example.org/b'):
+                    print("✗ 被拒绝的配置泄漏到了进程环境")
+                    return False
+                write_env('DEFAULT_URL=https://example.org/b\nALLOW_LIST=example.org\nPORT=9999\n')
+                ok, changed = reloader.reload()
+                if changed or config.port != 0:
+                    print(f"✗ 需要重启的配置被热加载: {changed}")
+                    return False
+                
+                # ENABLE_GPU 改变启动参数，重启浏览器
+                write_env('DEFAULT_URL=https://example.org/b\nALLOW_LIST=example.org\nENABLE_GPU=true\n')
+                reloader.reload()
+                if manager.process.pid == pid or '--disable-gpu' in manager.process.cmd:
+                    print(f"✗ ENABLE_GPU 变化后未按新参数重启: {manager.process.cmd}")
+                    return False
+                if manager.current_url != 'https://example.org/shown':
+                    print(f"✗ 重启后URL不正确: {manager.current_url}")
+                    return False
+            finally:
+                if manager is not None:
+                    manager.close_browser()
+                if server is not None:
+                    server.server_close()
+                os.environ['PATH'] = old_path
+                # 空的 .env 会恢复被覆盖的环境变量
+                with open(env_file, 'w') as f:
+                    f.write('')
+                Config(env_file)
+            if 'ALLOW_LIST' in os.environ or 'ENABLE_GPU' in os.environ:
+                print("✗ 从 .env 删除的键未从环境变量中移除")
+                return False
+        
+        print("✓ 配置热加载正确")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 配置热加载测试失败: {e}")
+        return False
+
+def test_playlist_scheduler():
+    """测试播放列表轮播、预热和漂移统计"""
+    print("测试播放列表轮播...")
+    try:
+        import json
+        import tempfile
+        import threading
+        from datetime import datetime, timedelta
+        sys.path.insert(0, '.')
+        from benchmark import FAKE_BROWSER
+        from server import (Config, BrowserManager, PlaylistScheduler, PLAYLIST_MISSED,
+                            create_server, load_playlist)
+        
+        class HeadlessManager(BrowserManager):
+            def _check_display(self):
+                return True
+        
+        class FakeChromiumManager(BrowserManager):
+            def _detect_browser(self):
+                self.browser_cmd = 'chromium'
+                self.browser_args = ['--kiosk']
+            
+            def _get_browser_pid(self):
+                return os.getpid()
+        
+        # Chromium：在后台标签页预热，到点后切到该标签页
+        fake, port, commands = _start_fake_devtools()
+        config = _isolated_config(Config())
+        config.devtools_port = port
+        config.browser_probe_cache = ''
+        manager = FakeChromiumManager(config)
+        kind = manager.preload('https://example.org/tab')
+        details = {}
+        manager.open_url('https://example.org/tab', details)
+        fake.shutdown()
+        fake.server_close()
+        methods = [c['method'] for c in commands]
+        if kind != 'tab' or details.get('method') != 'preload':
+            print(f"✗ 未使用后台标签页预热: {kind} {details}")
+            return False
+        if (methods[:2] != ['Target.createTarget', 'Target.activateTarget'] or
+                not commands[0]['params'].get('background')):
+            print(f"✗ 标签页预热命令不正确: {methods}")
+            return False
+        
+        # 打开其他URL时先关闭预热的后台标签页，再导航当前页面
+        fake, port, commands = _start_fake_devtools()
+        config.devtools_port = port
+        manager = FakeChromiumManager(config)
+        manager.preload('https://example.org/tab')
+        details = {}
+        manager.open_url('https://example.org/manual', details)
+        fake.shutdown()
+        fake.server_close()
+        methods = [c['method'] for c in commands]
+        if (details.get('method') != 'navigate' or
+                methods != ['Target.createTarget', 'Target.closeTarget', 'Page.navigate']):
+            print(f"✗ 未先丢弃不匹配的预热标签页: {details} {methods}")
+            return False
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            os.symlink(FAKE_BROWSER, os.path.join(tmp, 'firefox'))
+            hour = datetime.now() + timedelta(hours=2)
+            playlist_file = os.path.join(tmp, 'playlist.json')
+            with open(playlist_file, 'w') as f:
+                json.dump([
+                    {'url': 'https://example.org/a', 'duration': 0.8},
+                    {'url': 'https://example.org/b', 'duration': 0.8},
+                    # 时间窗口不包含当前时间的项目不参与轮播
+                    {'url': 'https://example.org/night', 'duration': 0.8,
+                     'window': f"{hour:%H:00}-{hour + timedelta(hours=1):%H:00}"},
+                ], f)
+            
+            old_path = os.environ['PATH']
+            os.environ['PATH'] = tmp + os.pathsep + old_path
+            manager = server = playlist = None
+            try:
+                config = _isolated_config(Config())
+                config.browser = 'firefox'
+                config.browser_probe_cache = ''
+                config.devtools_navigation = False
+                config.adopt_browser = False
+                config.standby_ready = 'delay:0.2'
+                config.pid_file = os.path.join(tmp, 'browser.pid')
+                config.state_file = os.path.join(tmp, 'state.json')
+                config.port = 0
+                config.playlist = playlist_file
+                config.playlist_preload = 0.4
+                if config.validate():
+                    print(f"✗ 播放列表配置校验失败: {config.validate()}")
+                    return False
+                manager = HeadlessManager(config)
+                server = create_server(config, manager)
+                slot = server.slots['default']
+                playlist = PlaylistScheduler(slot, config)
+                playlist.start()
+                time.sleep(2.8)
+                
+                shown = [e for e in playlist.events if e['kind'] == 'shown']
+                urls = [e['url'] for e in shown]
+                if urls[:3] != ['https://example.org/a', 'https://example.org/b',
+                                'https://example.org/a']:
+                    print(f"✗ 轮播顺序不正确: {urls}")
+                    return False
+                # 第一项冷启动，之后的项目切换到预热的热备浏览器
+                if [e['method'] for e in shown[1:]] != ['preload'] * (len(shown) - 1):
+                    print(f"✗ 后续项目未使用预热: {list(playlist.events)}")
+                    return False
+                if '--no-remote' not in manager.process.cmd:
+                    print(f"✗ 热备浏览器参数不正确: {manager.process.cmd}")
+                    return False
+                summary = playlist.summary()
+                if summary['drift_ms']['max'] > 300 or summary['missed']:
+                    print(f"✗ 切换漂移过大: {summary['drift_ms']} 错过 {summary['missed']}")
+                    return False
+                
+                # 切换长时间阻塞时，整个时段已过去的项目记为错过
+                missed_before = PLAYLIST_MISSED.value(slot='default')
+                with manager._lock:
+                    time.sleep(2.0)
+                time.sleep(0.5)
+                summary = playlist.summary()
+                if summary['missed'] < 1 or PLAYLIST_MISSED.value(slot='default') <= missed_before:
+                    print(f"✗ 未记录错过的时段: {summary['events']}")
+                    return False
+                if summary['next_at'] is None or summary['next_at'] < time.time() - 1:
+                    print(f"✗ 错过时段后未重新对齐计划: {summary}")
+                    return False
+                
+                # 格式错误的播放列表被拒绝
+                with open(playlist_file, 'w') as f:
+                    json.dump([{'url': 'https://example.org/a', 'duration': 0}], f)
+                try:
+                    load_playlist(playlist_file)
+                    print("✗ 时长为 0 的播放列表项未被拒绝")
+                    return False
+                except ValueError:
+                    pass
+            finally:
+                if playlist is not None:
+                    playlist.stop()
+                if manager is not None:
+                    manager.close_browser()
+                if server is not None:
+                    server.server_close()
+                os.environ['PATH'] = old_path
+        
+        print(f"✓ 播放列表轮播正确 (漂移 p50={summary['drift_ms']['p50']}ms)")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 播放列表轮播测试失败: {e}")
+        return False
+
 def test_script_permissions():
     """测试脚本权限"""
     print("测试脚本权限...")
@@ -200,6 +2239,31 @@ def main():
         test_server_syntax,
         test_config_loading,
         test_url_validation,
+        test_concurrent_requests,
+        test_devtools_navigation,
+        test_standby_swap,
+        test_process_supervisor,
+        test_display_monitor,
+        test_allow_list_index,
+        test_static_assets,
+        test_keepalive_json_api,
+        test_launch_coalescing,
+        test_metrics_endpoint,
+        test_event_stream,
+        test_async_launch_jobs,
+        test_browser_watchdog,
+        test_ram_profile,
+        test_caching_proxy,
+        test_browser_slots,
+        test_fleet_controller,
+        test_benchmark_suite,
+        test_logging_pipeline,
+        test_adopt_running_browser,
+        test_boot_autolaunch,
+        test_browser_probe_cache,
+        test_browser_selection_policy,
+        test_config_hot_reload,
+        test_playlist_scheduler,
         test_script_permissions
     ]
     